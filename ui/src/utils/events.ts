@@ -0,0 +1,37 @@
+import api from '@/utils/api'
+
+// Server-Sent Events pushed by /events/stream (see web/app/services/events.py)
+export type PaperStatusEvent = {
+  id: number
+  title: string
+  from: string | null
+  to: string | null
+  next_review_date: string | null
+  start_date: string | null
+  last_reviewed_at: string | null
+  previous_reviewed_at: string | null
+}
+
+export type ReviewDueEvent = {
+  papers: { id: number; title: string }[]
+  count: number
+}
+
+export type EventHandlers = {
+  'paper.status'?: (event: PaperStatusEvent) => void
+  'review.due'?: (event: ReviewDueEvent) => void
+  'wrong_question.created'?: (event: { id: number; subject: string; question_type: string | null; review_at: string | null }) => void
+  // Too much changed to send as deltas (or the connection fell behind): refetch
+  resync?: () => void
+}
+
+// Opens one stream for the given handlers; returns a function that closes it.
+// The browser reconnects on its own and the server replays what was missed.
+export const subscribe = (handlers: EventHandlers) => {
+  const types = Object.keys(handlers).filter((type) => type !== 'resync')
+  const source = new EventSource(`${api.defaults.baseURL}/events/stream?types=${encodeURIComponent(types.join(','))}`)
+  for (const [type, handler] of Object.entries(handlers)) {
+    source.addEventListener(type, (event) => (handler as (data: unknown) => void)(JSON.parse((event as MessageEvent).data)))
+  }
+  return () => source.close()
+}
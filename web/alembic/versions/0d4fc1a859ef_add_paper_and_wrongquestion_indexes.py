@@ -0,0 +1,46 @@
+"""add paper and wrongquestion indexes
+
+Revision ID: 0d4fc1a859ef
+Revises: 42d3b24d1d02
+Create Date: 2026-10-18 14:05:47.318250
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0d4fc1a859ef'
+down_revision: Union[str, Sequence[str], None] = '42d3b24d1d02'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_paper_status_next_review_date', 'paper', ['status', 'next_review_date'], unique=False)
+    op.create_index('ix_paper_start_date_end_date', 'paper', ['start_date', 'end_date'], unique=False)
+    op.create_index('ix_paper_next_review_date', 'paper', ['next_review_date'], unique=False)
+    op.create_index('ix_paper_last_reviewed_at', 'paper', ['last_reviewed_at'], unique=False)
+    op.create_index('ix_paper_subject_grade', 'paper', ['subject', 'grade'], unique=False)
+    op.create_index('ix_paper_type', 'paper', ['type'], unique=False)
+    op.create_index('ix_paper_author', 'paper', ['author'], unique=False)
+    op.create_index('ix_wrongquestion_subject_difficulty', 'wrongquestion', ['subject', 'difficulty'], unique=False)
+    op.create_index('ix_wrongquestion_subject_question_type', 'wrongquestion', ['subject', 'question_type'], unique=False)
+    op.create_index('ix_wrongquestion_difficulty', 'wrongquestion', ['difficulty'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_wrongquestion_difficulty', table_name='wrongquestion')
+    op.drop_index('ix_wrongquestion_subject_question_type', table_name='wrongquestion')
+    op.drop_index('ix_wrongquestion_subject_difficulty', table_name='wrongquestion')
+    op.drop_index('ix_paper_author', table_name='paper')
+    op.drop_index('ix_paper_type', table_name='paper')
+    op.drop_index('ix_paper_subject_grade', table_name='paper')
+    op.drop_index('ix_paper_last_reviewed_at', table_name='paper')
+    op.drop_index('ix_paper_next_review_date', table_name='paper')
+    op.drop_index('ix_paper_start_date_end_date', table_name='paper')
+    op.drop_index('ix_paper_status_next_review_date', table_name='paper')
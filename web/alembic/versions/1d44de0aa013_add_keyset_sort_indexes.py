@@ -0,0 +1,30 @@
+"""add keyset sort indexes
+
+Revision ID: 1d44de0aa013
+Revises: 0d4fc1a859ef
+Create Date: 2026-10-18 16:22:09.551904
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '1d44de0aa013'
+down_revision: Union[str, Sequence[str], None] = '0d4fc1a859ef'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_paper_start_date', 'paper', ['start_date'], unique=False)
+    op.create_index('ix_wrongquestion_created_at', 'wrongquestion', ['created_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_wrongquestion_created_at', table_name='wrongquestion')
+    op.drop_index('ix_paper_start_date', table_name='paper')
@@ -0,0 +1,52 @@
+"""add paper_interval rtree
+
+Revision ID: 5729f583651a
+Revises: 1d44de0aa013
+Create Date: 2026-10-18 18:40:12.907316
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5729f583651a'
+down_revision: Union[str, Sequence[str], None] = '1d44de0aa013'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Bounds are days since 2000-01-01 (julianday 2451544.5)
+SPAN_LO = "min(julianday({p}.start_date), julianday(coalesce({p}.end_date, {p}.start_date))) - 2451544.5"
+SPAN_HI = "max(julianday({p}.start_date), julianday(coalesce({p}.end_date, {p}.start_date))) - 2451544.5"
+REVIEW = "julianday({p}.next_review_date) - 2451544.5"
+
+def insert_intervals(p: str) -> str:
+    return f"""
+        INSERT INTO paper_interval SELECT {p}.id * 2, {SPAN_LO.format(p=p)}, {SPAN_HI.format(p=p)} WHERE {p}.start_date IS NOT NULL;
+        INSERT INTO paper_interval SELECT {p}.id * 2 + 1, {REVIEW.format(p=p)}, {REVIEW.format(p=p)} WHERE {p}.next_review_date IS NOT NULL;"""
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute("CREATE VIRTUAL TABLE IF NOT EXISTS paper_interval USING rtree(id, lo, hi)")
+    op.execute(f"""CREATE TRIGGER IF NOT EXISTS paper_interval_insert AFTER INSERT ON paper BEGIN{insert_intervals('new')}
+    END""")
+    op.execute(f"""CREATE TRIGGER IF NOT EXISTS paper_interval_update AFTER UPDATE OF start_date, end_date, next_review_date ON paper BEGIN
+        DELETE FROM paper_interval WHERE id IN (old.id * 2, old.id * 2 + 1);{insert_intervals('new')}
+    END""")
+    op.execute("""CREATE TRIGGER IF NOT EXISTS paper_interval_delete AFTER DELETE ON paper BEGIN
+        DELETE FROM paper_interval WHERE id IN (old.id * 2, old.id * 2 + 1);
+    END""")
+    op.execute("DELETE FROM paper_interval")
+    op.execute(f"INSERT INTO paper_interval SELECT id * 2, {SPAN_LO.format(p='paper')}, {SPAN_HI.format(p='paper')} FROM paper WHERE start_date IS NOT NULL")
+    op.execute(f"INSERT INTO paper_interval SELECT id * 2 + 1, {REVIEW.format(p='paper')}, {REVIEW.format(p='paper')} FROM paper WHERE next_review_date IS NOT NULL")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP TRIGGER IF EXISTS paper_interval_delete")
+    op.execute("DROP TRIGGER IF EXISTS paper_interval_update")
+    op.execute("DROP TRIGGER IF EXISTS paper_interval_insert")
+    op.execute("DROP TABLE IF EXISTS paper_interval")
@@ -0,0 +1,40 @@
+"""add srs state columns
+
+Revision ID: b8e2c4f1a7d3
+Revises: 5729f583651a
+Create Date: 2026-10-18 20:05:41.318227
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b8e2c4f1a7d3'
+down_revision: Union[str, Sequence[str], None] = '5729f583651a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+SRS_COLUMNS = ('srs_interval', 'srs_ease', 'srs_stability', 'srs_difficulty')
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for name in SRS_COLUMNS:
+        op.add_column('paper', sa.Column(name, sa.Float(), nullable=True))
+    op.add_column('wrongquestion', sa.Column('review_stage', sa.Integer(), nullable=True))
+    op.add_column('wrongquestion', sa.Column('last_reviewed_at', sa.DateTime(), nullable=True))
+    for name in SRS_COLUMNS:
+        op.add_column('wrongquestion', sa.Column(name, sa.Float(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for name in reversed(SRS_COLUMNS):
+        op.drop_column('wrongquestion', name)
+    op.drop_column('wrongquestion', 'last_reviewed_at')
+    op.drop_column('wrongquestion', 'review_stage')
+    for name in reversed(SRS_COLUMNS):
+        op.drop_column('paper', name)
@@ -0,0 +1,51 @@
+"""add paper_stats counters
+
+Revision ID: c41f7a9e2b56
+Revises: b8e2c4f1a7d3
+Create Date: 2026-10-18 21:12:30.447019
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c41f7a9e2b56'
+down_revision: Union[str, Sequence[str], None] = 'b8e2c4f1a7d3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+KEYS = {
+    'status': "coalesce({p}.status, '')",
+    'reviewed_on': "date({p}.last_reviewed_at)",
+}
+
+def bump(p: str, delta: int) -> str:
+    return "".join(f"""
+        INSERT INTO paper_stats (kind, key, count) SELECT '{kind}', {key.format(p=p)}, {delta} WHERE {key.format(p=p)} IS NOT NULL
+            ON CONFLICT (kind, key) DO UPDATE SET count = count + excluded.count;""" for kind, key in KEYS.items())
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute("CREATE TABLE IF NOT EXISTS paper_stats (kind TEXT NOT NULL, key TEXT NOT NULL, count INTEGER NOT NULL, PRIMARY KEY (kind, key)) WITHOUT ROWID")
+    op.execute(f"""CREATE TRIGGER IF NOT EXISTS paper_stats_insert AFTER INSERT ON paper BEGIN{bump('new', 1)}
+    END""")
+    op.execute(f"""CREATE TRIGGER IF NOT EXISTS paper_stats_update AFTER UPDATE OF status, last_reviewed_at ON paper BEGIN{bump('old', -1)}{bump('new', 1)}
+    END""")
+    op.execute(f"""CREATE TRIGGER IF NOT EXISTS paper_stats_delete AFTER DELETE ON paper BEGIN{bump('old', -1)}
+    END""")
+    op.execute("DELETE FROM paper_stats")
+    for kind, key in KEYS.items():
+        op.execute(f"INSERT INTO paper_stats (kind, key, count) SELECT '{kind}', {key.format(p='paper')}, count(*) FROM paper "
+                   f"WHERE {key.format(p='paper')} IS NOT NULL GROUP BY 2")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP TRIGGER IF EXISTS paper_stats_delete")
+    op.execute("DROP TRIGGER IF EXISTS paper_stats_update")
+    op.execute("DROP TRIGGER IF EXISTS paper_stats_insert")
+    op.execute("DROP TABLE IF EXISTS paper_stats")
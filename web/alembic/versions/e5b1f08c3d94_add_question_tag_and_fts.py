@@ -0,0 +1,68 @@
+"""add question_tag and wrongquestion_fts
+
+Revision ID: e5b1f08c3d94
+Revises: d7a3c9e15f20
+Create Date: 2026-10-19 09:21:07.553810
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5b1f08c3d94'
+down_revision: Union[str, Sequence[str], None] = 'd7a3c9e15f20'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# `tags` as a JSON array of strings, full-width commas included; '[]' if it cannot be one
+TAGS_ARRAY = r"""'["' || replace(replace(replace(replace(coalesce({p}.tags, ''), '\', '\\'), '"', '\"'), '，', ','), ',', '","') || '"]'"""
+
+def insert_tags(p: str, source: str = '') -> str:
+    array = TAGS_ARRAY.format(p=p)
+    return (
+        f"INSERT OR IGNORE INTO question_tag (tag, question_id) SELECT trim(value), {p}.id "
+        f"FROM {source}json_each(CASE WHEN json_valid({array}) THEN {array} ELSE '[]' END) WHERE trim(value) != ''"
+    )
+
+def fts_row(p: str, command: str = '') -> str:
+    if command:
+        return f"INSERT INTO wrongquestion_fts (wrongquestion_fts, rowid, chapter, tags, question_type) VALUES ('{command}', {p}.id, {p}.chapter, {p}.tags, {p}.question_type)"
+    return f"INSERT INTO wrongquestion_fts (rowid, chapter, tags, question_type) VALUES ({p}.id, {p}.chapter, {p}.tags, {p}.question_type)"
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute("CREATE TABLE IF NOT EXISTS question_tag (tag TEXT NOT NULL, question_id INTEGER NOT NULL, PRIMARY KEY (tag, question_id)) WITHOUT ROWID")
+    op.execute("CREATE INDEX IF NOT EXISTS ix_question_tag_question_id ON question_tag (question_id)")
+    op.execute("CREATE VIRTUAL TABLE IF NOT EXISTS wrongquestion_fts USING fts5(chapter, tags, question_type, "
+               "content='wrongquestion', content_rowid='id', tokenize='trigram')")
+    op.execute(f"""CREATE TRIGGER IF NOT EXISTS wrongquestion_search_insert AFTER INSERT ON wrongquestion BEGIN
+        {insert_tags('new')};
+        {fts_row('new')};
+    END""")
+    op.execute(f"""CREATE TRIGGER IF NOT EXISTS wrongquestion_search_update AFTER UPDATE OF chapter, tags, question_type ON wrongquestion BEGIN
+        DELETE FROM question_tag WHERE question_id = old.id;
+        {insert_tags('new')};
+        {fts_row('old', 'delete')};
+        {fts_row('new')};
+    END""")
+    op.execute(f"""CREATE TRIGGER IF NOT EXISTS wrongquestion_search_delete AFTER DELETE ON wrongquestion BEGIN
+        DELETE FROM question_tag WHERE question_id = old.id;
+        {fts_row('old', 'delete')};
+    END""")
+    # Backfill from the existing comma separated tags
+    op.execute("DELETE FROM question_tag")
+    op.execute(insert_tags('wrongquestion', source='wrongquestion, '))
+    op.execute("INSERT INTO wrongquestion_fts (wrongquestion_fts) VALUES ('rebuild')")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP TRIGGER IF EXISTS wrongquestion_search_delete")
+    op.execute("DROP TRIGGER IF EXISTS wrongquestion_search_update")
+    op.execute("DROP TRIGGER IF EXISTS wrongquestion_search_insert")
+    op.execute("DROP TABLE IF EXISTS wrongquestion_fts")
+    op.execute("DROP TABLE IF EXISTS question_tag")
@@ -0,0 +1,29 @@
+"""add job errors
+
+Revision ID: f2c7a4d91e06
+Revises: e5b1f08c3d94
+Create Date: 2026-10-19 14:02:37.611042
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f2c7a4d91e06'
+down_revision: Union[str, Sequence[str], None] = 'e5b1f08c3d94'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('job', sa.Column('errors', sqlmodel.sql.sqltypes.AutoString(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('job', 'errors')
@@ -1,9 +1,29 @@
 from fastapi import Depends
-from sqlmodel import SQLModel, Field, Session, create_engine
-from typing import Annotated, AsyncGenerator, Optional
+from sqlmodel import SQLModel, Field, Session, create_engine, select
+from sqlalchemy import DDL, Column, Engine, Float, Index, Integer, MetaData, String, Table, and_, event, intersect, literal_column, or_, union
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
+from typing import Annotated, Any, AsyncGenerator, Dict, List, Optional
 from datetime import datetime
+import os
+import random
+
+from app.services import metrics
 
 class Paper(SQLModel, table=True):
+    # Matched to the filters in routers/paper.py, routers/dashboard.py and main.review_papers.
+    # Keep in sync with the alembic migration; benchmarks/check_query_plans.py verifies them.
+    __table_args__ = (
+        Index('ix_paper_status_next_review_date', 'status', 'next_review_date'),
+        Index('ix_paper_start_date_end_date', 'start_date', 'end_date'),
+        Index('ix_paper_next_review_date', 'next_review_date'),
+        Index('ix_paper_last_reviewed_at', 'last_reviewed_at'),
+        Index('ix_paper_subject_grade', 'subject', 'grade'),
+        Index('ix_paper_type', 'type'),
+        Index('ix_paper_author', 'author'),
+        Index('ix_paper_start_date', 'start_date'),  # (start_date, rowid) order for keyset pages
+    )
+
     id: Optional[int] = Field(primary_key=True, default=None)
     title: str
     description: Optional[str] = Field(default=None)
@@ -19,8 +39,20 @@ class Paper(SQLModel, table=True):
     last_reviewed_at: Optional[datetime] = Field(default=None)
     start_date: Optional[datetime] = Field(default=None)
     end_date: Optional[datetime] = Field(default=None)
+    # Spaced repetition state, see app/services/srs.py
+    srs_interval: Optional[float] = Field(default=None)
+    srs_ease: Optional[float] = Field(default=None)
+    srs_stability: Optional[float] = Field(default=None)
+    srs_difficulty: Optional[float] = Field(default=None)
 
 class WrongQuestion(SQLModel, table=True):
+    __table_args__ = (
+        Index('ix_wrongquestion_subject_difficulty', 'subject', 'difficulty'),
+        Index('ix_wrongquestion_subject_question_type', 'subject', 'question_type'),
+        Index('ix_wrongquestion_difficulty', 'difficulty'),
+        Index('ix_wrongquestion_created_at', 'created_at'),
+    )
+
     id: Optional[int] = Field(primary_key=True, default=None)
     subject: str
     chapter: Optional[str] = Field(default=None)
@@ -32,13 +64,366 @@ class WrongQuestion(SQLModel, table=True):
     review_at: Optional[datetime] = Field(default=None)
     created_at: datetime = Field(default_factory=datetime.utcnow, nullable=False)
     updated_at: datetime = Field(default_factory=datetime.utcnow, nullable=False)
+    # Spaced repetition state, see app/services/srs.py
+    review_stage: Optional[int] = Field(default=0)
+    last_reviewed_at: Optional[datetime] = Field(default=None)
+    srs_interval: Optional[float] = Field(default=None)
+    srs_ease: Optional[float] = Field(default=None)
+    srs_stability: Optional[float] = Field(default=None)
+    srs_difficulty: Optional[float] = Field(default=None)
+
+class Job(SQLModel, table=True):
+    id: str = Field(primary_key=True)
+    kind: str
+    params: str  # JSON encoded job parameters
+    status: str = Field(default="queued")  # queued / running / done / failed / cancelled
+    progress: float = Field(default=0)
+    error: Optional[str] = Field(default=None)
+    errors: Optional[str] = Field(default=None)  # JSON list of the files a merge left out, see merge_error_report
+    result_path: Optional[str] = Field(default=None)
+    timeout: int = Field(default=300)  # seconds
+    created_at: datetime = Field(default_factory=datetime.utcnow, nullable=False)
+    started_at: Optional[datetime] = Field(default=None)
+    finished_at: Optional[datetime] = Field(default=None)
+
+class Blob(SQLModel, table=True):
+    # Content-addressed upload, see app/services/blob_store.py
+    __table_args__ = (
+        Index('ix_blob_path', 'path', unique=True),
+    )
+
+    sha256: str = Field(primary_key=True)
+    path: str
+    size: int
+    refcount: int = Field(default=0)  # wrong question files pointing at path
+    created_at: datetime = Field(default_factory=datetime.utcnow, nullable=False)
+
+# ----------------- Paper interval index -----------------
+# R*Tree over paper spans and review dates for the calendar overlap query. Row id is
+# paper.id * 2 for the span [start_date, end_date or start_date] and paper.id * 2 + 1
+# for the next_review_date point. Bounds are days since 2000-01-01; the R*Tree keeps
+# them as 32-bit floats rounded outwards, so lookups return a superset that the
+# original predicate then filters exactly. Triggers keep it in sync with every write.
+INTERVAL_EPOCH = datetime(2000, 1, 1)
+
+paper_interval = Table(
+    'paper_interval', MetaData(),  # own MetaData: created by the DDL below, not create_all
+    Column('id', Integer, primary_key=True),
+    Column('lo', Float),
+    Column('hi', Float),
+)
+
+_SPAN_BOUNDS = "min(julianday({p}.start_date), julianday(coalesce({p}.end_date, {p}.start_date))) - 2451544.5, " \
+               "max(julianday({p}.start_date), julianday(coalesce({p}.end_date, {p}.start_date))) - 2451544.5"
+_REVIEW_BOUNDS = "julianday({p}.next_review_date) - 2451544.5, julianday({p}.next_review_date) - 2451544.5"
+
+def _insert_intervals(p: str) -> str:
+    return (
+        f"INSERT INTO paper_interval SELECT {p}.id * 2, {_SPAN_BOUNDS.format(p=p)} WHERE {p}.start_date IS NOT NULL;\n"
+        f"        INSERT INTO paper_interval SELECT {p}.id * 2 + 1, {_REVIEW_BOUNDS.format(p=p)} WHERE {p}.next_review_date IS NOT NULL;"
+    )
+
+PAPER_INTERVAL_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS paper_interval USING rtree(id, lo, hi)",
+    f"""CREATE TRIGGER IF NOT EXISTS paper_interval_insert AFTER INSERT ON paper BEGIN
+        {_insert_intervals('new')}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS paper_interval_update AFTER UPDATE OF start_date, end_date, next_review_date ON paper BEGIN
+        DELETE FROM paper_interval WHERE id IN (old.id * 2, old.id * 2 + 1);
+        {_insert_intervals('new')}
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS paper_interval_delete AFTER DELETE ON paper BEGIN
+        DELETE FROM paper_interval WHERE id IN (old.id * 2, old.id * 2 + 1);
+    END""",
+]
+
+PAPER_INTERVAL_BACKFILL = [
+    f"INSERT INTO paper_interval SELECT id * 2, {_SPAN_BOUNDS.format(p='paper')} FROM paper WHERE start_date IS NOT NULL",
+    f"INSERT INTO paper_interval SELECT id * 2 + 1, {_REVIEW_BOUNDS.format(p='paper')} FROM paper WHERE next_review_date IS NOT NULL",
+]
+
+for statement in PAPER_INTERVAL_DDL:
+    event.listen(Paper.__table__, 'after_create', DDL(statement))
+
+def ensure_paper_interval(db_engine: Engine):
+    """Create and fill the interval index on databases whose paper table predates it."""
+    with db_engine.begin() as conn:
+        exists = conn.exec_driver_sql("SELECT 1 FROM sqlite_master WHERE name = 'paper_interval'").first()
+        if exists:
+            return
+        for statement in PAPER_INTERVAL_DDL + PAPER_INTERVAL_BACKFILL:
+            conn.exec_driver_sql(statement)
+        print("Built the paper interval index.")
+
+def interval_bound(value: datetime) -> float:
+    # Aware datetimes are stored without their offset, so compare them the same way
+    return (value.replace(tzinfo=None) - INTERVAL_EPOCH).total_seconds() / 86400
+
+def papers_overlapping(start: datetime, end: datetime):
+    """Subquery of ids of papers whose span or review date may fall in [start, end]."""
+    return select(paper_interval.c.id // 2).where(
+        paper_interval.c.lo <= interval_bound(end), paper_interval.c.hi >= interval_bound(start)
+    )
+
+# ----------------- Paper counters -----------------
+# Summary table behind the dashboard: papers per status (kind 'status', NULL as '') and
+# per day of last review (kind 'reviewed_on', 'YYYY-MM-DD'). Triggers keep it current in
+# the same transaction as every paper write, including the review scheduler's UPDATE;
+# services/stats.py rebuilds it from scratch to check for drift.
+paper_stats = Table(
+    'paper_stats', MetaData(),  # own MetaData: created by the DDL below, not create_all
+    Column('kind', String, primary_key=True),
+    Column('key', String, primary_key=True),
+    Column('count', Integer),
+)
+
+_STATS_KEYS = {
+    'status': "coalesce({p}.status, '')",
+    'reviewed_on': "date({p}.last_reviewed_at)",
+}
+
+def _bump_counters(p: str, delta: int) -> str:
+    return "\n".join(
+        f"        INSERT INTO paper_stats (kind, key, count) SELECT '{kind}', {key.format(p=p)}, {delta} WHERE {key.format(p=p)} IS NOT NULL\n"
+        f"            ON CONFLICT (kind, key) DO UPDATE SET count = count + excluded.count;"
+        for kind, key in _STATS_KEYS.items()
+    )
+
+PAPER_STATS_DDL = [
+    "CREATE TABLE IF NOT EXISTS paper_stats (kind TEXT NOT NULL, key TEXT NOT NULL, count INTEGER NOT NULL, PRIMARY KEY (kind, key)) WITHOUT ROWID",
+    f"""CREATE TRIGGER IF NOT EXISTS paper_stats_insert AFTER INSERT ON paper BEGIN
+{_bump_counters('new', 1)}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS paper_stats_update AFTER UPDATE OF status, last_reviewed_at ON paper BEGIN
+{_bump_counters('old', -1)}
+{_bump_counters('new', 1)}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS paper_stats_delete AFTER DELETE ON paper BEGIN
+{_bump_counters('old', -1)}
+    END""",
+]
+
+# Counts as they should be, straight from the paper table
+PAPER_STATS_QUERY = " UNION ALL ".join(
+    f"SELECT '{kind}' AS kind, {key.format(p='paper')} AS key, count(*) AS count FROM paper "
+    f"WHERE {key.format(p='paper')} IS NOT NULL GROUP BY 2"
+    for kind, key in _STATS_KEYS.items()
+)
 
-path = "./app/db/database.db"
-engine = create_engine(f"sqlite:///{path}",echo=True)
+for statement in PAPER_STATS_DDL:
+    event.listen(Paper.__table__, 'after_create', DDL(statement))
+
+def ensure_paper_stats(db_engine: Engine):
+    """Create and fill the counters on databases whose paper table predates them."""
+    with db_engine.begin() as conn:
+        exists = conn.exec_driver_sql("SELECT 1 FROM sqlite_master WHERE name = 'paper_stats'").first()
+        if exists:
+            return
+        for statement in PAPER_STATS_DDL:
+            conn.exec_driver_sql(statement)
+        conn.exec_driver_sql(f"INSERT INTO paper_stats (kind, key, count) {PAPER_STATS_QUERY}")
+        print("Built the paper counters.")
+
+# ----------------- Wrong question search -----------------
+# question_tag has one row per tag of a wrong question, parsed from the comma separated
+# `tags` (ASCII or full-width commas, surrounding spaces trimmed, blanks dropped). It is
+# keyed by (tag, question_id), so a tag, a tag prefix or an AND/OR of tags is a primary
+# key range. wrongquestion_fts indexes chapter, tags and question_type with the trigram
+# tokenizer: Chinese has no spaces between words, so text matches on any substring of
+# three characters or more. Triggers keep both in sync with every write.
+question_tag = Table(
+    'question_tag', MetaData(),  # own MetaData: created by the DDL below, not create_all
+    Column('tag', String, primary_key=True),
+    Column('question_id', Integer, primary_key=True),
+)
+wrongquestion_fts = Table(
+    'wrongquestion_fts', MetaData(),
+    Column('rowid', Integer, primary_key=True),
+    Column('chapter', String),
+    Column('tags', String),
+    Column('question_type', String),
+)
+
+# `tags` as a JSON array of strings; '[]' if it cannot be one (control characters)
+_TAGS_ARRAY = r"""'["' || replace(replace(replace(replace(coalesce({p}.tags, ''), '\', '\\'), '"', '\"'), '，', ','), ',', '","') || '"]'"""
+
+def _insert_tags(p: str, source: str = '') -> str:
+    # `source` joins a table to read every row of instead of the trigger's row
+    array = _TAGS_ARRAY.format(p=p)
+    return (
+        f"INSERT OR IGNORE INTO question_tag (tag, question_id) SELECT trim(value), {p}.id "
+        f"FROM {source}json_each(CASE WHEN json_valid({array}) THEN {array} ELSE '[]' END) WHERE trim(value) != ''"
+    )
+
+def _fts_row(p: str, command: str = '') -> str:
+    if command:
+        return f"INSERT INTO wrongquestion_fts (wrongquestion_fts, rowid, chapter, tags, question_type) VALUES ('{command}', {p}.id, {p}.chapter, {p}.tags, {p}.question_type)"
+    return f"INSERT INTO wrongquestion_fts (rowid, chapter, tags, question_type) VALUES ({p}.id, {p}.chapter, {p}.tags, {p}.question_type)"
+
+QUESTION_SEARCH_DDL = [
+    "CREATE TABLE IF NOT EXISTS question_tag (tag TEXT NOT NULL, question_id INTEGER NOT NULL, PRIMARY KEY (tag, question_id)) WITHOUT ROWID",
+    "CREATE INDEX IF NOT EXISTS ix_question_tag_question_id ON question_tag (question_id)",
+    "CREATE VIRTUAL TABLE IF NOT EXISTS wrongquestion_fts USING fts5(chapter, tags, question_type, "
+    "content='wrongquestion', content_rowid='id', tokenize='trigram')",
+    f"""CREATE TRIGGER IF NOT EXISTS wrongquestion_search_insert AFTER INSERT ON wrongquestion BEGIN
+        {_insert_tags('new')};
+        {_fts_row('new')};
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS wrongquestion_search_update AFTER UPDATE OF chapter, tags, question_type ON wrongquestion BEGIN
+        DELETE FROM question_tag WHERE question_id = old.id;
+        {_insert_tags('new')};
+        {_fts_row('old', 'delete')};
+        {_fts_row('new')};
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS wrongquestion_search_delete AFTER DELETE ON wrongquestion BEGIN
+        DELETE FROM question_tag WHERE question_id = old.id;
+        {_fts_row('old', 'delete')};
+    END""",
+]
+
+QUESTION_SEARCH_BACKFILL = [
+    _insert_tags('wrongquestion', source='wrongquestion, '),
+    "INSERT INTO wrongquestion_fts (wrongquestion_fts) VALUES ('rebuild')",
+]
+
+for statement in QUESTION_SEARCH_DDL:
+    event.listen(WrongQuestion.__table__, 'after_create', DDL(statement))
+
+def ensure_question_search(db_engine: Engine):
+    """Create and fill the tag and full-text indexes on databases whose wrongquestion table predates them."""
+    with db_engine.begin() as conn:
+        exists = conn.exec_driver_sql("SELECT 1 FROM sqlite_master WHERE name = 'question_tag'").first()
+        if exists:
+            return
+        for statement in QUESTION_SEARCH_DDL + QUESTION_SEARCH_BACKFILL:
+            conn.exec_driver_sql(statement)
+        print("Built the wrong question search index.")
+
+def split_tags(tags: Optional[str]) -> List[str]:
+    """Tags of a comma separated string, the way the triggers store them."""
+    return list(dict.fromkeys(t.strip(' ') for t in (tags or '').replace('，', ',').split(',') if t.strip(' ')))
+
+def questions_tagged(tags: List[str], match_all: bool = True):
+    """Subquery of ids of wrong questions with all (or any) of `tags`. A tag ending in * matches as a prefix."""
+    selects = []
+    for tag in tags:
+        if tag.endswith('*'):
+            prefix = tag[:-1]
+            condition = and_(question_tag.c.tag >= prefix, question_tag.c.tag < prefix + '\U0010ffff')
+        else:
+            condition = question_tag.c.tag == tag
+        selects.append(select(question_tag.c.question_id).where(condition))
+    if len(selects) == 1:
+        return selects[0]
+    return intersect(*selects) if match_all else union(*selects)
+
+def question_text_filters(query: str) -> list:
+    """
+    Conditions matching wrong questions whose chapter, tags or question type contain every
+    word of `query`. Words of three characters or more use the full-text index; shorter
+    ones, which the trigram tokenizer cannot look up, fall back to LIKE.
+    """
+    words = query.split()
+    phrases = ['"' + word.replace('"', '""') + '"' for word in words if len(word) >= 3]
+    conditions = []
+    if phrases:
+        conditions.append(WrongQuestion.id.in_(
+            select(wrongquestion_fts.c.rowid).where(literal_column('wrongquestion_fts').op('MATCH')(' '.join(phrases)))
+        ))
+    for word in words:
+        if len(word) < 3:
+            conditions.append(or_(*(
+                column.contains(word, autoescape=True)
+                for column in (WrongQuestion.chapter, WrongQuestion.tags, WrongQuestion.question_type)
+            )))
+    return conditions
+
+# ----------------- Engine profiles -----------------
+# Pragmas applied to every new connection. "production" is the default; "compat" keeps
+# SQLite's own defaults (rollback journal, synchronous=FULL) for comparison and debugging.
+ENGINE_PROFILES: Dict[str, Dict[str, Any]] = {
+    "production": {
+        "journal_mode": "WAL",        # readers no longer block on the writer
+        "synchronous": "NORMAL",      # safe with WAL; only the last commits can be lost on power failure
+        "mmap_size": 256 * 1024 * 1024,
+        "cache_size": -64 * 1024,     # negative means KiB, so 64MB per connection
+        "busy_timeout": 5000,         # ms to wait for a lock instead of failing at once
+        "temp_store": "MEMORY",
+    },
+    "compat": {
+        "journal_mode": "DELETE",
+        "synchronous": "FULL",
+    },
+}
+DEFAULT_PROFILE = "production"
+
+def get_profile_name() -> str:
+    """LMS_DB_PROFILE, then "db_profile" in settings.json, then the default."""
+    name = os.environ.get('LMS_DB_PROFILE')
+    if not name:
+        from app.routers.settings import load_settings
+        name = load_settings().get('db_profile', DEFAULT_PROFILE)
+    if name not in ENGINE_PROFILES:
+        print(f"Unknown database profile '{name}', using '{DEFAULT_PROFILE}'.")
+        name = DEFAULT_PROFILE
+    return name
+
+def _log_sampled_sql(rate: float):
+    def log(conn, cursor, statement, parameters, context, executemany):
+        if random.random() < rate:
+            print(f"[sql] {' '.join(statement.split())} {parameters}")
+    return log
+
+def _configure_engine(db_engine: Engine, profile: str, sql_echo: str):
+    pragmas = ENGINE_PROFILES[profile]
+
+    @event.listens_for(db_engine, "connect")
+    def apply_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+    if sql_echo not in ('off', 'all', ''):
+        try:
+            rate = float(sql_echo)
+        except ValueError:
+            print(f"Invalid LMS_SQL_ECHO '{sql_echo}', SQL logging is off.")
+        else:
+            event.listen(db_engine, "before_cursor_execute", _log_sampled_sql(rate))
+    metrics.instrument_engine(db_engine)
+
+def _sql_echo_setting(sql_echo: Optional[str]) -> str:
+    return (sql_echo if sql_echo is not None else os.environ.get('LMS_SQL_ECHO', 'off')).lower()
+
+def create_db_engine(url: str, profile: str = DEFAULT_PROFILE, sql_echo: Optional[str] = None) -> Engine:
+    """
+    Create an engine whose connections get the pragmas of `profile`.
+    `sql_echo` (default LMS_SQL_ECHO) is "off", "all", or a sampling rate such as "0.01".
+    """
+    sql_echo = _sql_echo_setting(sql_echo)
+    db_engine = create_engine(url, echo=sql_echo == 'all')
+    _configure_engine(db_engine, profile, sql_echo)
+    return db_engine
+
+def create_async_db_engine(url: str, profile: str = DEFAULT_PROFILE, sql_echo: Optional[str] = None) -> AsyncEngine:
+    """The aiosqlite counterpart of create_db_engine, with the same pragmas and logging."""
+    sql_echo = _sql_echo_setting(sql_echo)
+    db_engine = create_async_engine(url, echo=sql_echo == 'all')
+    _configure_engine(db_engine.sync_engine, profile, sql_echo)
+    return db_engine
+
+path = os.environ.get('LMS_DB_PATH', "./app/db/database.db")
+DB_PROFILE = get_profile_name()
+engine = create_db_engine(f"sqlite:///{path}", DB_PROFILE)
+async_engine = create_async_db_engine(f"sqlite+aiosqlite:///{path}", DB_PROFILE)
 
 # ----------------- 数据库操作函数 -----------------
 def create_db_and_tables():
     SQLModel.metadata.create_all(engine)
+    ensure_paper_interval(engine)
+    ensure_paper_stats(engine)
+    ensure_question_search(engine)
 
 def get_session():
     with Session(engine) as session:
@@ -46,4 +431,11 @@ def get_session():
 
 SessionDep = Annotated[Session, Depends(get_session)]
 
+async def get_async_session() -> AsyncGenerator[AsyncSession, None]:
+    # Attributes stay loaded after commit; reloading them lazily is not possible on an async session
+    async with AsyncSession(async_engine, expire_on_commit=False) as session:
+        yield session
+
+AsyncSessionDep = Annotated[AsyncSession, Depends(get_async_session)]
+
 
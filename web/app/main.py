@@ -1,42 +1,44 @@
-from fastapi import FastAPI, Depends, HTTPException
+from fastapi import FastAPI, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import FileResponse
 from fastapi.middleware.cors import CORSMiddleware
 import os
-from fastapi.responses import FileResponse
 from app.db import SQLite_DB
-from app.routers import paper, dashboard, pdf_generator, wrong_question_book, settings
+from app.routers import paper, dashboard, pdf_generator, wrong_question_book, settings, jobs, events
+from app.services import events as event_publisher, font_cache, metrics, pdf_merge, previews, profiler, srs, stats
+from app.services.file_server import file_cache, serve_file
+from app.services.jobs import job_manager
+from app.services.http_cache import table_versions
+from app.services.review_scheduler import review_scheduler
 from apscheduler.schedulers.background import BackgroundScheduler
-from datetime import datetime, timedelta
-from sqlmodel import select, Session
 import time
 
-# Ebbinghaus intervals in days
-review_intervals = [1, 2, 4, 7, 15, 30, 60]
-
 def review_papers():
     """
-    Check for papers that are due for review and update their status.
+    Flip papers that are due for review right now. The review scheduler does this on its own
+    as each review date passes; this runs it on demand.
     """
-    with Session(SQLite_DB.engine) as session:
-        papers_to_review = session.exec(
-            select(SQLite_DB.Paper).where(
-                SQLite_DB.Paper.status == "3",  # Status '3' means '已完成'
-                SQLite_DB.Paper.next_review_date <= datetime.now()
-            )
-        ).all()
-
-        for paper in papers_to_review:
-            paper.status = "4"  # Status '4' means '未复习' (Pending Review)
-            session.add(paper)
-
-        session.commit()
-        if papers_to_review:
-            print(f"Checked for reviews at {datetime.now()}. Found {len(papers_to_review)} papers to review.")
+    return review_scheduler.flip_due()
 
 def cleanup_tmp_directory():
     """
-    Deletes files in the tmp directory that are older than 24 hours.
+    Evicts least recently used worksheet PDFs and previews once their caches are over budget,
+    removes partial files that crashed writes left in them, and deletes one-off files in the tmp
+    directory that are older than 24 hours.
     """
-    TMP_DIR = os.path.join(os.path.dirname(__file__), 'app', 'tmp')
+    removed = pdf_generator.pdf_cache.evict()
+    if removed:
+        print(f"Evicted {removed} cached worksheet PDFs.")
+    removed = previews.preview_cache.evict()
+    if removed:
+        print(f"Evicted {removed} cached previews.")
+    removed = pdf_generator.pdf_cache.sweep_partial() + previews.preview_cache.sweep_partial()
+    if removed:
+        print(f"Removed {removed} partial cache files.")
+    purged = job_manager.purge_finished()
+    if purged:
+        print(f"Purged {purged} finished jobs.")
+
+    TMP_DIR = pdf_generator.TMP_DIR
     if not os.path.exists(TMP_DIR):
         return
 
@@ -68,78 +70,125 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(profiler.ProfilerMiddleware)
+# Outermost, so the time covers the other middleware too
+app.add_middleware(metrics.MetricsMiddleware)
 
 app.include_router(paper.router)
 app.include_router(dashboard.router)
 app.include_router(pdf_generator.router)
 app.include_router(wrong_question_book.router)
 app.include_router(settings.router)
+app.include_router(jobs.router)
+app.include_router(events.router)
 
 @app.on_event("startup")
 async def startup():
     SQLite_DB.create_db_and_tables()
+    if os.path.exists(pdf_generator.FONT_PATH):
+        # Parse the CJK font once up front instead of on the first worksheet request
+        font_cache.preload('NotoSansSC', pdf_generator.FONT_PATH)
     # Initialize scheduler
     scheduler = BackgroundScheduler()
-    scheduler.add_job(review_papers, 'interval', hours=12)
-    scheduler.add_job(cleanup_tmp_directory, 'interval', hours=1)
+    # Resync the review heap in case papers were changed outside the API
+    scheduler.add_job(metrics.track_job('review_reload', review_scheduler.load), 'interval', hours=12)
+    scheduler.add_job(metrics.track_job('cleanup_tmp', cleanup_tmp_directory), 'interval', hours=1)
+    scheduler.add_job(metrics.track_job('expire_jobs', job_manager.expire_overdue), 'interval', minutes=1)
+    scheduler.add_job(metrics.track_job('check_paper_stats', stats.check_paper_stats), 'interval', hours=24, kwargs={'repair': True})
     scheduler.start()
-    print("Scheduler started. The review job will run every 12 hours.")
+    print("Scheduler started.")
+    review_scheduler.start()
+    print(f"Review scheduler started with {review_scheduler.pending_count()} upcoming reviews.")
+    job_manager.start()
+
+@app.on_event("shutdown")
+async def shutdown():
+    review_scheduler.shutdown()
+    job_manager.shutdown()
+    pdf_merge.shutdown_pool()
+    previews.shutdown()
+    file_cache.clear()
+    await SQLite_DB.async_engine.dispose()
 
 @app.post("/paper/{paper_id}/complete")
-def complete_paper(paper_id: int, session: SQLite_DB.SessionDep):
+async def complete_paper(paper_id: int, session: SQLite_DB.AsyncSessionDep):
     """
     Mark a paper as completed for the first time, starting the review cycle.
     """
-    paper = session.get(SQLite_DB.Paper, paper_id)
+    paper = await session.get(SQLite_DB.Paper, paper_id)
     if not paper:
         raise HTTPException(status_code=404, detail="Paper not found")
 
+    previous_status, previous_reviewed_at = paper.status, paper.last_reviewed_at
     paper.status = "3"  # Status '3' means '已完成'
-    paper.review_stage = 0
-    paper.last_reviewed_at = datetime.now()
-    paper.next_review_date = datetime.now() + timedelta(days=review_intervals[0])
+    srs.learn(paper)
 
     session.add(paper)
-    session.commit()
-    session.refresh(paper)
+    await session.commit()
+    await session.refresh(paper)
+    table_versions.bump('paper')
+    review_scheduler.schedule(paper)
+    event_publisher.paper_changed(paper, previous_status, previous_reviewed_at)
     return paper
 
 @app.post("/paper/{paper_id}/review")
-def mark_as_reviewed(paper_id: int, session: SQLite_DB.SessionDep):
+async def mark_as_reviewed(
+    paper_id: int,
+    session: SQLite_DB.AsyncSessionDep,
+    rating: int = Query(srs.GOOD, ge=srs.AGAIN, le=srs.EASY),
+):
     """
-    Mark a paper as reviewed, advancing its review stage.
+    Mark a paper as reviewed, advancing its review stage. `rating` is how well it was
+    remembered: 1 again, 2 hard, 3 good, 4 easy.
     """
-    paper = session.get(SQLite_DB.Paper, paper_id)
+    paper = await session.get(SQLite_DB.Paper, paper_id)
     if not paper:
         raise HTTPException(status_code=404, detail="Paper not found")
 
+    previous_status, previous_reviewed_at = paper.status, paper.last_reviewed_at
     paper.status = "3"  # Status '3' means '已完成'
-    paper.review_stage += 1
-    paper.last_reviewed_at = datetime.now()
-
-    # If the review stage is within our defined intervals, set the next review date.
-    if paper.review_stage < len(review_intervals):
-        days_to_add = review_intervals[paper.review_stage]
-        paper.next_review_date = datetime.now() + timedelta(days=days_to_add)
-    else:
-        # If all review cycles are complete, we'll just set the next_review_date to None.
-        paper.next_review_date = None
+    # The next review date comes from the configured algorithm; None once the cycle is complete
+    srs.review(paper, rating)
 
     session.add(paper)
-    session.commit()
-    session.refresh(paper)
+    await session.commit()
+    await session.refresh(paper)
+    table_versions.bump('paper')
+    review_scheduler.schedule(paper)
+    event_publisher.paper_changed(paper, previous_status, previous_reviewed_at)
     return paper
 
+@app.get("/metrics")
+def get_metrics():
+    """Request latencies, DB time, scheduler jobs and PDF timings in the Prometheus text format."""
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+@app.get(profiler.PROFILE_ROUTE + "{profile_id}")
+def get_profile(profile_id: str, request: Request):
+    """Collapsed stacks of a profiled request, for flamegraph.pl or speedscope. Takes the profiling token too."""
+    if not profiler.authorized(profiler.requested_token(request.scope)):
+        raise HTTPException(status_code=403, detail="Profiling is not enabled or the token is wrong")
+    path = profiler.profile_path(profile_id)
+    if path is None or not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, media_type='text/plain; charset=utf-8', filename=f"{profile_id}.folded")
+
 @app.get("/")
 def root():
     return {"message": "Hello World"}
 
-@app.get("/pdf")
-async def root(filename: str):
-    file_path = os.path.join("/Volumes/WD_8TB_1", filename)
-    if not os.path.exists(file_path):
+PDF_ROOT = os.environ.get('LMS_PDF_ROOT', "/Volumes/WD_8TB_1")
+
+@app.api_route("/pdf", methods=["GET", "HEAD"])
+async def root(request: Request, filename: str):
+    """Serves a paper's PDF with Range and conditional GET support, so viewers can seek without downloading it all."""
+    file_path = os.path.normpath(os.path.join(PDF_ROOT, filename))
+    if os.path.commonpath([file_path, os.path.normpath(PDF_ROOT)]) != os.path.normpath(PDF_ROOT):
+        return {"error": "File not found"}  # Outside the volume
+    response = await serve_file(request, file_path, media_type="application/pdf")
+    if response is None:
         return {"error": "File not found"}
-    return FileResponse(file_path, media_type="application/pdf")
+    return response
 
 if __name__ == "__main__":
     import uvicorn
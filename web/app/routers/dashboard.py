@@ -1,6 +1,9 @@
-from fastapi import APIRouter, Depends
-from sqlmodel import select, func
+from fastapi import APIRouter, Depends, Request
+from fastapi.responses import Response
+from sqlmodel import select
 from app.db import SQLite_DB
+from app.services import stats
+from app.services.http_cache import cached_json
 from typing import List, Dict, Any
 from datetime import date, timedelta, datetime
 
@@ -10,51 +13,40 @@ router = APIRouter(
 )
 
 @router.get("/stats")
-def get_dashboard_stats(session: SQLite_DB.SessionDep) -> Dict[str, Any]:
+async def get_dashboard_stats(request: Request, session: SQLite_DB.AsyncSessionDep) -> Response:
+    # The lists and the chart window move with the date, so it is part of the ETag
+    return await cached_json(request, ('paper',), lambda: load_dashboard_stats(session), vary=(date.today().isoformat(),))
+
+async def load_dashboard_stats(session) -> Dict[str, Any]:
     today = date.today()
     start_of_day = datetime.combine(today, datetime.min.time())
     end_of_day = datetime.combine(today, datetime.max.time())
     one_week_ago = start_of_day - timedelta(days=7)
 
     # 1. Tasks due today and to review
-    tasks_due_today = session.exec(
+    tasks_due_today = (await session.exec(
         select(SQLite_DB.Paper).where(SQLite_DB.Paper.start_date >= start_of_day, SQLite_DB.Paper.start_date <= end_of_day)
-    ).all()
-    tasks_to_review = session.exec(select(SQLite_DB.Paper).where(SQLite_DB.Paper.status == '4')).all()
+    )).all()
+    tasks_to_review = (await session.exec(select(SQLite_DB.Paper).where(SQLite_DB.Paper.status == '4'))).all()
 
-    # 2. Stats cards
-    pending_review_count = len(tasks_to_review)
-    in_progress_count = session.exec(
-        select(func.count(SQLite_DB.Paper.id)).where(SQLite_DB.Paper.status.in_(['2', '5']))
-    ).one()
-    completed_this_week_count = session.exec(
-        select(func.count(SQLite_DB.Paper.id)).where(SQLite_DB.Paper.last_reviewed_at >= one_week_ago)
-    ).one()
+    # 2. Stats cards, from the counters kept by triggers on paper
+    status_counts = await stats.status_counts(session, ['2', '4', '5'])
+    reviewed = await stats.reviewed_per_day(session, one_week_ago.date())
 
     stats_cards = {
-        "pending_review_count": pending_review_count,
-        "in_progress_count": in_progress_count,
-        "completed_this_week_count": completed_this_week_count
+        "pending_review_count": status_counts['4'],
+        "in_progress_count": status_counts['2'] + status_counts['5'],
+        "completed_this_week_count": sum(reviewed.values())
     }
 
     # 3. Activity chart (last 7 days)
-    activity_query = session.exec(
-        select(
-            func.date(SQLite_DB.Paper.last_reviewed_at),
-            func.count(SQLite_DB.Paper.id)
-        )
-        .where(SQLite_DB.Paper.last_reviewed_at >= one_week_ago)
-        .group_by(func.date(SQLite_DB.Paper.last_reviewed_at))
-    ).all()
-    
-    activity_map = {str(d): c for d, c in activity_query}
     activity_chart_data = []
     for i in range(7):
         current_date = today - timedelta(days=i)
         date_str = current_date.isoformat()
         activity_chart_data.append({
             "date": date_str,
-            "count": activity_map.get(date_str, 0)
+            "count": reviewed.get(date_str, 0)
         })
     activity_chart_data.reverse() # Order from past to present
 
@@ -0,0 +1,67 @@
+from fastapi import APIRouter, Header, Request
+from fastapi.responses import StreamingResponse
+from typing import Optional
+import asyncio
+import json
+
+from app.services.events import event_bus
+
+router = APIRouter(
+    tags=["events"],
+    prefix="/events",
+)
+
+HEARTBEAT_SECONDS = 15
+RETRY_MS = 3000
+
+@router.get("/stream")
+async def stream_events(
+    request: Request,
+    types: Optional[str] = None,
+    last_event_id: Optional[str] = Header(None),
+):
+    """
+    Server-Sent Events stream of changes (see services/events.py for the event types).
+    `types` is a comma separated filter; resync events are always sent. Browsers send
+    Last-Event-ID when they reconnect and get the events they missed.
+    """
+    wanted = {name.strip() for name in types.split(',') if name.strip()} if types else None
+    async def generate():
+        # Subscribed here rather than before the response starts: only the generator's finally
+        # closes it, and that does not run for a client that leaves before the first chunk
+        subscription = event_bus.subscribe(wanted)
+        try:
+            backlog = []
+            # Events published between subscribe() and since() are both queued and in the backlog
+            sent_id = 0
+            if last_event_id and last_event_id.isdigit():
+                missed = event_bus.since(int(last_event_id))
+                if missed is None:
+                    sent_id = event_bus.last_id
+                    backlog = [f"id: {sent_id}\nevent: resync\ndata: {json.dumps({'reason': 'reconnect'})}\n\n"]
+                else:
+                    sent_id = missed[-1].id if missed else 0
+                    backlog = [event.encode() for event in missed if subscription.wants(event)]
+
+            yield f"retry: {RETRY_MS}\n\n"
+            for message in backlog:
+                yield message
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscription.get(), timeout=HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": keepalive\n\n"  # Comment line: keeps proxies from closing an idle stream
+                    continue
+                if event.id <= sent_id and event.type != 'resync':
+                    continue  # Already in the backlog
+                yield event.encode()
+        finally:
+            subscription.close()
+
+    return StreamingResponse(
+        generate(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -0,0 +1,95 @@
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import FileResponse
+from pydantic import BaseModel
+from sqlmodel import select
+from app.db import SQLite_DB
+from app.services.jobs import job_manager, JobQueueFull
+from typing import Optional, List
+import json
+import os
+
+from .wrong_question_book import collect_book_files, in_requested_order, merge_error_headers
+
+router = APIRouter(
+    tags=["jobs"],
+    prefix="/jobs",
+)
+
+class WorksheetJobRequest(BaseModel):
+    problem_type: str
+    max_number: int = 20
+    min_number: int = 1
+    num_operands: int = 2
+    operators: str = 'add_subtract'
+    num_problems: int = 50
+    op_mode: str = 'mixed'
+    seed: Optional[int] = None
+    timeout: Optional[int] = None
+
+class WrongQuestionBookJobRequest(BaseModel):
+    question_ids: List[int]
+    timeout: Optional[int] = None
+
+RESULT_FILENAMES = {
+    'worksheet': "math_problems.pdf",
+    'wrong_question_book': "wrong_question_book.pdf",
+}
+
+def job_to_dict(job: SQLite_DB.Job):
+    return {
+        "id": job.id,
+        "kind": job.kind,
+        "status": job.status,
+        "progress": job.progress,
+        "error": job.error,
+        "errors": json.loads(job.errors) if job.errors else [],
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+    }
+
+def submit(session, kind: str, params: dict, timeout: Optional[int]):
+    try:
+        job = job_manager.submit(session, kind, params, timeout)
+    except JobQueueFull:
+        raise HTTPException(status_code=429, detail="Too many jobs in the queue, try again later")
+    return {"job_id": job.id}
+
+@router.post("/worksheet")
+def submit_worksheet_job(session: SQLite_DB.SessionDep, request: WorksheetJobRequest):
+    params = request.model_dump(exclude={'timeout'})
+    return submit(session, 'worksheet', params, request.timeout)
+
+@router.post("/wrong_question_book")
+def submit_wrong_question_book_job(session: SQLite_DB.SessionDep, request: WrongQuestionBookJobRequest):
+    questions = session.exec(select(SQLite_DB.WrongQuestion).where(SQLite_DB.WrongQuestion.id.in_(request.question_ids))).all()
+    question_paths, answer_paths = collect_book_files(in_requested_order(questions, request.question_ids))
+    params = {'question_paths': question_paths, 'answer_paths': answer_paths}
+    return submit(session, 'wrong_question_book', params, request.timeout)
+
+@router.get("/{job_id}")
+def get_job(session: SQLite_DB.SessionDep, job_id: str):
+    job = session.get(SQLite_DB.Job, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job_to_dict(job)
+
+@router.get("/{job_id}/result")
+def get_job_result(session: SQLite_DB.SessionDep, job_id: str):
+    job = session.get(SQLite_DB.Job, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job.status != 'done':
+        raise HTTPException(status_code=409, detail=f"Job is {job.status}")
+    if not job.result_path or not os.path.exists(job.result_path):
+        raise HTTPException(status_code=410, detail="Job result has expired")
+    headers = merge_error_headers(json.loads(job.errors)) if job.errors is not None else None
+    return FileResponse(job.result_path, media_type='application/pdf', filename=RESULT_FILENAMES.get(job.kind, "result.pdf"), headers=headers)
+
+@router.delete("/{job_id}")
+def cancel_job(session: SQLite_DB.SessionDep, job_id: str):
+    job = session.get(SQLite_DB.Job, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    job = job_manager.cancel(session, job)
+    return job_to_dict(job)
@@ -1,9 +1,17 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Form, UploadFile, File
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from sqlmodel import select, or_, and_
+from sqlalchemy import delete, update
 from app.db import SQLite_DB
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Callable, Tuple
 from datetime import datetime, date, timedelta
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
+from types import SimpleNamespace
+from app.services.pagination import paginate, PaginationError, MAX_PAGE_SIZE
+from app.services import bulk_io, events, srs
+from app.services.http_cache import cached_json, table_versions
+from app.services.review_scheduler import review_scheduler
 
 router = APIRouter(
     tags=["paper"],
@@ -39,9 +47,7 @@ def parse_date_fields(data: Dict[str, Any]) -> Dict[str, Any]:
             continue # Keep None as is
     return data
 
-@router.get("/")
-def get_paper(
-    session: SQLite_DB.SessionDep,
+def build_paper_query(
     author: Optional[str] = None,
     type: Optional[str] = None,
     status: Optional[str] = None,
@@ -50,8 +56,7 @@ def get_paper(
     academic_only: bool = False,
     start_date: Optional[datetime] = None,
     end_date: Optional[datetime] = None
-) -> list[SQLite_DB.Paper]:
-    
+):
     query = select(SQLite_DB.Paper)
 
     if grade and grade != '0':
@@ -69,6 +74,8 @@ def get_paper(
         query = query.where(SQLite_DB.Paper.type.in_(ACADEMIC_TYPES))
 
     if start_date and end_date:
+        # The interval index narrows the candidates; the predicate below is the exact check
+        query = query.where(SQLite_DB.Paper.id.in_(SQLite_DB.papers_overlapping(start_date, end_date)))
         query = query.where(
             or_(
                 # It's a multi-day event that overlaps the range
@@ -94,66 +101,312 @@ def get_paper(
             )
         )
 
-    papers = session.exec(query).all()
-    
-    return papers
+    return query
+
+# Each has an index ordered by (column, id), so any page is an index seek
+PAPER_SORT_KEYS = ('start_date', 'id', 'next_review_date', 'last_reviewed_at')
+
+@router.get("/")
+async def get_paper(
+    request: Request,
+    session: SQLite_DB.AsyncSessionDep,
+    author: Optional[str] = None,
+    type: Optional[str] = None,
+    status: Optional[str] = None,
+    subject: Optional[str] = None,
+    grade: Optional[str] = None,
+    academic_only: bool = False,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    sort: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    with_total: bool = False,
+):
+    """
+    Without paging parameters this returns every matching paper as a list.
+    With any of sort/limit/cursor/fields/with_total it returns one page:
+    {"items", "next_cursor", "total"}; pass next_cursor back for the next page.
+    Responses carry an ETag; If-None-Match gets a 304 until a paper changes.
+    """
+    async def load():
+        query = build_paper_query(author, type, status, subject, grade, academic_only, start_date, end_date)
+        if sort is None and limit is None and cursor is None and fields is None and not with_total:
+            return (await session.exec(query)).all()
+        try:
+            return await paginate(session, query, SQLite_DB.Paper, PAPER_SORT_KEYS, sort, limit, cursor, fields, with_total)
+        except PaginationError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    return await cached_json(request, ('paper',), load)
+
+def paper_from_row(row: Dict[str, Any]):
+    """A paper to import. Dates are parsed like POST /paper/ does, but one that cannot be is an error, not None."""
+    given = [field for field in DATE_FIELDS if isinstance(row.get(field), str)]
+    cleaned_data = parse_date_fields(row)
+    invalid = [field for field in given if cleaned_data[field] is None]
+    if invalid:
+        raise bulk_io.RowError(f"Invalid date in {', '.join(invalid)}")
+    return bulk_io.row_model(SQLite_DB.Paper).model_validate(cleaned_data)
+
+@router.post("/import")
+async def import_papers(file: UploadFile = File(...), format: Optional[str] = Form(None)):
+    """
+    Import papers from NDJSON (one object per line) or CSV with a header row, both with the
+    fields of a paper; the format follows the file name unless given. Invalid rows are skipped
+    and reported as {"imported", "failed", "errors": [{"line", "error"}]}.
+    """
+    try:
+        fmt = bulk_io.guess_format(file.filename, format)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    report = await run_in_threadpool(
+        bulk_io.import_rows, SQLite_DB.engine, SQLite_DB.Paper.__table__, bulk_io.read_rows(file.file, fmt), paper_from_row
+    )
+    if report["imported"]:
+        table_versions.bump('paper')
+        await run_in_threadpool(review_scheduler.load)
+        events.resync('import')
+    return report
+
+@router.get("/export")
+async def export_papers(
+    format: str = Query('ndjson', pattern='^(ndjson|csv)$'),
+    author: Optional[str] = None,
+    type: Optional[str] = None,
+    status: Optional[str] = None,
+    subject: Optional[str] = None,
+    grade: Optional[str] = None,
+    academic_only: bool = False,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+):
+    """Stream the papers matching the GET /paper/ filters as NDJSON or CSV, in id order. Re-importable as is."""
+    fields = list(SQLite_DB.Paper.__table__.columns.keys())
+    query = build_paper_query(author, type, status, subject, grade, academic_only, start_date, end_date)
+    query = query.with_only_columns(*SQLite_DB.Paper.__table__.columns).order_by(SQLite_DB.Paper.id)
+    return StreamingResponse(
+        bulk_io.export_rows(SQLite_DB.engine, query, format, fields),
+        media_type=bulk_io.MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="papers.{format}"'},
+    )
 
 @router.post("/")
-def create_paper(
-    session: SQLite_DB.SessionDep,
+async def create_paper(
+    session: SQLite_DB.AsyncSessionDep,
     paper_data: Dict[str, Any]
 ) -> SQLite_DB.Paper:
     cleaned_data = parse_date_fields(paper_data)
     paper = SQLite_DB.Paper.model_validate(cleaned_data)
     session.add(paper)
-    session.commit()
-    session.refresh(paper)
+    await session.commit()
+    await session.refresh(paper)
+    table_versions.bump('paper')
+    review_scheduler.schedule(paper)
+    events.paper_changed(paper, None, None)
     return paper
 
 @router.put("/")
-def update_paper(
-    session: SQLite_DB.SessionDep,
+async def update_paper(
+    session: SQLite_DB.AsyncSessionDep,
     paper_data: Dict[str, Any]
 ):
     paper_id = paper_data.get('id')
     if not paper_id:
         raise HTTPException(status_code=400, detail="Paper ID is required for update")
 
-    updateTarget = session.get(SQLite_DB.Paper, paper_id)
+    updateTarget = await session.get(SQLite_DB.Paper, paper_id)
     if not updateTarget:
         raise HTTPException(status_code=404, detail="Paper not found")
 
     cleaned_data = parse_date_fields(paper_data)
+    tracked = lambda p: (p.status, p.last_reviewed_at, p.next_review_date, p.start_date)
+    previous = tracked(updateTarget)
     for key, value in cleaned_data.items():
         setattr(updateTarget, key, value)
     
     session.add(updateTarget)
-    session.commit()
-    session.refresh(updateTarget)
+    await session.commit()
+    await session.refresh(updateTarget)
+    table_versions.bump('paper')
+    review_scheduler.schedule(updateTarget)
+    if previous != tracked(updateTarget):
+        events.paper_changed(updateTarget, previous[0], previous[1])
     
     return {"status": "200", "message": "Paper updated successfully"}
 
 @router.put("/{paper_id}/status")
-def update_paper_status(paper_id: int, status_update: PaperStatusUpdate, session: SQLite_DB.SessionDep):
-    paper = session.get(SQLite_DB.Paper, paper_id)
+async def update_paper_status(paper_id: int, status_update: PaperStatusUpdate, session: SQLite_DB.AsyncSessionDep):
+    paper = await session.get(SQLite_DB.Paper, paper_id)
     if not paper:
         raise HTTPException(status_code=404, detail="Paper not found")
     
+    previous_status = paper.status
     paper.status = status_update.status
     session.add(paper)
-    session.commit()
-    session.refresh(paper)
+    await session.commit()
+    await session.refresh(paper)
+    table_versions.bump('paper')
+    review_scheduler.schedule(paper)
+    if paper.status != previous_status:
+        events.paper_changed(paper, previous_status, paper.last_reviewed_at)
     return paper
 
 @router.delete("/{id}/")
-def delete_paper(id: int, session: SQLite_DB.SessionDep):
-    paper = session.get(SQLite_DB.Paper, id)
+async def delete_paper(id: int, session: SQLite_DB.AsyncSessionDep):
+    paper = await session.get(SQLite_DB.Paper, id)
     if not paper:
         raise HTTPException(status_code=404, detail="Paper not found")
     
-    session.delete(paper)
-    session.commit()
+    await session.delete(paper)
+    await session.commit()
+    table_versions.bump('paper')
+    review_scheduler.unschedule(id)
+    events.paper_deleted(paper)
     
     return {"status": "200", "message": "Paper deleted successfully"}
 
+# ----------------- Batches -----------------
+MAX_BATCH_IDS = 10000
+
+class PaperFilter(BaseModel):
+    """The filters of GET /paper/."""
+    author: Optional[str] = None
+    type: Optional[str] = None
+    status: Optional[str] = None
+    subject: Optional[str] = None
+    grade: Optional[str] = None
+    academic_only: bool = False
+    start_date: Optional[datetime] = None
+    end_date: Optional[datetime] = None
+
+class PaperBatch(BaseModel):
+    """Papers to change: the listed ids, the papers matching the filter, or the listed ids that match it."""
+    ids: Optional[List[int]] = None
+    filter: Optional[PaperFilter] = None
+
+class PaperBatchStatus(PaperBatch):
+    status: str
+
+class PaperBatchReview(PaperBatch):
+    rating: int = Field(srs.GOOD, ge=srs.AGAIN, le=srs.EASY)
+
+# What the events and the review scheduler need to know about a changed paper
+EVENT_COLUMNS = (
+    SQLite_DB.Paper.id,
+    SQLite_DB.Paper.title,
+    SQLite_DB.Paper.status,
+    SQLite_DB.Paper.next_review_date,
+    SQLite_DB.Paper.start_date,
+    SQLite_DB.Paper.last_reviewed_at,
+)
+
+def batch_criteria(batch: PaperBatch) -> list:
+    criteria = []
+    if batch.ids is not None:
+        if len(batch.ids) > MAX_BATCH_IDS:
+            raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_IDS} ids per batch; use a filter for more")
+        criteria.append(SQLite_DB.Paper.id.in_(batch.ids))
+    if batch.filter is not None:
+        whereclause = build_paper_query(**batch.filter.model_dump()).whereclause
+        if whereclause is not None:
+            criteria.append(whereclause)
+    if not criteria:
+        raise HTTPException(status_code=400, detail="Give the ids of the papers, a filter that narrows them down, or both")
+    return criteria
+
+def run_batch(criteria: list, ids: Optional[List[int]], apply: Callable[[Any, Dict[int, Any]], List[Any]]) -> Tuple[Dict[int, Any], List[Any], Dict[str, List[int]]]:
+    """
+    Run `apply(conn, before)` on the papers matching `criteria` in one transaction. `before` maps their
+    ids to EVENT_COLUMNS as they were; `apply` returns the papers it changed, with the same attributes.
+    """
+    with SQLite_DB.engine.begin() as conn:
+        before = {row.id: row for row in conn.execute(select(*EVENT_COLUMNS).where(*criteria))}
+        after = apply(conn, before) if before else []
+    changed = {paper.id for paper in after}
+    summary = {
+        "changed": sorted(changed),
+        "unchanged": sorted(set(before) - changed),
+        # Not a paper, or not one the filter matches
+        "missing": sorted(set(ids or ()) - set(before)),
+    }
+    return before, after, summary
+
+def publish_batch(before: Dict[int, Any], after: List[Any], deleted: bool = False):
+    """What the single-paper endpoints do after their commit, for every paper of a batch."""
+    if not after:
+        return
+    table_versions.bump('paper')
+    for paper in after:
+        if deleted:
+            review_scheduler.unschedule(paper.id)
+        else:
+            review_scheduler.schedule(paper)
+    if len(after) > events.MAX_EVENT_PAPERS:
+        events.resync('batch')
+    elif deleted:
+        for paper in after:
+            events.paper_deleted(paper)
+    else:
+        for paper in after:
+            previous = before[paper.id]
+            events.paper_changed(paper, previous.status, previous.last_reviewed_at)
+
+@router.post("/batch/status")
+async def batch_update_paper_status(batch: PaperBatchStatus):
+    """
+    Set the status of many papers with one UPDATE. Like every batch endpoint, returns the ids
+    that changed, those that were selected but needed no change, and the requested ids that
+    were not found.
+    """
+    criteria = batch_criteria(batch)
+
+    def apply(conn, before):
+        statement = update(SQLite_DB.Paper).where(
+            *criteria, or_(SQLite_DB.Paper.status != batch.status, SQLite_DB.Paper.status == None)
+        ).values(status=batch.status).returning(*EVENT_COLUMNS)
+        return conn.execute(statement).all()
+
+    before, after, summary = await run_in_threadpool(run_batch, criteria, batch.ids, apply)
+    publish_batch(before, after)
+    return summary
+
+@router.post("/batch/complete")
+async def batch_complete_papers(batch: PaperBatch):
+    """POST /paper/{id}/complete for many papers, with one UPDATE: a fresh review cycle is the same for all of them."""
+    criteria = batch_criteria(batch)
+
+    def apply(conn, before):
+        values = {"status": "3", **srs.learned_values(SQLite_DB.Paper)}  # Status '3' means '已完成'
+        return conn.execute(update(SQLite_DB.Paper).where(*criteria).values(values).returning(*EVENT_COLUMNS)).all()
+
+    before, after, summary = await run_in_threadpool(run_batch, criteria, batch.ids, apply)
+    publish_batch(before, after)
+    return summary
+
+@router.post("/batch/review")
+async def batch_review_papers(batch: PaperBatchReview):
+    """POST /paper/{id}/review for many papers, with the next dates computed for the whole batch at once."""
+    criteria = batch_criteria(batch)
+
+    def apply(conn, before):
+        reviewed = srs.review_where(conn, SQLite_DB.Paper, criteria, batch.rating, values={"status": "3"})
+        # A paper created since `before` was read is reviewed too, but left out of the events
+        return [SimpleNamespace(**{**before[values['id']]._asdict(), **values}) for values in reviewed if values['id'] in before]
+
+    before, after, summary = await run_in_threadpool(run_batch, criteria, batch.ids, apply)
+    publish_batch(before, after)
+    return summary
+
+@router.post("/batch/delete")
+async def batch_delete_papers(batch: PaperBatch):
+    """Delete many papers with one DELETE."""
+    criteria = batch_criteria(batch)
+
+    def apply(conn, before):
+        return conn.execute(delete(SQLite_DB.Paper).where(*criteria).returning(*EVENT_COLUMNS)).all()
 
+    before, after, summary = await run_in_threadpool(run_batch, criteria, batch.ids, apply)
+    publish_batch(before, after, deleted=True)
+    return summary
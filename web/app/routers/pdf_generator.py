@@ -1,9 +1,15 @@
-from fastapi import APIRouter, HTTPException
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import FileResponse, Response
 from fpdf import FPDF
-import random
+from datetime import datetime, timezone
+from typing import Callable, Optional
+import numpy as np
 import os
-import uuid
+from app.services.problem_generator import generate_problems
+from app.services.pdf_cache import PdfCache
+from app.services.http_cache import is_not_modified
+from app.services.font_cache import register_font
+from app.services.metrics import PDF_SECONDS
 
 router = APIRouter()
 
@@ -12,6 +18,14 @@ BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 FONT_PATH = os.path.join(BASE_DIR, '..', 'fonts', 'NotoSansSC-Regular.ttf')
 TMP_DIR = os.path.join(BASE_DIR, '..', 'tmp')
 os.makedirs(TMP_DIR, exist_ok=True)
+PDF_CACHE_DIR = os.path.join(TMP_DIR, 'pdf_cache')
+PDF_CACHE_MAX_BYTES = int(os.environ.get('LMS_PDF_CACHE_MAX_BYTES', 256 * 1024 * 1024))
+
+# Bump whenever the same parameters and seed would render a different PDF
+GENERATOR_VERSION = '2'
+FIXED_CREATION_DATE = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+pdf_cache = PdfCache(PDF_CACHE_DIR, PDF_CACHE_MAX_BYTES)
 
 # --- PDF Class ---
 class PDF(FPDF):
@@ -21,7 +35,7 @@ class PDF(FPDF):
             self.cell(0, 10, 'Math Problems', 0, 1, 'C')
             return
         
-        self.add_font('NotoSansSC', '', FONT_PATH)
+        register_font(self, 'NotoSansSC', FONT_PATH)
         self.set_font('NotoSansSC', '', 15)
         title = self.title or 'Math Problems'
         self.cell(0, 10, title, 0, 1, 'C')
@@ -31,237 +45,8 @@ class PDF(FPDF):
         self.set_font('Arial', 'I', 8)
         self.cell(0, 10, f'Page {self.page_no()}', 0, 0, 'C')
 
-# --- Problem Generation Logic ---
-def generate_problems(problem_type: str, max_number: int, min_number: int, num_operands: int, operators: str, num_problems: int, op_mode: str):
-    problems = []
-    op_map = {
-        'add_subtract': ['+', '-'],
-        'multiply_divide': ['*', '/'],
-        'all': ['+', '-', '*', '/']
-    }
-    allowed_ops = op_map.get(operators, ['+', '-'])
-
-    is_add_subtract_mixed = (op_mode == 'mixed' and operators == 'add_subtract')
-    
-    is_mul_div_mode = (operators in ['multiply_divide', 'all'])
-    single_digit_multiplier_min = 2
-    single_digit_multiplier_max = 9
-
-    sequential_count = 0
-    max_sequential = num_problems // 10  # 10% limit
-
-    for _ in range(num_problems):
-        problem_generated = False
-        while not problem_generated:
-            try:
-                # --- Operator Generation ---
-                ops = []
-                if num_operands > 1:
-                    if op_mode == 'mixed' and num_operands > 2:
-                        while True:
-                            ops = [random.choice(allowed_ops) for _ in range(num_operands - 1)]
-                            is_sequential = len(set(ops)) == 1
-                            if is_sequential:
-                                if sequential_count < max_sequential:
-                                    sequential_count += 1
-                                    break
-                                else:
-                                    continue
-                            else:
-                                break
-                    else:
-                        op = random.choice(allowed_ops)
-                        ops = [op] * (num_operands - 1)
-
-                # --- Operand and Problem Generation ---
-                if problem_type == 'simple_calculation':
-                    if num_operands < 2: continue
-                    
-                    nums = [0] * num_operands
-                    calculation_limit = max_number
-                    
-                    current_value = random.randint(min_number, max_number)
-                    nums[0] = current_value
-
-                    for i, op in enumerate(ops):
-                        if op == '+':
-                            max_add = calculation_limit - current_value
-                            if max_add < min_number:
-                                raise ValueError("Cannot generate valid '+' operand")
-                            next_val = random.randint(min_number, max_add)
-                            current_value += next_val
-                            nums[i+1] = next_val
-                        elif op == '-':
-                            upper_bound = current_value
-                            if is_add_subtract_mixed:
-                                upper_bound = current_value - 1
-                            
-                            if upper_bound < min_number:
-                                if is_add_subtract_mixed:
-                                    ops[i] = '+'
-                                    max_add = calculation_limit - current_value
-                                    if max_add < min_number:
-                                        raise ValueError("Cannot generate valid '+' operand after switch")
-                                    next_val = random.randint(min_number, max_add)
-                                    current_value += next_val
-                                    nums[i+1] = next_val
-                                else:
-                                    raise ValueError("Cannot generate valid '-' operand")
-                            else:
-                                next_val = random.randint(min_number, upper_bound)
-                                current_value -= next_val
-                                nums[i+1] = next_val
-                        elif op == '*':
-                            if is_mul_div_mode:
-                                if current_value == 0:
-                                    next_val = random.randint(single_digit_multiplier_min, single_digit_multiplier_max)
-                                else:
-                                    max_multiplier = calculation_limit // current_value
-                                    upper_bound = min(single_digit_multiplier_max, max_multiplier)
-                                    if upper_bound < single_digit_multiplier_min:
-                                        raise ValueError("Cannot find single-digit multiplier")
-                                    next_val = random.randint(single_digit_multiplier_min, upper_bound)
-                            else:
-                                if current_value == 0:
-                                    next_val = random.randint(1, max_number)
-                                else:
-                                    max_multiplier = max(2, calculation_limit // current_value) if current_value > 0 else calculation_limit
-                                    next_val = random.randint(1, max_multiplier)
-                            current_value *= next_val
-                            nums[i+1] = next_val
-                        elif op == '/':
-                            if is_mul_div_mode:
-                                if current_value == 0:
-                                    raise ValueError("Cannot divide zero")
-                                divisors = [j for j in range(single_digit_multiplier_min, single_digit_multiplier_max + 1) if current_value % j == 0]
-                                if not divisors:
-                                    raise ValueError("No single-digit divisors found")
-                                next_val = random.choice(divisors)
-                            else:
-                                if current_value == 0:
-                                    next_val = random.randint(1, max_number)
-                                else:
-                                    divisors = [j for j in range(1, current_value + 1) if current_value % j == 0]
-                                    if not divisors:
-                                        raise ValueError("No divisors found")
-                                    next_val = random.choice(divisors)
-                            current_value //= next_val
-                            nums[i+1] = next_val
-                    
-                    problem_str = str(nums[0])
-                    for i, op in enumerate(ops):
-                        if op == '/':
-                            problem_str += f" ÷ {nums[i+1]}"
-                        elif op == '*':
-                            problem_str += f" × {nums[i+1]}"
-                        else:
-                            problem_str += f" {op} {nums[i+1]}"
-                    problems.append(f"{problem_str} = ")
-                    problem_generated = True
-
-                elif problem_type == 'find_missing_number':
-                    nums = [0] * num_operands
-                    calculation_limit = max_number
-                    
-                    current_value = random.randint(min_number, max_number)
-                    nums[0] = current_value
-
-                    for i, op in enumerate(ops):
-                        if op == '+':
-                            max_add = calculation_limit - current_value
-                            if max_add < min_number:
-                                raise ValueError("Cannot generate valid '+' operand")
-                            next_val = random.randint(min_number, max_add)
-                            current_value += next_val
-                            nums[i+1] = next_val
-                        elif op == '-':
-                            upper_bound = current_value
-                            if is_add_subtract_mixed:
-                                upper_bound = current_value - 1
-                            
-                            if upper_bound < min_number:
-                                if is_add_subtract_mixed:
-                                    ops[i] = '+'
-                                    max_add = calculation_limit - current_value
-                                    if max_add < min_number:
-                                        raise ValueError("Cannot generate valid '+' operand after switch")
-                                    next_val = random.randint(min_number, max_add)
-                                    current_value += next_val
-                                    nums[i+1] = next_val
-                                else:
-                                    raise ValueError("Cannot generate valid '-' operand")
-                            else:
-                                next_val = random.randint(min_number, upper_bound)
-                                current_value -= next_val
-                                nums[i+1] = next_val
-                        elif op == '*':
-                            if is_mul_div_mode:
-                                if current_value == 0:
-                                    next_val = random.randint(single_digit_multiplier_min, single_digit_multiplier_max)
-                                else:
-                                    max_multiplier = calculation_limit // current_value
-                                    upper_bound = min(single_digit_multiplier_max, max_multiplier)
-                                    if upper_bound < single_digit_multiplier_min:
-                                        raise ValueError("Cannot find single-digit multiplier")
-                                    next_val = random.randint(single_digit_multiplier_min, upper_bound)
-                            else:
-                                if current_value == 0:
-                                    next_val = random.randint(1, max_number)
-                                else:
-                                    max_multiplier = max(2, calculation_limit // current_value) if current_value > 0 else calculation_limit
-                                    next_val = random.randint(1, max_multiplier)
-                            current_value *= next_val
-                            nums[i+1] = next_val
-                        elif op == '/':
-                            if is_mul_div_mode:
-                                if current_value == 0:
-                                    raise ValueError("Cannot divide zero")
-                                divisors = [j for j in range(single_digit_multiplier_min, single_digit_multiplier_max + 1) if current_value % j == 0]
-                                if not divisors:
-                                    raise ValueError("No single-digit divisors found")
-                                next_val = random.choice(divisors)
-                            else:
-                                if current_value == 0:
-                                    next_val = random.randint(1, max_number)
-                                else:
-                                    divisors = [j for j in range(1, current_value + 1) if current_value % j == 0]
-                                    if not divisors:
-                                        raise ValueError("No divisors found")
-                                    next_val = random.choice(divisors)
-                            current_value //= next_val
-                            nums[i+1] = next_val
-                    final_result = current_value
-
-                    missing_pos = random.randint(0, num_operands - 1)
-                    problem_str = ""
-                    for i in range(num_operands):
-                        if i == missing_pos:
-                            problem_str += "▢"
-                        else:
-                            problem_str += str(nums[i])
-                        
-                        if i < len(ops):
-                            if ops[i] == '/':
-                                problem_str += "÷"
-                            elif ops[i] == '*':
-                                problem_str += "×"
-                            else:
-                                problem_str += f" {ops[i]} "
-                    problems.append(f"{problem_str} = {final_result}")
-                    problem_generated = True
-
-            except (ValueError, ZeroDivisionError, OverflowError):
-                continue
-
-    return problems
-
-# --- API Endpoint ---
-@router.get("/api/generate-pdf")
-def generate_pdf(problem_type: str, max_number: int = 20, min_number: int = 1, num_operands: int = 2, operators: str = 'add_subtract', num_problems: int = 50, op_mode: str = 'mixed'):
-    if not os.path.exists(FONT_PATH):
-        print(f"WARNING: Font file not found at {FONT_PATH}. Using fallback font.")
-
-    # --- Title Generation ---
+# --- Rendering ---
+def build_title(problem_type: str, max_number: int, min_number: int, num_operands: int, operators: str, op_mode: str) -> str:
     type_title_map = {'simple_calculation': "常规计算", 'find_missing_number': "带未知数的计算"}
     op_title_map = {'add_subtract': "加减法", 'multiply_divide': "乘除法", 'all': "四则运算"}
     mode_title_map = {'mixed': "混合运算", 'sequential': "连续运算"}
@@ -275,11 +60,25 @@ def generate_pdf(problem_type: str, max_number: int = 20, min_number: int = 1, n
     
     title_parts.append(op_title_map.get(operators, ''))
     title_parts.append(f"({num_operands}个运算数 {type_title_map.get(problem_type, '')}) ")
-    title = " ".join(filter(None, title_parts))
+    return " ".join(filter(None, title_parts))
+
+@PDF_SECONDS.time(operation='worksheet')
+def render_worksheet(problem_type: str, max_number: int, min_number: int, num_operands: int, operators: str, num_problems: int, op_mode: str, seed: Optional[int] = None, progress: Optional[Callable[[float], None]] = None) -> bytes:
+    """
+    Render a worksheet PDF and return its bytes.
+    With a seed the output is byte-for-byte reproducible.
+    Raises ValueError when the settings cannot produce any problem.
+    `progress` is called with the fraction of problems laid out, and may raise to stop the render.
+    """
+    rng = np.random.default_rng(seed)
+    problems = generate_problems(problem_type, max_number, min_number, num_operands, operators, num_problems, op_mode, rng=rng)
 
     # --- PDF Creation ---
     pdf = PDF()
-    pdf.set_title(title)
+    if seed is not None:
+        # The creation date ends up in the file and its ID, so pin it for reproducible output
+        pdf.set_creation_date(FIXED_CREATION_DATE)
+    pdf.set_title(build_title(problem_type, max_number, min_number, num_operands, operators, op_mode))
     pdf.add_page()
     
     if os.path.exists(FONT_PATH):
@@ -287,23 +86,59 @@ def generate_pdf(problem_type: str, max_number: int = 20, min_number: int = 1, n
     else:
         pdf.set_font('Arial', '', 12)
 
-    problems = generate_problems(problem_type, max_number, min_number, num_operands, operators, num_problems, op_mode)
-    
     # --- Layout Problems ---
     col_width = pdf.w / 2.5
     row_height = 10
     for i, problem in enumerate(problems):
         if i > 0 and i % 2 == 0:
             pdf.ln(row_height)
+            if progress:
+                progress(i / len(problems))
         pdf.cell(col_width, row_height, problem)
 
-    # --- File Response ---
-    filename = f"{uuid.uuid4()}.pdf"
-    filepath = os.path.join(TMP_DIR, filename)
-    
-    try:
-        pdf.output(filepath)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to generate PDF: {e}")
+    return bytes(pdf.output())
 
-    return FileResponse(filepath, media_type='application/pdf', filename=f"math_problems.pdf")
+# --- API Endpoint ---
+@router.get("/api/generate-pdf")
+def generate_pdf(request: Request, problem_type: str, max_number: int = 20, min_number: int = 1, num_operands: int = 2, operators: str = 'add_subtract', num_problems: int = 50, op_mode: str = 'mixed', seed: Optional[int] = None):
+    if not os.path.exists(FONT_PATH):
+        print(f"WARNING: Font file not found at {FONT_PATH}. Using fallback font.")
+
+    params = {
+        'problem_type': problem_type,
+        'max_number': max_number,
+        'min_number': min_number,
+        'num_operands': num_operands,
+        'operators': operators,
+        'num_problems': num_problems,
+        'op_mode': op_mode,
+    }
+    download_headers = {'Content-Disposition': 'attachment; filename="math_problems.pdf"'}
+
+    # Without a seed every worksheet is unique, so there is nothing worth caching
+    if seed is None:
+        try:
+            data = render_worksheet(**params)
+        except ValueError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Failed to generate PDF: {e}")
+        return Response(data, media_type='application/pdf', headers=download_headers)
+
+    key = PdfCache.make_key(params, seed, GENERATOR_VERSION)
+    headers = {'ETag': f'"{key}"', 'Cache-Control': 'no-cache'}
+    if is_not_modified(request, headers['ETag']):
+        return Response(status_code=304, headers=headers)
+
+    with pdf_cache.key_lock(key):
+        filepath = pdf_cache.get(key)
+        if filepath is None:
+            try:
+                data = render_worksheet(**params, seed=seed)
+            except ValueError as e:
+                raise HTTPException(status_code=422, detail=str(e))
+            except Exception as e:
+                raise HTTPException(status_code=500, detail=f"Failed to generate PDF: {e}")
+            filepath = pdf_cache.put(key, data)
+
+    return FileResponse(filepath, media_type='application/pdf', filename="math_problems.pdf", headers=headers)
@@ -1,8 +1,12 @@
-from fastapi import APIRouter, Body
+from fastapi import APIRouter, Body, HTTPException
 from pydantic import BaseModel
+from typing import Any, Dict
 import json
 import os
 
+from app.services import events, srs
+from app.services.review_scheduler import review_scheduler
+
 router = APIRouter(
     tags=["settings"],
     prefix="/settings",
@@ -14,6 +18,10 @@ SETTINGS_FILE = "settings.json"
 class Settings(BaseModel):
     wrong_question_storage_path: str
 
+class SrsSettings(BaseModel):
+    algorithm: str
+    params: Dict[str, Any] = {}
+
 def load_settings() -> dict:
     if os.path.exists(SETTINGS_FILE):
         with open(SETTINGS_FILE, 'r') as f:
@@ -38,3 +46,26 @@ def save_wrong_question_path(settings: Settings):
 def get_wrong_question_path():
     settings = load_settings()
     return {"path": settings.get('wrong_question_storage_path')}
+
+@router.get("/srs")
+def get_srs_settings():
+    algorithm = srs.get_algorithm()
+    return {"algorithm": algorithm.name, "params": algorithm.params, "algorithms": list(srs.ALGORITHMS)}
+
+@router.put("/srs")
+def save_srs_settings(settings: SrsSettings):
+    """Switch the spaced repetition algorithm and re-plan every scheduled paper and wrong question with it."""
+    try:
+        algorithm = srs.create_algorithm(settings.algorithm, settings.params)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    rescheduled = srs.reschedule_all(algorithm)
+    current_settings = load_settings()
+    current_settings['srs_algorithm'] = settings.algorithm
+    current_settings['srs_params'] = settings.params
+    save_settings(current_settings)
+    srs.set_algorithm(algorithm)
+    review_scheduler.load()
+    events.resync('srs')
+    return {"message": "Settings saved successfully.", "rescheduled": rescheduled}
@@ -1,14 +1,23 @@
-from fastapi import APIRouter, Depends, HTTPException, Form, UploadFile, File
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, Depends, HTTPException, Form, UploadFile, File, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, Response, StreamingResponse
 from pydantic import BaseModel
 from sqlmodel import select, func
 from app.db import SQLite_DB
-from typing import Optional, List
-import shutil
+from typing import Callable, Dict, Optional, List, Tuple
+from urllib.parse import quote
+import json
 import os
+import zipfile
 from datetime import datetime
-import uuid
-from pypdf import PdfWriter, PdfReader
+from pypdf import PdfWriter
+
+from app.services import bulk_io, events, previews, srs
+from app.services.blob_store import SHA256_PATTERN, blob_sha256, blob_store
+from app.services.file_server import serve_file
+from app.services.http_cache import cached_json, is_not_modified, table_versions
+from app.services.pagination import paginate, PaginationError, MAX_PAGE_SIZE
+from app.services.pdf_merge import merge_first_pages, stream_pdf
 
 # Import settings loader
 from .settings import load_settings
@@ -21,31 +30,86 @@ router = APIRouter(
 class GeneratePdfRequest(BaseModel):
     question_ids: List[int]
 
-@router.get("/")
-def get_wrong_questions(
-    session: SQLite_DB.SessionDep,
+WRONG_QUESTION_SORT_KEYS = ('id', 'created_at')
+
+def build_wrong_question_query(
     subject: Optional[str] = None,
     difficulty: Optional[str] = None,
     tag: Optional[str] = None,
-) -> List[SQLite_DB.WrongQuestion]:
-    
+    tag_mode: str = 'all',
+    q: Optional[str] = None,
+):
     query = select(SQLite_DB.WrongQuestion)
 
     if subject and subject != '0':
         query = query.where(SQLite_DB.WrongQuestion.subject == subject)
     if difficulty and difficulty != '0':
         query = query.where(SQLite_DB.WrongQuestion.difficulty == difficulty)
-    if tag:
-        # Assuming tags are stored as comma-separated strings
-        query = query.where(SQLite_DB.WrongQuestion.tags.like(f"%{tag}%"))
+    tags = SQLite_DB.split_tags(tag)
+    if tags:
+        query = query.where(SQLite_DB.WrongQuestion.id.in_(SQLite_DB.questions_tagged(tags, match_all=tag_mode == 'all')))
+    if q:
+        query = query.where(*SQLite_DB.question_text_filters(q))
+    return query
 
-    wrong_questions = session.exec(query).all()
-    
-    return wrong_questions
+@router.get("/")
+async def get_wrong_questions(
+    request: Request,
+    session: SQLite_DB.AsyncSessionDep,
+    subject: Optional[str] = None,
+    difficulty: Optional[str] = None,
+    tag: Optional[str] = None,
+    tag_mode: str = Query('all', pattern='^(all|any)$'),
+    q: Optional[str] = None,
+    sort: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    with_total: bool = False,
+):
+    """
+    `tag` is a comma separated list of tags the questions must all have (tag_mode=any: at
+    least one); a tag ending in * matches every tag starting with it. `q` searches the
+    chapter, tags and question type for every word it contains.
+    Paged like GET /paper/ when any of sort/limit/cursor/fields/with_total is given.
+    """
+    async def load():
+        query = build_wrong_question_query(subject, difficulty, tag, tag_mode, q)
+        if sort is None and limit is None and cursor is None and fields is None and not with_total:
+            return (await session.exec(query)).all()
+        try:
+            return await paginate(session, query, SQLite_DB.WrongQuestion, WRONG_QUESTION_SORT_KEYS, sort, limit, cursor, fields, with_total)
+        except PaginationError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    return await cached_json(request, ('wrongquestion',), load)
+
+async def store_file(upload: Optional[UploadFile], sha256: Optional[str], storage_path: str) -> Optional[str]:
+    """
+    Blob path for one of the files of a new question, with a reference taken on it.
+    A known `sha256` is used as is and the upload, if any, is not read.
+    """
+    if sha256:
+        sha256 = sha256.lower()
+        if not SHA256_PATTERN.match(sha256):
+            raise HTTPException(status_code=400, detail="File hash must be a hex SHA-256.")
+        path = await run_in_threadpool(blob_store.reference, sha256)
+        if path:
+            return path
+        if not upload:
+            raise HTTPException(status_code=404, detail="Unknown file hash, upload the file instead.")
+    if not upload:
+        return None
+    # Copying and hashing run on a worker thread, chunk by chunk
+    path = await run_in_threadpool(blob_store.write, upload.file, storage_path, upload.filename)
+    if sha256 and not os.path.basename(path).startswith(sha256):
+        await run_in_threadpool(blob_store.release, path)
+        raise HTTPException(status_code=400, detail="Uploaded file does not match its hash.")
+    return path
 
 @router.post("/")
 async def create_wrong_question(
-    session: SQLite_DB.SessionDep,
+    session: SQLite_DB.AsyncSessionDep,
     subject: str = Form(...),
     chapter: Optional[str] = Form(None),
     question_type: Optional[str] = Form(None),
@@ -54,51 +118,182 @@ async def create_wrong_question(
     review_at: Optional[str] = Form(None),
     question_file: Optional[UploadFile] = File(None),
     answer_file: Optional[UploadFile] = File(None),
+    question_sha256: Optional[str] = Form(None),
+    answer_sha256: Optional[str] = Form(None),
 ):
+    """
+    Files are stored once per content. question_sha256/answer_sha256 may name a file
+    already stored, in which case the upload can be left out; an unknown hash without
+    the file is a 404.
+    """
     settings = load_settings()
     storage_path = settings.get('wrong_question_storage_path')
 
     if not storage_path or not os.path.isdir(storage_path):
         raise HTTPException(status_code=400, detail="Storage path is not configured or is not a valid directory.")
 
-    question_file_path = None
-    if question_file:
-        question_filename = f"question_{datetime.now().strftime('%Y%m%d%H%M%S')}_{question_file.filename}"
-        question_file_path = os.path.join(storage_path, question_filename)
-        with open(question_file_path, "wb") as buffer:
-            shutil.copyfileobj(question_file.file, buffer)
-
-    answer_file_path = None
-    if answer_file:
-        answer_filename = f"answer_{datetime.now().strftime('%Y%m%d%H%M%S')}_{answer_file.filename}"
-        answer_file_path = os.path.join(storage_path, answer_filename)
-        with open(answer_file_path, "wb") as buffer:
-            shutil.copyfileobj(answer_file.file, buffer)
-
-    review_at_datetime = None
-    if review_at:
-        try:
-            review_at_datetime = datetime.strptime(review_at, '%Y-%m-%d')
-        except ValueError:
-            pass # Or handle error appropriately
-
-    new_question = SQLite_DB.WrongQuestion(
-        subject=subject,
-        chapter=chapter,
-        question_type=question_type,
-        difficulty=difficulty,
-        tags=tags,
-        review_at=review_at_datetime,
-        question_path=question_file_path,
-        answer_path=answer_file_path,
-    )
-
-    session.add(new_question)
-    session.commit()
-    session.refresh(new_question)
+    stored = []
+    try:
+        question_file_path = await store_file(question_file, question_sha256, storage_path)
+        stored.append(question_file_path)
+        answer_file_path = await store_file(answer_file, answer_sha256, storage_path)
+        stored.append(answer_file_path)
+
+        review_at_datetime = None
+        if review_at:
+            try:
+                review_at_datetime = datetime.strptime(review_at, '%Y-%m-%d')
+            except ValueError:
+                pass # Or handle error appropriately
+
+        new_question = SQLite_DB.WrongQuestion(
+            subject=subject,
+            chapter=chapter,
+            question_type=question_type,
+            difficulty=difficulty,
+            tags=tags,
+            review_at=review_at_datetime,
+            question_path=question_file_path,
+            answer_path=answer_file_path,
+        )
+        if review_at_datetime is None:
+            # No date picked: schedule the first review like a freshly completed paper
+            srs.learn(new_question)
+
+        session.add(new_question)
+        await session.commit()
+    except BaseException:
+        # The question never made it in: give back the references its files took
+        for path in filter(None, stored):
+            await run_in_threadpool(blob_store.release, path)
+        raise
+    table_versions.bump('wrongquestion')
+    await session.refresh(new_question)
+    events.wrong_question_created(new_question)
+    previews.schedule(question_file_path, answer_file_path)
 
     return new_question
 
+FILE_KINDS = ('question', 'answer')
+# Files travel as their blob hash; server paths are never exported or imported
+EXPORT_FIELDS = [
+    name for name in SQLite_DB.WrongQuestion.__table__.columns.keys() if name not in ('question_path', 'answer_path')
+] + ['question_sha256', 'answer_sha256']
+
+def import_file(archive: Optional[zipfile.ZipFile], storage_path: Optional[str], name: Optional[str], sha256: Optional[str]) -> Optional[str]:
+    """Blob path for a file of an imported question, with a reference taken on it: a stored hash, else `name` in the zip."""
+    if sha256:
+        sha256 = sha256.lower()
+        if not SHA256_PATTERN.match(sha256):
+            raise bulk_io.RowError("File hash must be a hex SHA-256.")
+        path = blob_store.reference(sha256)
+        if path:
+            return path
+        if not name:
+            raise bulk_io.RowError(f"Unknown file hash {sha256}, add the file to the zip instead.")
+    if not name:
+        return None
+    if archive is None:
+        raise bulk_io.RowError(f"{name}: no zip of files was uploaded")
+    try:
+        info = archive.getinfo(name)
+    except KeyError:
+        raise bulk_io.RowError(f"{name} is not in the zip")
+    with archive.open(info) as source:
+        return blob_store.write(source, storage_path, name)
+
+def import_wrong_question_rows(rows, archive: Optional[zipfile.ZipFile], storage_path: Optional[str]):
+    def convert(row):
+        names = {kind: row.pop(f'{kind}_file', None) for kind in FILE_KINDS}
+        hashes = {kind: row.pop(f'{kind}_sha256', None) for kind in FILE_KINDS}
+        for kind in FILE_KINDS:
+            row.pop(f'{kind}_path', None)
+        question = bulk_io.row_model(SQLite_DB.WrongQuestion).model_validate(row)
+        if question.review_at is None and question.last_reviewed_at is None:
+            srs.learn(question)  # Same first review as POST /wrong_question_book/
+
+        stored = []
+        try:
+            for kind in FILE_KINDS:
+                path = import_file(archive, storage_path, names[kind], hashes[kind])
+                stored.append(path)
+                setattr(question, f'{kind}_path', path)
+        except BaseException:
+            for path in filter(None, stored):
+                blob_store.release(path)
+            raise
+        previews.schedule(*stored)
+        return question
+
+    def discard(question):
+        for path in (question.question_path, question.answer_path):
+            if path:
+                blob_store.release(path)
+
+    return bulk_io.import_rows(SQLite_DB.engine, SQLite_DB.WrongQuestion.__table__, rows, convert, discard)
+
+def import_wrong_questions_from(source, fmt: str, files, storage_path: Optional[str]):
+    if files is None:
+        return import_wrong_question_rows(bulk_io.read_rows(source, fmt), None, storage_path)
+    with zipfile.ZipFile(files) as archive:
+        return import_wrong_question_rows(bulk_io.read_rows(source, fmt), archive, storage_path)
+
+@router.post("/import")
+async def import_wrong_questions(
+    file: UploadFile = File(...),
+    files: Optional[UploadFile] = File(None),
+    format: Optional[str] = Form(None),
+):
+    """
+    Import wrong questions from NDJSON or CSV, like POST /paper/import. A row's files are
+    named in question_file/answer_file, entries of the `files` zip, or given as
+    question_sha256/answer_sha256 of files already stored. Questions without a review date
+    or past review get their first one scheduled.
+    """
+    try:
+        fmt = bulk_io.guess_format(file.filename, format)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    storage_path = None
+    if files is not None:
+        storage_path = load_settings().get('wrong_question_storage_path')
+        if not storage_path or not os.path.isdir(storage_path):
+            raise HTTPException(status_code=400, detail="Storage path is not configured or is not a valid directory.")
+        if not await run_in_threadpool(zipfile.is_zipfile, files.file):
+            raise HTTPException(status_code=400, detail="files must be a zip archive.")
+
+    report = await run_in_threadpool(import_wrong_questions_from, file.file, fmt, files and files.file, storage_path)
+    if report["imported"]:
+        table_versions.bump('wrongquestion')
+        events.resync('import')
+    return report
+
+def question_export_row(row):
+    for kind in FILE_KINDS:
+        row[f'{kind}_sha256'] = blob_sha256(row[f'{kind}_path'])
+    return row
+
+@router.get("/export")
+async def export_wrong_questions(
+    format: str = Query('ndjson', pattern='^(ndjson|csv)$'),
+    subject: Optional[str] = None,
+    difficulty: Optional[str] = None,
+    tag: Optional[str] = None,
+    tag_mode: str = Query('all', pattern='^(all|any)$'),
+    q: Optional[str] = None,
+):
+    """
+    Stream the wrong questions matching the GET /wrong_question_book/ filters as NDJSON or CSV,
+    in id order. Files are referred to by hash, so the export imports back on this server as is.
+    """
+    query = build_wrong_question_query(subject, difficulty, tag, tag_mode, q)
+    query = query.with_only_columns(*SQLite_DB.WrongQuestion.__table__.columns).order_by(SQLite_DB.WrongQuestion.id)
+    return StreamingResponse(
+        bulk_io.export_rows(SQLite_DB.engine, query, format, EXPORT_FIELDS, question_export_row),
+        media_type=bulk_io.MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="wrong_questions.{format}"'},
+    )
+
 class WrongQuestionUpdate(BaseModel):
     subject: str
     chapter: Optional[str] = None
@@ -108,12 +303,12 @@ class WrongQuestionUpdate(BaseModel):
     review_at: Optional[str] = None
 
 @router.put("/{question_id}")
-def update_wrong_question(
-    session: SQLite_DB.SessionDep,
+async def update_wrong_question(
+    session: SQLite_DB.AsyncSessionDep,
     question_id: int,
     question_update: WrongQuestionUpdate,
 ):
-    db_question = session.get(SQLite_DB.WrongQuestion, question_id)
+    db_question = await session.get(SQLite_DB.WrongQuestion, question_id)
     if not db_question:
         raise HTTPException(status_code=404, detail="Wrong question not found")
 
@@ -132,29 +327,48 @@ def update_wrong_question(
         setattr(db_question, key, value)
 
     session.add(db_question)
-    session.commit()
-    session.refresh(db_question)
+    await session.commit()
+    table_versions.bump('wrongquestion')
+    await session.refresh(db_question)
     return db_question
 
 @router.delete("/{question_id}")
-def delete_wrong_question(session: SQLite_DB.SessionDep, question_id: int):
-    question = session.get(SQLite_DB.WrongQuestion, question_id)
+async def delete_wrong_question(session: SQLite_DB.AsyncSessionDep, question_id: int):
+    question = await session.get(SQLite_DB.WrongQuestion, question_id)
     if not question:
         raise HTTPException(status_code=404, detail="Wrong question not found")
 
-    # Delete associated files
-    if question.question_path and os.path.exists(question.question_path):
-        os.remove(question.question_path)
-    if question.answer_path and os.path.exists(question.answer_path):
-        os.remove(question.answer_path)
+    await session.delete(question)
+    await session.commit()
+    table_versions.bump('wrongquestion')
 
-    session.delete(question)
-    session.commit()
+    # Delete associated files, unless another question still uses them
+    for path in (question.question_path, question.answer_path):
+        if path and not await run_in_threadpool(blob_store.release, path) and os.path.exists(path):
+            os.remove(path)  # Stored before the blob store, never shared
     return {"message": "Wrong question deleted successfully"}
 
-@router.get("/file/{question_id}")
-def get_wrong_question_file(session: SQLite_DB.SessionDep, question_id: int, type: str = 'question'):
-    question = session.get(SQLite_DB.WrongQuestion, question_id)
+@router.post("/{question_id}/review")
+async def review_wrong_question(
+    session: SQLite_DB.AsyncSessionDep,
+    question_id: int,
+    rating: int = Query(srs.GOOD, ge=srs.AGAIN, le=srs.EASY),
+):
+    """Record a review (1 again, 2 hard, 3 good, 4 easy) and set review_at to the next one."""
+    question = await session.get(SQLite_DB.WrongQuestion, question_id)
+    if not question:
+        raise HTTPException(status_code=404, detail="Wrong question not found")
+
+    srs.review(question, rating)
+    session.add(question)
+    await session.commit()
+    table_versions.bump('wrongquestion')
+    await session.refresh(question)
+    return question
+
+@router.api_route("/file/{question_id}", methods=["GET", "HEAD"])
+async def get_wrong_question_file(request: Request, session: SQLite_DB.AsyncSessionDep, question_id: int, type: str = 'question'):
+    question = await session.get(SQLite_DB.WrongQuestion, question_id)
     if not question:
         raise HTTPException(status_code=404, detail="Wrong question not found")
 
@@ -164,72 +378,117 @@ def get_wrong_question_file(session: SQLite_DB.SessionDep, question_id: int, typ
     elif type == 'answer':
         file_path = question.answer_path
     
-    if not file_path or not os.path.exists(file_path):
+    response = await serve_file(request, file_path) if file_path else None
+    if response is None:
         raise HTTPException(status_code=404, detail="File not found")
+    return response
 
-    return FileResponse(file_path)
-
-@router.post("/generate_pdf")
-def generate_wrong_question_book(session: SQLite_DB.SessionDep, request: GeneratePdfRequest):
-    A4_WIDTH = 595
-    A4_HEIGHT = 842
-    
-    output_pdf = PdfWriter()
-
-    questions_to_process = session.exec(select(SQLite_DB.WrongQuestion).where(SQLite_DB.WrongQuestion.id.in_(request.question_ids))).all()
+@router.get("/preview/{question_id}")
+async def get_wrong_question_preview(
+    request: Request,
+    session: SQLite_DB.AsyncSessionDep,
+    question_id: int,
+    type: str = 'question',
+    size: int = previews.DEFAULT_PREVIEW_SIZE,
+    v: Optional[str] = None,
+):
+    """
+    Thumbnail of the first page of a question or answer file, `size` pixels on the longest side.
+    Pass the file's hash (the name of its blob) as `v` to make the response cacheable for good.
+    """
+    if size not in previews.PREVIEW_SIZES:
+        raise HTTPException(status_code=400, detail=f"size must be one of {', '.join(map(str, previews.PREVIEW_SIZES))}")
+    question = await session.get(SQLite_DB.WrongQuestion, question_id)
+    if not question:
+        raise HTTPException(status_code=404, detail="Wrong question not found")
 
-    # --- Process Questions ---
-    for question in questions_to_process:
-        if not (question.question_path and os.path.exists(question.question_path)):
-            continue
-        
-        try:
-            reader = PdfReader(question.question_path)
-            source_page = reader.pages[0]
-            source_page.scale_to(A4_WIDTH, A4_HEIGHT)
-            output_pdf.add_page(source_page)
-        except Exception as e:
-            print(f"Error processing question file {question.question_path}: {e}")
-
-    # --- Process Answers ---
-    for question in questions_to_process:
-        if not (question.answer_path and os.path.exists(question.answer_path)):
-            continue
-            
-        try:
-            reader = PdfReader(question.answer_path)
-            source_page = reader.pages[0]
-            source_page.scale_to(A4_WIDTH, A4_HEIGHT)
-            output_pdf.add_page(source_page)
-        except Exception as e:
-            print(f"Error processing answer file {question.answer_path}: {e}")
+    file_path = question.question_path if type == 'question' else question.answer_path if type == 'answer' else None
+    if not file_path or not os.path.exists(file_path):
+        raise HTTPException(status_code=404, detail="File not found")
 
-    # --- Save and Return ---
-    BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-    TMP_DIR = os.path.join(BASE_DIR, '..', 'tmp')
-    os.makedirs(TMP_DIR, exist_ok=True)
+    digest = await run_in_threadpool(previews.content_digest, file_path)
+    headers = {
+        'ETag': f'"{digest}-{size}"',
+        # Same URL, same file, unless the question id is reused after a delete
+        'Cache-Control': 'public, max-age=31536000, immutable' if v == digest else 'no-cache',
+    }
+    if is_not_modified(request, headers['ETag']):
+        return Response(status_code=304, headers=headers)
+
+    preview_path = await run_in_threadpool(previews.get_preview, file_path, size, digest)
+    if not preview_path:
+        raise HTTPException(status_code=404, detail="No preview for this file")
+    return FileResponse(preview_path, media_type=previews.PREVIEW_MEDIA_TYPE, headers=headers)
+
+def in_requested_order(questions: List[SQLite_DB.WrongQuestion], question_ids: List[int]) -> List[SQLite_DB.WrongQuestion]:
+    """`questions` in the order of `question_ids`; IN (...) returns them in whatever order it likes."""
+    position = {}
+    for index, question_id in enumerate(question_ids):
+        position.setdefault(question_id, index)
+    return sorted(questions, key=lambda q: position.get(q.id, len(position)))
+
+def collect_book_files(questions: List[SQLite_DB.WrongQuestion]):
+    """
+    Question files first, then answer files. Files missing on disk are kept, so the merge
+    reports them instead of the book silently losing pages.
+    """
+    question_paths = [q.question_path for q in questions if q.question_path]
+    answer_paths = [q.answer_path for q in questions if q.answer_path]
+    return question_paths, answer_paths
+
+def build_wrong_question_book(
+    question_paths: List[str],
+    answer_paths: List[str],
+    progress: Optional[Callable[[float], None]] = None,
+    workers: Optional[int] = None,
+) -> Tuple[PdfWriter, List[Dict[str, str]]]:
+    """
+    Merge the first page of every question file and then every answer file, scaled to A4.
+    Returns the writer and a report of the files that could not be added.
+    """
+    sources = [('question', p) for p in question_paths] + [('answer', p) for p in answer_paths]
+    return merge_first_pages(sources, progress=progress, workers=workers)
+
+MAX_REPORTED_ERRORS = 20  # keeps the report header a sane size
+
+def merge_error_report(errors: List[Dict[str, str]]) -> List[Dict[str, str]]:
+    # Paths stay server-side; the client only needs to know which files were left out
+    return [{"kind": e["kind"], "file": os.path.basename(e["path"]), "error": e["error"]} for e in errors]
+
+def merge_error_headers(report: List[Dict[str, str]]) -> Dict[str, str]:
+    """X-Merge-Error-Count and, when there are errors, X-Merge-Errors for a merge_error_report()."""
+    headers = {"X-Merge-Error-Count": str(len(report))}
+    if report:
+        headers["X-Merge-Errors"] = quote(json.dumps(report[:MAX_REPORTED_ERRORS], ensure_ascii=False))
+    return headers
 
-    filename = f"wrong_question_book_{uuid.uuid4()}.pdf"
-    filepath = os.path.join(TMP_DIR, filename)
+@router.post("/generate_pdf")
+async def generate_wrong_question_book(session: SQLite_DB.AsyncSessionDep, request: GeneratePdfRequest):
+    questions_to_process = (await session.exec(select(SQLite_DB.WrongQuestion).where(SQLite_DB.WrongQuestion.id.in_(request.question_ids)))).all()
+    question_paths, answer_paths = collect_book_files(in_requested_order(questions_to_process, request.question_ids))
+
+    # Merging is CPU-bound, keep it off the event loop
+    output_pdf, errors = await run_in_threadpool(build_wrong_question_book, question_paths, answer_paths)
+    headers = {
+        "Content-Disposition": 'attachment; filename="wrong_question_book.pdf"',
+        **merge_error_headers(merge_error_report(errors)),
+    }
+    return StreamingResponse(stream_pdf(output_pdf), media_type='application/pdf', headers=headers)
 
-    with open(filepath, "wb") as f:
-        output_pdf.write(f)
+@router.get("/stats")
+async def get_wrong_question_stats(request: Request, session: SQLite_DB.AsyncSessionDep, subject: Optional[str] = None):
+    async def load():
+        query = select(
+            SQLite_DB.WrongQuestion.question_type,
+            func.count(SQLite_DB.WrongQuestion.id).label("count")
+        ).group_by(SQLite_DB.WrongQuestion.question_type)
 
-    return FileResponse(filepath, media_type='application/pdf', filename="wrong_question_book.pdf")
+        if subject and subject != '0':
+            query = query.where(SQLite_DB.WrongQuestion.subject == subject)
 
-@router.get("/stats")
-def get_wrong_question_stats(session: SQLite_DB.SessionDep, subject: Optional[str] = None):
-    query = select(
-        SQLite_DB.WrongQuestion.question_type,
-        func.count(SQLite_DB.WrongQuestion.id).label("count")
-    ).group_by(SQLite_DB.WrongQuestion.question_type)
+        results = (await session.exec(query)).all()
 
-    if subject and subject != '0':
-        query = query.where(SQLite_DB.WrongQuestion.subject == subject)
+        # Format for chart
+        return [{"name": item[0] or "未指定", "value": item[1]} for item in results]
 
-    results = session.exec(query).all()
-    
-    # Format for chart
-    chart_data = [{"name": item[0] or "未指定", "value": item[1]} for item in results]
-    
-    return chart_data
\ No newline at end of file
+    return await cached_json(request, ('wrongquestion',), load)
@@ -0,0 +1,153 @@
+"""
+Content-addressed storage for wrong question files.
+
+Uploads are copied in chunks on a worker thread and hashed with SHA-256 as
+they are written to a temporary file. The file then lives at
+<storage>/blobs/<first two hex digits>/<sha256><extension>, and a row in the
+`blob` table counts the wrong question files pointing at it. Uploading the
+same content again only takes another reference on the existing blob, and
+deleting a question only unlinks a file once its last reference is gone.
+
+Reference changes and the file operations that depend on them run under one
+lock, so a blob being released can never be unlinked under an upload that
+just found it. The store assumes the single-process server the app runs as.
+check_refcounts recounts references from the wrongquestion table; see
+benchmarks/check_blob_refcounts.py.
+"""
+from typing import BinaryIO, Dict, List, Optional
+import hashlib
+import os
+import re
+import tempfile
+import threading
+
+from sqlalchemy import Engine
+from sqlmodel import Session, select
+from app.db import SQLite_DB
+
+CHUNK_SIZE = 1024 * 1024
+BLOB_DIR = 'blobs'
+SHA256_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+_EXTENSION_PATTERN = re.compile(r'^\.[a-z0-9]{1,10}$')
+
+# Paths held by wrong questions, one row per reference
+_REFERENCES_QUERY = """
+    SELECT path, count(*) FROM (
+        SELECT question_path AS path FROM wrongquestion UNION ALL SELECT answer_path FROM wrongquestion
+    ) WHERE path IS NOT NULL GROUP BY path
+"""
+
+def _extension(filename: Optional[str]) -> str:
+    # Kept so FileResponse still guesses the media type; anything odd is dropped
+    extension = os.path.splitext(filename or '')[1].lower()
+    return extension if _EXTENSION_PATTERN.match(extension) else ''
+
+def blob_sha256(path: Optional[str]) -> Optional[str]:
+    """The content hash a blob path is named after, None for files stored before the blob store."""
+    if not path or os.path.basename(os.path.dirname(os.path.dirname(path))) != BLOB_DIR:
+        return None
+    sha256 = os.path.splitext(os.path.basename(path))[0]
+    return sha256 if SHA256_PATTERN.match(sha256) else None
+
+class BlobStore:
+    def __init__(self):
+        self._lock = threading.Lock()
+
+    def write(self, source: BinaryIO, root: str, filename: Optional[str] = None) -> str:
+        """Store the content of `source` under `root` and take a reference on it. Returns the blob path."""
+        temp_dir = os.path.join(root, BLOB_DIR, 'tmp')
+        os.makedirs(temp_dir, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=temp_dir)
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            with os.fdopen(fd, 'wb') as out:
+                while chunk := source.read(CHUNK_SIZE):
+                    digest.update(chunk)
+                    out.write(chunk)
+                    size += len(chunk)
+            sha256 = digest.hexdigest()
+            path = os.path.join(root, BLOB_DIR, sha256[:2], sha256 + _extension(filename))
+            return self._acquire(sha256, size, path, temp_path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def reference(self, sha256: str) -> Optional[str]:
+        """Take another reference on a blob by hash without uploading it. None if the hash is unknown or its file is gone."""
+        with self._lock, Session(SQLite_DB.engine) as session:
+            blob = session.get(SQLite_DB.Blob, sha256)
+            if not blob or not os.path.exists(blob.path):
+                return None
+            blob.refcount += 1
+            session.add(blob)
+            session.commit()
+            return blob.path
+
+    def _acquire(self, sha256: str, size: int, path: str, temp_path: str) -> str:
+        with self._lock, Session(SQLite_DB.engine) as session:
+            blob = session.get(SQLite_DB.Blob, sha256)
+            if blob:
+                # Known content: the upload is dropped, unless the stored copy went missing
+                path = blob.path
+                blob.refcount += 1
+            else:
+                blob = SQLite_DB.Blob(sha256=sha256, path=path, size=size, refcount=1)
+            if not os.path.exists(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(temp_path, path)
+            session.add(blob)
+            session.commit()
+            return path
+
+    def release(self, path: str) -> bool:
+        """
+        Drop a reference taken by write() or reference(), unlinking the file with the last one.
+        Returns False when `path` is not a blob, so the caller can deal with files stored before the blob store.
+        """
+        with self._lock, Session(SQLite_DB.engine) as session:
+            blob = session.exec(select(SQLite_DB.Blob).where(SQLite_DB.Blob.path == path)).first()
+            if not blob:
+                return False
+            blob.refcount -= 1
+            if blob.refcount > 0:
+                session.add(blob)
+                session.commit()
+                return True
+            session.delete(blob)
+            session.commit()
+            if os.path.exists(path):
+                os.remove(path)
+            return True
+
+    def check_refcounts(self, db_engine: Optional[Engine] = None, repair: bool = False) -> List[Dict]:
+        """
+        Compare every blob's refcount with the wrong question files pointing at it.
+        Returns one {sha256, path, stored, actual} entry per blob that differs; with `repair`,
+        refcounts are corrected and blobs nothing points at any more are deleted with their file.
+        An upload holds its reference before its question is committed, so only repair while none is in flight.
+        """
+        db_engine = db_engine or SQLite_DB.engine
+        with self._lock:
+            with db_engine.begin() as conn:
+                actual = {path: count for path, count in conn.exec_driver_sql(_REFERENCES_QUERY)}
+                drift = [
+                    {"sha256": sha256, "path": path, "stored": refcount, "actual": actual.get(path, 0)}
+                    for sha256, path, refcount in conn.exec_driver_sql("SELECT sha256, path, refcount FROM blob")
+                    if refcount != actual.get(path, 0)
+                ]
+                if repair:
+                    for entry in drift:
+                        if entry["actual"]:
+                            conn.exec_driver_sql("UPDATE blob SET refcount = ? WHERE sha256 = ?", (entry["actual"], entry["sha256"]))
+                        else:
+                            conn.exec_driver_sql("DELETE FROM blob WHERE sha256 = ?", (entry["sha256"],))
+            # Files go only once the rows that pointed at them are gone
+            for entry in drift if repair else ():
+                if not entry["actual"] and os.path.exists(entry["path"]):
+                    os.remove(entry["path"])
+        if drift:
+            print(f"Blob refcounts drifted on {len(drift)} blobs{', repaired' if repair else ''}: {drift[:10]}")
+        return drift
+
+blob_store = BlobStore()
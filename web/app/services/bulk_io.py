@@ -0,0 +1,204 @@
+"""
+Bulk import and export of table rows as NDJSON or CSV.
+
+Imports read the uploaded file one line at a time, validate every row on its
+own against row_model() of the table and insert the valid ones IMPORT_BATCH_SIZE at a time, with one
+executemany and one transaction per batch. When the database rejects a batch
+(a duplicate id, say) it is inserted again row by row in one transaction, so
+only the offending rows fail. Every failure is reported with its line number.
+
+Exports run the query on a sync connection with stream_results and encode
+EXPORT_BATCH_SIZE rows at a time, so memory does not grow with the table.
+Both run on worker threads: the import from the endpoint through
+run_in_threadpool, the export as the iterator of a StreamingResponse.
+"""
+from datetime import datetime
+from functools import lru_cache
+from typing import Any, BinaryIO, Callable, Dict, Iterator, List, Optional, Tuple
+import csv
+import io
+import json
+import os
+
+from pydantic import BaseModel, ValidationError, create_model
+from sqlalchemy import Engine, Table, insert
+from sqlalchemy.exc import IntegrityError
+
+FORMATS = ('ndjson', 'csv')
+MEDIA_TYPES = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv; charset=utf-8'}
+IMPORT_BATCH_SIZE = int(os.environ.get('LMS_IMPORT_BATCH_SIZE', 1000))
+EXPORT_BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 100  # the counts are always exact
+
+class RowError(ValueError):
+    """A row that cannot be imported, with the reason shown to the user."""
+
+@lru_cache(maxsize=None)
+def row_model(model: type) -> type:
+    """
+    A plain pydantic model with the fields of a table model, for validating rows to insert.
+    Validating the table model itself sets every field through SQLAlchemy's instrumentation,
+    which is about twenty times slower.
+    """
+    row = create_model(f'{model.__name__}Row', **{name: (field.annotation, field) for name, field in model.model_fields.items()})
+    row.__tablename__ = model.__tablename__  # srs picks the due column by it
+    return row
+
+def guess_format(filename: Optional[str], requested: Optional[str] = None) -> str:
+    """The requested format, or the one the file name suggests. Raises ValueError for anything else."""
+    fmt = (requested or ('csv' if (filename or '').lower().endswith('.csv') else 'ndjson')).lower()
+    if fmt not in FORMATS:
+        raise ValueError(f"format must be one of {', '.join(FORMATS)}")
+    return fmt
+
+def read_rows(source: BinaryIO, fmt: str) -> Iterator[Tuple[int, Optional[Dict[str, Any]], Optional[str]]]:
+    """
+    (line number, row, None) for every row of `source`, or (line number, None, error) for one
+    that cannot be read. Empty CSV cells are None.
+    """
+    text = io.TextIOWrapper(source, encoding='utf-8-sig', newline='')
+    try:
+        if fmt == 'csv':
+            reader = csv.DictReader(text)
+            line = 1
+            try:
+                for row in reader:
+                    yield line + 1, {key: value if value != '' else None for key, value in row.items() if key}, None
+                    line = reader.line_num
+            except csv.Error as e:
+                yield reader.line_num, None, f"Invalid CSV: {e}"
+            return
+        for line, raw in enumerate(text, 1):
+            if not raw.strip():
+                continue
+            try:
+                row = json.loads(raw)
+            except ValueError as e:
+                yield line, None, f"Invalid JSON: {e}"
+                continue
+            if not isinstance(row, dict):
+                yield line, None, "Each line must be a JSON object"
+                continue
+            yield line, row, None
+    except UnicodeDecodeError as e:
+        yield 0, None, f"File is not UTF-8: {e}"
+    finally:
+        if not text.closed:
+            text.detach()  # The upload belongs to the caller
+
+def describe(error: Exception) -> str:
+    if isinstance(error, ValidationError):
+        return '; '.join(f"{'.'.join(map(str, e['loc'])) or 'row'}: {e['msg']}" for e in error.errors())
+    return str(error)
+
+class _Report:
+    def __init__(self):
+        self.imported = 0
+        self.failed = 0
+        self.errors: List[Dict[str, Any]] = []
+
+    def fail(self, line: int, error: str):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line, "error": error})
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"imported": self.imported, "failed": self.failed, "errors": sorted(self.errors, key=lambda e: e["line"])}
+
+def _insert_batch(db_engine: Engine, table: Table, batch: List[Tuple[int, BaseModel]], report: _Report, discard: Callable[[Any], None]):
+    values = [item.model_dump() for _, item in batch]
+    try:
+        with db_engine.begin() as conn:
+            conn.execute(insert(table), values)
+        report.imported += len(batch)
+        return
+    except IntegrityError:
+        pass  # Find the rows at fault below
+    except BaseException:
+        for _, item in batch:
+            discard(item)
+        raise
+    # A failed INSERT only undoes itself in SQLite, so the other rows still go in together
+    rejected = []
+    with db_engine.begin() as conn:
+        for (line, item), row in zip(batch, values):
+            try:
+                conn.execute(insert(table), row)
+            except IntegrityError as e:
+                report.fail(line, str(e.orig))
+                rejected.append(item)
+            else:
+                report.imported += 1
+    # Only once the write lock is given up: discard may write too
+    for item in rejected:
+        discard(item)
+
+def import_rows(
+    db_engine: Engine,
+    table: Table,
+    rows: Iterator[Tuple[int, Optional[Dict[str, Any]], Optional[str]]],
+    convert: Callable[[Dict[str, Any]], Any],
+    discard: Callable[[Any], None] = lambda item: None,
+) -> Dict[str, Any]:
+    """
+    Insert the rows of read_rows() into `table`. `convert` turns a row into a row_model()
+    instance, raising RowError or ValidationError for an invalid one; `discard` is called for every
+    converted instance that did not make it into the table.
+    Returns {"imported", "failed", "errors": [{"line", "error"}]}.
+    """
+    report = _Report()
+    batch: List[Tuple[int, BaseModel]] = []
+    try:
+        for line, row, error in rows:
+            if error is None:
+                try:
+                    batch.append((line, convert(row)))
+                except (RowError, ValidationError) as e:
+                    error = describe(e)
+            if error is not None:
+                report.fail(line, error)
+            if len(batch) >= IMPORT_BATCH_SIZE:
+                pending, batch = batch, []
+                _insert_batch(db_engine, table, pending, report, discard)  # Discards the batch itself if it fails
+    except BaseException:
+        # Anything else from convert (a bad zip entry, a failed blob write) ends the import
+        for _, item in batch:
+            discard(item)
+        raise
+    if batch:
+        _insert_batch(db_engine, table, batch, report, discard)
+    return report.to_dict()
+
+def _plain(value: Any) -> Any:
+    return value.isoformat() if isinstance(value, datetime) else value
+
+def export_rows(
+    db_engine: Engine,
+    query,
+    fmt: str,
+    fields: List[str],
+    transform: Optional[Callable[[Dict[str, Any]], Dict[str, Any]]] = None,
+) -> Iterator[bytes]:
+    """Encoded rows of a Core select, `fields` in that order (and as the CSV header)."""
+    with db_engine.connect() as conn:
+        result = conn.execution_options(stream_results=True, yield_per=EXPORT_BATCH_SIZE).execute(query)
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator='\n')
+        if fmt == 'csv':
+            writer.writerow(fields)
+        for partition in result.partitions():
+            for row in partition:
+                row = dict(row._mapping)
+                if transform:
+                    row = transform(row)
+                values = [_plain(row.get(field)) for field in fields]
+                if fmt == 'csv':
+                    writer.writerow(values)
+                else:
+                    buffer.write(json.dumps(dict(zip(fields, values)), ensure_ascii=False))
+                    buffer.write('\n')
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue().encode('utf-8')  # The header of an empty CSV
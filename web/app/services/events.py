@@ -0,0 +1,167 @@
+"""
+In-process pub/sub bus for pushing changes to browsers over Server-Sent Events.
+
+Write paths publish small deltas after they commit; routers/events.py streams
+them to every subscriber, so open tabs learn about changes without polling.
+publish() may be called from the event loop, the threadpool or the review
+scheduler thread: delivery is handed to each subscriber's loop.
+
+Event types:
+    paper.status            {id, title, from, to, next_review_date, start_date, last_reviewed_at,
+                            previous_reviewed_at}: a paper's status or dates changed; from/to are
+                            None on create/delete
+    review.due              {papers: [{id, title}], count}: papers the review scheduler moved to '4'
+    wrong_question.created  {id, subject, question_type, review_at}
+    resync                  {reason}: many rows changed at once; refetch
+
+Every event gets an increasing id. The last REPLAY_SIZE events are kept so a
+client reconnecting with Last-Event-ID gets what it missed; one that fell
+further behind, or whose queue overflowed, is sent a resync instead.
+"""
+from collections import deque
+from datetime import datetime
+from typing import Any, Deque, Dict, List, Optional, Set
+import asyncio
+import json
+import os
+import threading
+
+QUEUE_SIZE = int(os.environ.get('LMS_EVENT_QUEUE_SIZE', 256))
+REPLAY_SIZE = int(os.environ.get('LMS_EVENT_REPLAY_SIZE', 1024))
+MAX_EVENT_PAPERS = 1000  # papers listed in one review.due event; count is always exact
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"{value.__class__.__name__} is not JSON serializable")
+
+class Event:
+    __slots__ = ('id', 'type', 'data')
+
+    def __init__(self, event_id: int, event_type: str, data: str):
+        self.id = event_id
+        self.type = event_type
+        self.data = data
+
+    def encode(self) -> str:
+        return f"id: {self.id}\nevent: {self.type}\ndata: {self.data}\n\n"
+
+class Subscription:
+    def __init__(self, bus: 'EventBus', types: Optional[Set[str]]):
+        self.bus = bus
+        self.types = types
+        self.loop = asyncio.get_running_loop()
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        self.overflowed = False
+
+    def wants(self, event: Event) -> bool:
+        return self.types is None or event.type in self.types or event.type == 'resync'
+
+    def _deliver(self, event: Event):
+        # Runs on the subscriber's loop
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # A client this far behind refetches instead of receiving the backlog
+            self.overflowed = True
+
+    async def get(self) -> Event:
+        if self.overflowed:
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.overflowed = False
+            return Event(self.bus.last_id, 'resync', json.dumps({"reason": "overflow"}))
+        return await self.queue.get()
+
+    def close(self):
+        self.bus.unsubscribe(self)
+
+class EventBus:
+    def __init__(self):
+        self._subscribers: Set[Subscription] = set()
+        self._recent: Deque[Event] = deque(maxlen=REPLAY_SIZE)
+        self._lock = threading.Lock()
+        self.last_id = 0
+
+    def subscribe(self, types: Optional[Set[str]] = None) -> Subscription:
+        """Must be called on the event loop that will read the subscription."""
+        subscription = Subscription(self, types)
+        with self._lock:
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return len(self._subscribers)
+
+    def publish(self, event_type: str, data: Dict[str, Any]) -> Event:
+        payload = json.dumps(data, default=_json_default, ensure_ascii=False)
+        with self._lock:
+            self.last_id += 1
+            event = Event(self.last_id, event_type, payload)
+            self._recent.append(event)
+            subscribers = [s for s in self._subscribers if s.wants(event)]
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription._deliver, event)
+            except RuntimeError:
+                self.unsubscribe(subscription)  # Its loop has closed
+        return event
+
+    def since(self, last_id: int) -> Optional[List[Event]]:
+        """Events after `last_id`, or None when some of them are no longer kept."""
+        with self._lock:
+            if last_id > self.last_id:
+                return None  # Issued before a restart
+            oldest = self._recent[0].id if self._recent else self.last_id + 1
+            if oldest > last_id + 1 and last_id != self.last_id:
+                return None
+            return [event for event in self._recent if event.id > last_id]
+
+event_bus = EventBus()
+
+# --- Helpers for the write paths ---
+def paper_changed(paper, previous_status: Optional[str], previous_reviewed_at: Optional[datetime]):
+    """Publish the status and dates of a paper that was just committed, with the values it had before (None for new papers)."""
+    event_bus.publish('paper.status', {
+        "id": paper.id,
+        "title": paper.title,
+        "from": previous_status,
+        "to": paper.status,
+        "next_review_date": paper.next_review_date,
+        "start_date": paper.start_date,
+        "last_reviewed_at": paper.last_reviewed_at,
+        "previous_reviewed_at": previous_reviewed_at,
+    })
+
+def paper_deleted(paper):
+    event_bus.publish('paper.status', {
+        "id": paper.id,
+        "title": paper.title,
+        "from": paper.status,
+        "to": None,
+        "next_review_date": None,
+        "start_date": paper.start_date,
+        "last_reviewed_at": None,
+        "previous_reviewed_at": paper.last_reviewed_at,
+    })
+
+def reviews_due(papers: List[Dict[str, Any]]):
+    event_bus.publish('review.due', {"papers": papers[:MAX_EVENT_PAPERS], "count": len(papers)})
+
+def wrong_question_created(question):
+    event_bus.publish('wrong_question.created', {
+        "id": question.id,
+        "subject": question.subject,
+        "question_type": question.question_type,
+        "review_at": question.review_at,
+    })
+
+def resync(reason: str):
+    event_bus.publish('resync', {"reason": reason})
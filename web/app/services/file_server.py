@@ -0,0 +1,235 @@
+"""
+Byte-range file responses for PDFs and wrong question files.
+
+serve_file() answers GET and HEAD for a file on disk with validators (ETag
+from mtime and size, Last-Modified), 304 on If-None-Match/If-Modified-Since,
+and a single Range as 206 Partial Content (honouring If-Range), so a PDF
+viewer seeking through a large scan only downloads the pages it shows.
+
+Open file descriptors and their stat results are kept in an LRU, so a hot
+file costs no open() or stat() per request. An entry is trusted for
+STAT_TTL seconds, then revalidated with one stat() and reopened only if the
+file was replaced or changed. Reads use os.pread on the shared descriptor
+from the threadpool; when the ASGI server offers the zerocopy extension the
+range is handed to it instead, which lets it use sendfile(). Descriptors in
+use by a response are closed only once that response is done with them.
+"""
+from collections import OrderedDict
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Dict, Optional, Tuple
+import mimetypes
+import os
+import stat
+import threading
+import time
+
+from fastapi import Request, Response
+from fastapi.concurrency import run_in_threadpool
+from starlette.types import Receive, Scope, Send
+
+from app.services.http_cache import is_not_modified
+
+MAX_OPEN_FILES = int(os.environ.get('LMS_FILE_CACHE_SIZE', 64))
+STAT_TTL = float(os.environ.get('LMS_FILE_STAT_TTL', 2))
+CHUNK_SIZE = 256 * 1024
+
+class OpenFile:
+    __slots__ = ('path', 'fd', 'stat', 'checked', 'users', 'retired')
+
+    def __init__(self, path: str, fd: int, file_stat: os.stat_result, checked: float):
+        self.path = path
+        self.fd = fd
+        self.stat = file_stat
+        self.checked = checked
+        self.users = 0
+        self.retired = False
+
+def _same_file(a: os.stat_result, b: os.stat_result) -> bool:
+    return (a.st_dev, a.st_ino, a.st_size, a.st_mtime_ns) == (b.st_dev, b.st_ino, b.st_size, b.st_mtime_ns)
+
+class FileCache:
+    """LRU of open descriptors by path. Every acquired entry must be released."""
+
+    def __init__(self, max_open: int, stat_ttl: float):
+        self.max_open = max_open
+        self.stat_ttl = stat_ttl
+        self._files: 'OrderedDict[str, OpenFile]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, path: str) -> Optional[OpenFile]:
+        """The entry for `path` if it was checked recently enough, without touching the disk."""
+        with self._lock:
+            entry = self._files.get(path)
+            if entry is None or time.monotonic() - entry.checked >= self.stat_ttl:
+                return None
+            self._files.move_to_end(path)
+            entry.users += 1
+            self.hits += 1
+            return entry
+
+    def acquire(self, path: str) -> Optional[OpenFile]:
+        """The entry for `path`, checking the file again if needed. None if it is not a regular file."""
+        entry = self.lookup(path)
+        if entry:
+            return entry
+        now = time.monotonic()
+        try:
+            current = os.stat(path)
+        except OSError:
+            current = None
+        if current is None or not stat.S_ISREG(current.st_mode):
+            with self._lock:
+                self._retire(self._files.pop(path, None))
+            return None
+        with self._lock:
+            entry = self._files.get(path)
+            if entry and _same_file(entry.stat, current):
+                entry.checked = now
+                self._files.move_to_end(path)
+                entry.users += 1
+                self.hits += 1
+                return entry
+        try:
+            fd = os.open(path, os.O_RDONLY | getattr(os, 'O_CLOEXEC', 0))
+        except OSError:
+            return None
+        entry = OpenFile(path, fd, os.fstat(fd), now)
+        entry.users = 1
+        with self._lock:
+            self.misses += 1
+            self._retire(self._files.pop(path, None))
+            self._files[path] = entry
+            while len(self._files) > self.max_open:
+                self._retire(self._files.popitem(last=False)[1])
+        return entry
+
+    def release(self, entry: OpenFile):
+        with self._lock:
+            entry.users -= 1
+            if entry.retired and entry.users == 0:
+                os.close(entry.fd)
+
+    def _retire(self, entry: Optional[OpenFile]):
+        # Caller holds the lock
+        if entry is None:
+            return
+        entry.retired = True
+        if entry.users == 0:
+            os.close(entry.fd)
+
+    def clear(self):
+        with self._lock:
+            while self._files:
+                self._retire(self._files.popitem()[1])
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"open": len(self._files), "max_open": self.max_open, "hits": self.hits, "misses": self.misses}
+
+file_cache = FileCache(MAX_OPEN_FILES, STAT_TTL)
+
+class FileRangeResponse(Response):
+    """Sends bytes [start, start + count) of an acquired file and releases it."""
+
+    def __init__(self, entry: OpenFile, start: int, count: int, status_code: int, headers: Dict[str, str], media_type: str):
+        self.entry = entry
+        self.start = start
+        self.count = count
+        self.status_code = status_code
+        self.media_type = media_type
+        self.background = None
+        self.init_headers({**headers, 'Content-Length': str(count)})
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        try:
+            await send({'type': 'http.response.start', 'status': self.status_code, 'headers': self.raw_headers})
+            if scope['method'] == 'HEAD' or self.count == 0:
+                await send({'type': 'http.response.body', 'body': b''})
+                return
+            if 'http.response.zerocopy' in scope.get('extensions', {}):
+                with os.fdopen(os.dup(self.entry.fd), 'rb') as f:
+                    await send({'type': 'http.response.zerocopy', 'file': f, 'offset': self.start, 'count': self.count})
+                return
+            offset, end = self.start, self.start + self.count
+            while offset < end:
+                chunk = await run_in_threadpool(os.pread, self.entry.fd, min(CHUNK_SIZE, end - offset), offset)
+                if not chunk:
+                    raise RuntimeError(f"{self.entry.path} was truncated while it was being sent")
+                offset += len(chunk)
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': offset < end})
+        finally:
+            file_cache.release(self.entry)
+
+def _parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """(start, end inclusive) of a single byte range, (size, size) if it cannot be satisfied, None to send everything."""
+    unit, _, spec = header.partition('=')
+    if unit.strip().lower() != 'bytes' or ',' in spec:
+        return None  # Other units and multiple ranges are ignored, which RFC 9110 allows
+    first, dash, last = spec.strip().partition('-')
+    if not dash or not (first.isdigit() or last.isdigit()) or (first and not first.isdigit()) or (last and not last.isdigit()):
+        return None
+    if not first:
+        suffix = int(last)
+        return (max(size - suffix, 0), size - 1) if suffix and size else (size, size)
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size:
+        return (size, size)
+    return (start, end) if start <= end else None
+
+def _if_range_matches(value: str, etag: str, last_modified: float) -> bool:
+    if value.startswith('"') or value.startswith('W/'):
+        return value == etag  # Strong comparison
+    try:
+        return parsedate_to_datetime(value).timestamp() >= int(last_modified)
+    except (TypeError, ValueError):
+        return False
+
+def _not_modified_since(value: str, last_modified: float) -> bool:
+    try:
+        return int(last_modified) <= parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError):
+        return False
+
+async def serve_file(request: Request, path: str, media_type: Optional[str] = None) -> Optional[Response]:
+    """Response for the file at `path`, or None if there is no such file."""
+    entry = file_cache.lookup(path) or await run_in_threadpool(file_cache.acquire, path)
+    if entry is None:
+        return None
+    try:
+        file_stat = entry.stat
+        size = file_stat.st_size
+        etag = f'"{file_stat.st_mtime_ns:x}-{size:x}"'
+        headers = {
+            'ETag': etag,
+            'Last-Modified': formatdate(file_stat.st_mtime, usegmt=True),
+            'Accept-Ranges': 'bytes',
+            'Cache-Control': 'no-cache',
+        }
+        media_type = media_type or mimetypes.guess_type(path)[0] or 'application/octet-stream'
+
+        if_none_match = request.headers.get('if-none-match')
+        if is_not_modified(request, etag) or (
+            if_none_match is None and _not_modified_since(request.headers.get('if-modified-since', ''), file_stat.st_mtime)
+        ):
+            file_cache.release(entry)
+            return Response(status_code=304, headers=headers)
+
+        byte_range = None
+        if 'range' in request.headers and request.method in ('GET', 'HEAD'):
+            if_range = request.headers.get('if-range')
+            if if_range is None or _if_range_matches(if_range, etag, file_stat.st_mtime):
+                byte_range = _parse_range(request.headers['range'], size)
+        if byte_range is None:
+            return FileRangeResponse(entry, 0, size, 200, headers, media_type)
+        start, end = byte_range
+        if start >= size:
+            file_cache.release(entry)
+            return Response(status_code=416, headers={**headers, 'Content-Range': f'bytes */{size}'})
+        headers['Content-Range'] = f'bytes {start}-{end}/{size}'
+        return FileRangeResponse(entry, start, end - start + 1, 206, headers, media_type)
+    except BaseException:
+        file_cache.release(entry)
+        raise
@@ -0,0 +1,91 @@
+"""
+Process-wide cache of parsed TrueType fonts for fpdf2.
+
+`FPDF.add_font` parses the whole TTF (cmap, glyph metrics, ...) for every
+document, which for a CJK font like NotoSansSC costs far more than laying
+out a worksheet. Here each font file is parsed once into a template font;
+every document then gets a light clone that shares the parsed metrics and
+only carries its own subset state, so a render only subsets the glyphs it
+actually uses.
+
+The clone relies on fpdf2 internals (tested with 2.8.9). If they are not
+what it expects, register_font warns once and falls back to add_font.
+"""
+from io import BytesIO
+from typing import Dict, Tuple
+import threading
+
+from fpdf import FPDF
+from fontTools import ttLib
+
+try:
+    from fpdf.fonts import TTFFont, SubsetMap, get_color_font_object
+except ImportError:  # A newer fpdf2 moved its internals: every document parses the font itself
+    TTFFont = None
+
+_lock = threading.Lock()
+_templates: Dict[Tuple[str, str, str], Tuple[object, bytes]] = {}
+_clone_failed = False
+
+def _get_template(family: str, style: str, font_path: str) -> Tuple[object, bytes]:
+    key = (family.lower(), style, font_path)
+    with _lock:
+        if key not in _templates:
+            with open(font_path, 'rb') as f:
+                font_bytes = f.read()
+            loader = FPDF()
+            loader.add_font(family, style, font_path)
+            _templates[key] = (loader.fonts[f"{family.lower()}{style}"], font_bytes)
+        return _templates[key]
+
+def preload(family: str, font_path: str, style: str = '') -> None:
+    """Parse a font ahead of the first request."""
+    _get_template(family, style, font_path)
+
+def _clone(pdf: FPDF, template, font_bytes: bytes):
+    if not isinstance(template, TTFFont):
+        raise TypeError(f"add_font made a {type(template).__name__}")
+    font = TTFFont.__new__(TTFFont)
+    for attr in TTFFont.__slots__:
+        if hasattr(template, attr):
+            setattr(font, attr, getattr(template, attr))
+
+    # Per-document state: subsetting at output time modifies the fontTools
+    # object in place, and width lookups can add entries to cw.
+    font.i = len(pdf.fonts) + 1
+    font.ttfont = ttLib.TTFont(BytesIO(font_bytes), recalcTimestamp=False, lazy=True)
+    if font.is_compressed:
+        font.ttfont.flavor = None
+    font.cw = template.cw.copy()
+    font.glyph_ids = dict(template.glyph_ids)
+    font.missing_glyphs = []
+    font.biggest_size_pt = 0
+    font._hbfont = None
+    font.subset = SubsetMap(font)
+    font.color_font = get_color_font_object(pdf, font, font.palette_index) if pdf.render_color_fonts else None
+    return font
+
+def register_font(pdf: FPDF, family: str, font_path: str, style: str = '') -> None:
+    """Drop-in replacement for `pdf.add_font(family, style, font_path)` backed by the cache."""
+    global _clone_failed
+    style = "".join(sorted(style.upper()))
+    fontkey = f"{family.lower()}{style}"
+    if fontkey in pdf.fonts:
+        return
+    if TTFFont is None or _clone_failed:
+        pdf.add_font(family, style, font_path)
+        return
+
+    try:
+        template, font_bytes = _get_template(family, style, font_path)
+        font = _clone(pdf, template, font_bytes)
+        set_min_pdf_version = pdf._set_min_pdf_version
+    except (AttributeError, TypeError) as e:
+        _clone_failed = True
+        print(f"WARNING: Cannot reuse parsed fonts with this fpdf2 version ({e}), parsing fonts per document.")
+        pdf.add_font(family, style, font_path)
+        return
+
+    pdf.fonts[fontkey] = font
+    if font.is_cff and font.is_cid_keyed:
+        set_min_pdf_version("1.6")
@@ -0,0 +1,134 @@
+"""
+Small helpers for HTTP validators (ETag / If-None-Match), plus the version
+counters and response cache behind conditional GETs on the JSON endpoints.
+
+Every write to a table through the routers, the review scheduler or the SRS
+bulk reschedule bumps that table's version once it has committed. An
+endpoint's weak ETag is derived from the versions of the tables it reads and
+its query parameters, so a request whose If-None-Match still matches is
+answered 304 before a session touches the database. The serialized body of
+recent responses is kept in an LRU keyed the same way.
+
+Versions live in this process, so this assumes the single-process server the
+app runs as; a random boot id in every ETag keeps validators from a previous
+run from matching.
+"""
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Sequence, Tuple
+import hashlib
+import os
+import threading
+import uuid
+
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+RESPONSE_CACHE_MAX_BYTES = int(os.environ.get('LMS_RESPONSE_CACHE_BYTES', 16 * 1024 * 1024))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.environ.get('LMS_RESPONSE_CACHE_ENTRIES', 256))
+
+BOOT_ID = uuid.uuid4().hex[:8]
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """Weak comparison of an If-None-Match header value against an ETag."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    opaque = etag[2:] if etag.startswith('W/') else etag
+    for candidate in if_none_match.split(','):
+        candidate = candidate.strip()
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if candidate == opaque:
+            return True
+    return False
+
+def is_not_modified(request: Request, etag: str) -> bool:
+    return etag_matches(request.headers.get('if-none-match', ''), etag)
+
+class TableVersions:
+    def __init__(self):
+        self._versions: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def bump(self, *tables: str):
+        """Call after the write has committed."""
+        with self._lock:
+            for table in tables:
+                self._versions[table] = self._versions.get(table, 0) + 1
+
+    def get(self, *tables: str) -> Tuple[int, ...]:
+        with self._lock:
+            return tuple(self._versions.get(table, 0) for table in tables)
+
+class ResponseCache:
+    """LRU of serialized JSON bodies, bounded by entry count and total bytes."""
+
+    def __init__(self, max_bytes: int, max_entries: int):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._entries: 'OrderedDict[Tuple, bytes]' = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Tuple) -> Optional[bytes]:
+        with self._lock:
+            body = self._entries.get(key)
+            if body is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return body
+
+    def put(self, key: Tuple, body: bytes):
+        # One large response must not flush everything else
+        if len(body) > self.max_bytes // 8:
+            return
+        with self._lock:
+            if key in self._entries:
+                return
+            self._entries[key] = body
+            self._bytes += len(body)
+            while self._bytes > self.max_bytes or len(self._entries) > self.max_entries:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+table_versions = TableVersions()
+response_cache = ResponseCache(RESPONSE_CACHE_MAX_BYTES, RESPONSE_CACHE_MAX_ENTRIES)
+
+async def cached_json(
+    request: Request,
+    tables: Sequence[str],
+    load: Callable[[], Awaitable[Any]],
+    vary: Sequence[Any] = (),
+) -> Response:
+    """
+    Answer a GET from `load()` with a weak ETag over the versions of `tables`, the
+    query string and `vary` (anything else the result depends on, such as today's date).
+    """
+    versions = table_versions.get(*tables)
+    params = tuple(sorted(request.query_params.multi_items()))
+    digest = hashlib.sha1(repr((request.url.path, params, tuple(vary))).encode()).hexdigest()[:16]
+    etag = f'W/"{BOOT_ID}-{".".join(map(str, versions))}-{digest}"'
+    headers = {'ETag': etag, 'Cache-Control': 'no-cache'}
+    if is_not_modified(request, etag):
+        return Response(status_code=304, headers=headers)
+
+    key = (request.url.path, params, tuple(vary), versions)
+    body = response_cache.get(key)
+    if body is None:
+        body = JSONResponse(jsonable_encoder(await load())).body
+        # A write that committed while loading makes this body possibly stale; it is still
+        # right for this request, but only cache it under a version that is still current
+        if table_versions.get(*tables) == versions:
+            response_cache.put(key, body)
+    return Response(content=body, media_type='application/json', headers=headers)
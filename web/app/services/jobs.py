@@ -0,0 +1,385 @@
+"""
+Background jobs for CPU-heavy PDF work.
+
+Jobs run in worker processes, up to LMS_JOB_WORKERS at a time, so renders
+use every core without tying up request threads. Every job is a row in the
+`job` table: the API creates it, the worker process reports progress into
+it, and on startup jobs that were queued or running when the server stopped
+are submitted again.
+
+Cancellation and timeouts are cooperative first: the worker checks the row
+(and its deadline) every time it reports progress and stops when it is told
+to. Every job has a process of its own, so one that does not stop (stuck in
+a single long call) is killed: at once when it is cancelled, and KILL_GRACE
+seconds after its timeout otherwise.
+"""
+from collections import deque
+from concurrent.futures import Future
+from datetime import datetime, timedelta
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+import json
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+
+from sqlmodel import Session, select
+from app.db import SQLite_DB
+from app.services.metrics import PDF_JOB_SECONDS
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+JOBS_DIR = os.path.join(BASE_DIR, '..', 'tmp', 'jobs')
+
+MAX_WORKERS = int(os.environ.get('LMS_JOB_WORKERS', os.cpu_count() or 2))
+MAX_PENDING = int(os.environ.get('LMS_JOB_QUEUE_LIMIT', 32))
+DEFAULT_TIMEOUT = 300
+MAX_TIMEOUT = 3600
+RESULT_TTL = timedelta(hours=24)
+PROGRESS_INTERVAL = 0.5  # seconds between progress writes from a worker
+SUPERVISE_INTERVAL = 0.2  # seconds between checks on the worker processes
+KILL_GRACE = 10  # seconds past its timeout before a job's worker is killed
+
+ACTIVE_STATUSES = ('queued', 'running')
+FINAL_STATUSES = ('done', 'failed', 'cancelled')
+
+class JobQueueFull(Exception):
+    pass
+
+class JobStopped(Exception):
+    """Raised inside a worker when its job was cancelled or ran out of time."""
+
+# --- Worker side ---
+class _ProgressReporter:
+    def __init__(self, job_id: str, deadline: float):
+        self.job_id = job_id
+        self.deadline = deadline
+        self._last_write = 0.0
+
+    def __call__(self, fraction: float):
+        if time.time() > self.deadline:
+            raise JobStopped("Job timed out")
+        now = time.monotonic()
+        if now - self._last_write < PROGRESS_INTERVAL and fraction < 1:
+            return
+        self._last_write = now
+        with Session(SQLite_DB.engine) as session:
+            job = session.get(SQLite_DB.Job, self.job_id)
+            if not job or job.status != 'running':
+                raise JobStopped("Job was cancelled")
+            job.progress = round(fraction, 4)
+            session.add(job)
+            session.commit()
+
+def _render(kind: str, params: Dict[str, Any], output, progress: Callable[[float], None]) -> Optional[List[Dict[str, str]]]:
+    """Write the PDF of a job to `output`. Returns the report of the files a merge left out, if it is one."""
+    if kind == 'worksheet':
+        from app.routers.pdf_generator import render_worksheet
+        output.write(render_worksheet(**params, progress=progress))
+        return None
+    elif kind == 'wrong_question_book':
+        from app.routers.wrong_question_book import build_wrong_question_book, merge_error_report
+        # Jobs already run one per worker process, so the book is merged serially here
+        output_pdf, errors = build_wrong_question_book(params['question_paths'], params['answer_paths'], progress=progress, workers=1)
+        output_pdf.write(output)
+        return merge_error_report(errors)
+    else:
+        raise ValueError(f"Unknown job kind: {kind}")
+
+def _partial_path(job_id: str) -> str:
+    return os.path.join(JOBS_DIR, f"{job_id}.pdf.part")
+
+def _remove_partial(job_id: str):
+    try:
+        os.remove(_partial_path(job_id))
+    except FileNotFoundError:
+        pass
+
+def run_job(job_id: str, kind: str, params: Dict[str, Any], timeout: int) -> Tuple[str, Optional[List[Dict[str, str]]]]:
+    """
+    Entry point executed in a worker process. Returns the path of the rendered PDF and the merge report.
+    The timeout runs from here, like expire_overdue's, so time spent queued does not count.
+    """
+    with Session(SQLite_DB.engine) as session:
+        job = session.get(SQLite_DB.Job, job_id)
+        if not job or job.status != 'queued':
+            raise JobStopped("Job is no longer queued")
+        job.status = 'running'
+        job.started_at = datetime.utcnow()
+        session.add(job)
+        session.commit()
+    deadline = time.time() + timeout
+
+    result_path = os.path.join(JOBS_DIR, f"{job_id}.pdf")
+    tmp_path = _partial_path(job_id)
+    try:
+        with open(tmp_path, 'wb') as f:
+            errors = _render(kind, params, f, _ProgressReporter(job_id, deadline))
+        os.replace(tmp_path, result_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return result_path, errors
+
+def _run_in_process(conn, job_id: str, kind: str, params: Dict[str, Any], timeout: int):
+    """Target of a job's worker process: runs it and sends (True, result) or (False, error message) back."""
+    try:
+        conn.send((True, run_job(job_id, kind, params, timeout)))
+    except BaseException as e:
+        conn.send((False, str(e) or e.__class__.__name__))
+    finally:
+        conn.close()
+
+# --- Server side ---
+class _Worker:
+    __slots__ = ('process', 'conn', 'future', 'deadline', 'reason')
+
+    def __init__(self, process, conn, future: Future, deadline: float):
+        self.process = process
+        self.conn = conn
+        self.future = future
+        self.deadline = deadline
+        self.reason: Optional[str] = None  # set when the server stops the worker
+
+class JobManager:
+    """
+    Runs every job in its own spawned process, at most MAX_WORKERS at a time, so a job that is
+    cancelled or overdue can be stopped even while stuck inside one pypdf or fpdf call.
+    """
+
+    def __init__(self):
+        self._context = multiprocessing.get_context('spawn')
+        self._futures: Dict[str, Future] = {}
+        self._pending: Deque[Tuple[str, str, Dict[str, Any], int, Future]] = deque()
+        self._running: Dict[str, _Worker] = {}
+        self._reserved = 0  # queue slots held by submits that have not dispatched yet
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+
+    def start(self):
+        os.makedirs(JOBS_DIR, exist_ok=True)
+        self._stopping = False
+        self._thread = threading.Thread(target=self._supervise, name='job-supervisor', daemon=True)
+        self._thread.start()
+        self._resume()
+
+    def shutdown(self):
+        if self._thread is None:
+            return
+        self._stopping = True
+        self._wakeup.set()
+        self._thread.join()
+        self._thread = None
+        with self._lock:
+            workers = list(self._running.values())
+            self._running.clear()
+            pending = [future for *_, future in self._pending]
+            self._pending.clear()
+        for worker in workers:
+            # Left in the running state, so _resume submits them again on the next start
+            worker.process.kill()
+            worker.process.join()
+            worker.conn.close()
+        for future in pending:
+            future.cancel()
+
+    def _resume(self):
+        """Resubmit jobs that were queued or running when the server stopped."""
+        with Session(SQLite_DB.engine) as session:
+            jobs = session.exec(
+                select(SQLite_DB.Job).where(SQLite_DB.Job.status.in_(ACTIVE_STATUSES)).order_by(SQLite_DB.Job.created_at)
+            ).all()
+            for job in jobs:
+                job.status = 'queued'
+                job.progress = 0
+                session.add(job)
+            session.commit()
+            for job in jobs:
+                self._dispatch(job.id, job.kind, json.loads(job.params), job.timeout)
+        if jobs:
+            print(f"Resumed {len(jobs)} unfinished jobs.")
+
+    def pending_count(self) -> int:
+        with self._lock:
+            return len(self._futures) + self._reserved
+
+    def submit(self, session: Session, kind: str, params: Dict[str, Any], timeout: Optional[int] = None) -> SQLite_DB.Job:
+        if self._thread is None:
+            raise RuntimeError("Job manager is not running")
+        with self._lock:
+            # Reserved before the insert, so concurrent submits cannot all pass the check
+            if len(self._futures) + self._reserved >= MAX_PENDING:
+                raise JobQueueFull()
+            self._reserved += 1
+        try:
+            timeout = min(timeout or DEFAULT_TIMEOUT, MAX_TIMEOUT)
+            job = SQLite_DB.Job(id=uuid.uuid4().hex, kind=kind, params=json.dumps(params), timeout=timeout)
+            session.add(job)
+            session.commit()
+            session.refresh(job)
+            self._dispatch(job.id, kind, params, timeout)
+        finally:
+            with self._lock:
+                self._reserved -= 1
+        return job
+
+    def _dispatch(self, job_id: str, kind: str, params: Dict[str, Any], timeout: int):
+        future = Future()
+        with self._lock:
+            self._futures[job_id] = future
+            self._pending.append((job_id, kind, params, timeout, future))
+        future.add_done_callback(lambda f: self._finish(job_id, f))
+        self._wakeup.set()
+
+    def _supervise(self):
+        while not self._stopping:
+            try:
+                self._reap()
+                self._start_pending()
+            except Exception as e:
+                print(f"Error supervising job workers: {e}")
+            self._wakeup.wait(SUPERVISE_INTERVAL)
+            self._wakeup.clear()
+
+    def _start_pending(self):
+        while True:
+            with self._lock:
+                if not self._pending or len(self._running) >= MAX_WORKERS:
+                    return
+                job_id, kind, params, timeout, future = self._pending.popleft()
+                if not future.set_running_or_notify_cancel():
+                    continue  # Cancelled while it waited
+                receiver, sender = self._context.Pipe(duplex=False)
+                # Spawned workers start clean instead of inheriting the server's threads and DB connections
+                process = self._context.Process(
+                    target=_run_in_process, args=(sender, job_id, kind, params, timeout), name=f'job-{job_id[:8]}', daemon=True
+                )
+                # The worker measures its own timeout from when it marks the job running; this one
+                # also covers starting the interpreter and stopping at the next progress report
+                self._running[job_id] = _Worker(process, receiver, future, time.monotonic() + timeout + KILL_GRACE)
+            try:
+                process.start()
+            except Exception as e:
+                with self._lock:
+                    self._running.pop(job_id, None)
+                future.set_exception(e)
+            finally:
+                sender.close()
+
+    def _reap(self):
+        now = time.monotonic()
+        with self._lock:
+            workers = list(self._running.items())
+        for job_id, worker in workers:
+            result = None
+            if worker.conn.poll():  # Read before joining: a worker blocks on a full pipe until it is read
+                try:
+                    result = worker.conn.recv()
+                except EOFError:
+                    pass
+            elif worker.process.is_alive():
+                if worker.reason is None and now < worker.deadline:
+                    continue
+                worker.reason = worker.reason or "Job timed out"
+                worker.process.kill()
+            worker.process.join()
+            worker.conn.close()
+            with self._lock:
+                self._running.pop(job_id, None)
+            if worker.reason is not None:
+                _remove_partial(job_id)  # A killed worker cannot clean up after itself
+            if result is not None and result[0]:
+                worker.future.set_result(result[1])
+            else:
+                message = worker.reason or (result[1] if result else f"Worker exited with code {worker.process.exitcode}")
+                worker.future.set_exception(JobStopped(message) if worker.reason else RuntimeError(message))
+
+    def _stop(self, job_id: str, reason: str):
+        """Kill the worker of a running job on the next supervisor pass."""
+        with self._lock:
+            worker = self._running.get(job_id)
+            if worker is not None and worker.reason is None:
+                worker.reason = reason
+        self._wakeup.set()
+
+    def _finish(self, job_id: str, future: Future):
+        with self._lock:
+            self._futures.pop(job_id, None)
+        if future.cancelled():
+            return
+        error = future.exception()
+        with Session(SQLite_DB.engine) as session:
+            job = session.get(SQLite_DB.Job, job_id)
+            if not job or job.status in FINAL_STATUSES:
+                # Cancelled or timed out while the worker kept going: drop what it produced
+                if error is None and os.path.exists(future.result()[0]):
+                    os.remove(future.result()[0])
+                return
+            if error is None:
+                result_path, errors = future.result()
+                job.status = 'done'
+                job.progress = 1
+                job.result_path = result_path
+                job.errors = json.dumps(errors, ensure_ascii=False) if errors is not None else None
+            else:
+                job.status = 'failed'
+                job.error = str(error) or error.__class__.__name__
+            job.finished_at = datetime.utcnow()
+            session.add(job)
+            session.commit()
+            if job.started_at:
+                PDF_JOB_SECONDS.observe((job.finished_at - job.started_at).total_seconds(), kind=job.kind, status=job.status)
+
+    def cancel(self, session: Session, job: SQLite_DB.Job) -> SQLite_DB.Job:
+        if job.status in FINAL_STATUSES:
+            return job
+        with self._lock:
+            future = self._futures.get(job.id)
+        if future is not None:
+            future.cancel()  # Only succeeds while the job is still waiting for a worker
+        job.status = 'cancelled'
+        job.finished_at = datetime.utcnow()
+        session.add(job)
+        session.commit()
+        session.refresh(job)
+        # After the commit, so _finish sees the job is over and drops whatever the worker left
+        self._stop(job.id, "Job was cancelled")
+        return job
+
+    def expire_overdue(self):
+        """Fail jobs that are still running well past their deadline, and stop their worker if there is one."""
+        now = datetime.utcnow()
+        overdue = []
+        with Session(SQLite_DB.engine) as session:
+            running = session.exec(select(SQLite_DB.Job).where(SQLite_DB.Job.status == 'running')).all()
+            for job in running:
+                if job.started_at and job.started_at + timedelta(seconds=job.timeout * 2) < now:
+                    job.status = 'failed'
+                    job.error = "Job timed out"
+                    job.finished_at = now
+                    session.add(job)
+                    overdue.append(job.id)
+            session.commit()
+        for job_id in overdue:
+            self._stop(job_id, "Job timed out")
+
+    def purge_finished(self) -> int:
+        """Delete finished jobs and their results once they are older than RESULT_TTL."""
+        cutoff = datetime.utcnow() - RESULT_TTL
+        with Session(SQLite_DB.engine) as session:
+            jobs = session.exec(
+                select(SQLite_DB.Job).where(SQLite_DB.Job.status.in_(FINAL_STATUSES), SQLite_DB.Job.finished_at < cutoff)
+            ).all()
+            for job in jobs:
+                if job.result_path and os.path.exists(job.result_path):
+                    try:
+                        os.remove(job.result_path)
+                    except OSError as e:
+                        print(f"Error deleting job result {job.result_path}: {e}")
+                session.delete(job)
+            session.commit()
+        return len(jobs)
+
+job_manager = JobManager()
@@ -0,0 +1,270 @@
+"""
+Request, database, scheduler and PDF metrics in the Prometheus text format.
+
+MetricsMiddleware times every request by route template (/paper/{id}/, not
+/paper/12/) and keeps a gauge of requests in flight. SQLAlchemy cursor events
+on every engine made by SQLite_DB add the time and count of the queries a
+request runs to it, through a context variable that follows the request into
+the threadpool and the async engine's greenlets. Requests slower than
+LMS_SLOW_REQUEST_MS are printed with the SQL they ran.
+
+Scheduler jobs are wrapped with track_job(); PDF renders and merges are
+timed with PDF_SECONDS. GET /metrics serves render(). The metric types are
+the small subset of the Prometheus client the app needs, so it adds no
+dependency. Values live in this process: background jobs and merge workers
+report what the server sees of them.
+"""
+from bisect import bisect_left
+from contextlib import ContextDecorator
+from contextvars import ContextVar
+from functools import wraps
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+import os
+import threading
+import time
+
+from sqlalchemy import Engine, event
+from starlette.routing import Match
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+SLOW_REQUEST_SECONDS = float(os.environ.get('LMS_SLOW_REQUEST_MS', 1000)) / 1000
+MAX_SLOW_STATEMENTS = 50  # SQL kept per request for the slow request log
+
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 500)
+TASK_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+def _escape(value: str) -> str:
+    return value.replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+def _format(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+class _Metric:
+    kind = ''
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        registry.append(self)
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels[name]) for name in self.labels)
+
+    def _label_text(self, key: Tuple[str, ...], extra: str = '') -> str:
+        pairs = [f'{name}="{_escape(value)}"' for name, value in zip(self.labels, key)]
+        if extra:
+            pairs.append(extra)
+        return '{' + ','.join(pairs) + '}' if pairs else ''
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        return '\n'.join(lines + self.samples())
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            return [f"{self.name}{self._label_text(key)} {_format(value)}" for key, value in self._values.items()]
+
+class Gauge(Counter):
+    kind = 'gauge'
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+class _Timer(ContextDecorator):
+    def __init__(self, histogram: 'Histogram', labels: Dict[str, str]):
+        self.histogram = histogram
+        self.labels = labels
+
+    def _recreate_cm(self):
+        return _Timer(self.histogram, self.labels)  # A fresh start time per call when used as a decorator
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started, **self.labels)
+        return False
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = (), buckets: Sequence[float] = REQUEST_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        # Per label set: count per bucket (not cumulative), sum, count
+        self._values: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = ([0] * len(self.buckets), [0.0, 0])
+            entry[0][index] += 1
+            entry[1][0] += value
+            entry[1][1] += 1
+
+    def time(self, **labels) -> _Timer:
+        """Context manager and decorator observing the time spent in it."""
+        return _Timer(self, labels)
+
+    def samples(self) -> List[str]:
+        lines = []
+        with self._lock:
+            values = [(key, list(counts), list(totals)) for key, (counts, totals) in self._values.items()]
+        for key, counts, (total, count) in values:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                le = 'le="' + _format(bound) + '"'
+                lines.append(f"{self.name}_bucket{self._label_text(key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{self._label_text(key)} {_format(total)}")
+            lines.append(f"{self.name}_count{self._label_text(key)} {count}")
+        return lines
+
+registry: List[_Metric] = []
+
+def render() -> str:
+    return '\n'.join(metric.render() for metric in registry) + '\n'
+
+REQUEST_SECONDS = Histogram('lms_http_request_duration_seconds', "Time to answer a request, body included.", ('method', 'route', 'status'))
+REQUESTS_IN_FLIGHT = Gauge('lms_http_requests_in_flight', "Requests being answered, streams included.", ('method', 'route'))
+REQUEST_DB_SECONDS = Histogram('lms_http_request_db_seconds', "Time a request spent in SQL queries.", ('method', 'route'))
+REQUEST_DB_QUERIES = Histogram('lms_http_request_db_queries', "SQL queries run by a request.", ('method', 'route'), QUERY_COUNT_BUCKETS)
+DB_QUERY_SECONDS = Histogram('lms_db_query_duration_seconds', "Time of every SQL query, in requests or not.")
+SCHEDULER_JOB_SECONDS = Histogram('lms_scheduler_job_duration_seconds', "Time of a scheduled job run.", ('job',), TASK_BUCKETS)
+SCHEDULER_JOB_FAILURES = Counter('lms_scheduler_job_failures_total', "Scheduled job runs that raised.", ('job',))
+PDF_SECONDS = Histogram('lms_pdf_duration_seconds', "Time to render or merge a PDF or preview in the server process.", ('operation',), TASK_BUCKETS)
+PDF_JOB_SECONDS = Histogram('lms_pdf_job_duration_seconds', "Time background PDF jobs ran, from start to finish.", ('kind', 'status'), TASK_BUCKETS)
+
+# ----------------- Requests -----------------
+class RequestStats:
+    __slots__ = ('db_seconds', 'queries', 'statements')
+
+    def __init__(self):
+        self.db_seconds = 0.0
+        self.queries = 0
+        self.statements: List[Tuple[float, str]] = []
+
+    def add(self, statement: str, seconds: float):
+        self.db_seconds += seconds
+        self.queries += 1
+        if len(self.statements) < MAX_SLOW_STATEMENTS:
+            self.statements.append((seconds, statement))
+
+_request_stats: ContextVar[Optional[RequestStats]] = ContextVar('lms_request_stats', default=None)
+
+def route_of(scope: Scope) -> str:
+    """Path template of the route a request goes to, so ids do not make a series each."""
+    partial = None
+    for route in getattr(scope.get('app'), 'routes', ()):
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return getattr(route, 'path', '<unmatched>')
+        if match == Match.PARTIAL and partial is None:
+            partial = getattr(route, 'path', None)
+    return partial or '<unmatched>'
+
+def log_slow_request(method: str, path: str, status: int, seconds: float, stats: RequestStats):
+    print(f"[slow] {method} {path} {status} took {seconds * 1000:.0f}ms, {stats.queries} queries in {stats.db_seconds * 1000:.0f}ms")
+    for query_seconds, statement in stats.statements:
+        print(f"[slow]   {query_seconds * 1000:8.2f}ms {' '.join(statement.split())}")
+    if stats.queries > len(stats.statements):
+        print(f"[slow]   ... and {stats.queries - len(stats.statements)} more")
+
+class MetricsMiddleware:
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        method, route = scope['method'], route_of(scope)
+        stats = RequestStats()
+        token = _request_stats.set(stats)
+        response = {'status': 500, 'stream': False}
+
+        async def send_wrapper(message: Message):
+            if message['type'] == 'http.response.start':
+                response['status'] = message['status']
+                response['stream'] = (b'content-type', b'text/event-stream') in [
+                    (name.lower(), value.split(b';')[0]) for name, value in message.get('headers', ())
+                ]
+            await send(message)
+
+        REQUESTS_IN_FLIGHT.inc(method=method, route=route)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            seconds = time.perf_counter() - started
+            _request_stats.reset(token)
+            REQUESTS_IN_FLIGHT.dec(method=method, route=route)
+            REQUEST_SECONDS.observe(seconds, method=method, route=route, status=response['status'])
+            REQUEST_DB_SECONDS.observe(stats.db_seconds, method=method, route=route)
+            REQUEST_DB_QUERIES.observe(stats.queries, method=method, route=route)
+            if seconds >= SLOW_REQUEST_SECONDS and not response['stream']:
+                log_slow_request(method, scope['path'], response['status'], seconds, stats)
+
+# ----------------- Database -----------------
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('lms_query_started', []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info['lms_query_started'].pop()
+    seconds = time.perf_counter() - started
+    DB_QUERY_SECONDS.observe(seconds)
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.add(statement, seconds)
+
+def _handle_error(context):
+    if context.connection is not None:
+        started = context.connection.info.get('lms_query_started')
+        if started:
+            started.pop()
+
+def instrument_engine(db_engine: Engine):
+    """Count the queries of `db_engine` in the metrics and in the request running them."""
+    event.listen(db_engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(db_engine, 'after_cursor_execute', _after_cursor_execute)
+    event.listen(db_engine, 'handle_error', _handle_error)
+
+# ----------------- Scheduler -----------------
+def track_job(name: str, job: Callable) -> Callable:
+    """`job` timed as `name` in the scheduler metrics, counting the runs that raise."""
+    @wraps(job)
+    def run(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return job(*args, **kwargs)
+        except Exception:
+            SCHEDULER_JOB_FAILURES.inc(job=name)
+            raise
+        finally:
+            SCHEDULER_JOB_SECONDS.observe(time.perf_counter() - started, job=name)
+    return run
@@ -0,0 +1,143 @@
+"""
+Keyset pagination with column projection for list endpoints.
+
+Pages are ordered by (sort column, id) and the cursor holds the last row's
+values, so fetching page N costs the same as page 1: the database seeks to
+the cursor through the index instead of counting past OFFSET rows. Sorting
+by a nullable column follows SQLite's order, NULLs first ascending and last
+descending.
+"""
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence
+import base64
+import binascii
+import json
+
+from sqlalchemy import and_, func, or_, tuple_
+from sqlmodel import SQLModel, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+class PaginationError(ValueError):
+    pass
+
+def encode_cursor(sort: str, value: Any, row_id: int) -> str:
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    raw = json.dumps({"s": sort, "v": value, "id": row_id}, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_cursor(cursor: str, sort: str, column) -> Dict[str, Any]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        data = json.loads(raw)
+        value, row_id = data["v"], int(data["id"])
+        if data["s"] != sort:
+            raise PaginationError("Cursor was issued for a different sort order")
+        if value is not None and column.type.python_type is datetime:
+            value = datetime.fromisoformat(value)
+    except PaginationError:
+        raise
+    except (binascii.Error, ValueError, KeyError, TypeError) as e:
+        raise PaginationError("Invalid cursor") from e
+    return {"value": value, "id": row_id}
+
+def _after_cursor(column, id_column, value, row_id, descending: bool) -> List:
+    """
+    Conditions for the rows after the cursor, as segments to read in turn.
+    An OR of them would be simpler but stops SQLite from seeking in the index.
+    """
+    if column is id_column:
+        return [id_column < row_id if descending else id_column > row_id]
+    if descending:
+        if value is None:
+            return [and_(column.is_(None), id_column < row_id)]
+        return [tuple_(column, id_column) < tuple_(value, row_id), column.is_(None)]
+    if value is None:
+        return [and_(column.is_(None), id_column > row_id), column.is_not(None)]
+    return [tuple_(column, id_column) > tuple_(value, row_id)]
+
+def select_columns(model: type[SQLModel], fields: Optional[str], sort_column) -> List:
+    """The columns named in the comma separated `fields` (all when empty), plus id and the sort column."""
+    table_columns = model.__table__.columns
+    if not fields:
+        names = [column.name for column in table_columns]
+    else:
+        names = [name.strip() for name in fields.split(',') if name.strip()]
+        unknown = [name for name in names if name not in table_columns]
+        if unknown:
+            raise PaginationError(f"Unknown fields: {', '.join(unknown)}")
+    for required in ('id', sort_column.name):
+        if required not in names:
+            names.append(required)
+    return [table_columns[name] for name in names]
+
+async def paginate(
+    session: AsyncSession,
+    query,
+    model: type[SQLModel],
+    sortable: Sequence[str],
+    sort: Optional[str] = None,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    with_total: bool = False,
+) -> Dict[str, Any]:
+    """
+    Run the filtered `query` (a select of `model`) one page at a time.
+
+    `sort` is one of `sortable`, optionally prefixed with "-" for descending.
+    Returns {"items", "next_cursor", "total"}; items only hold the requested
+    fields, and total is None unless `with_total` is set because counting
+    costs a pass over every matching row.
+    """
+    sort = sort or sortable[0]
+    descending = sort.startswith('-')
+    sort_name = sort.lstrip('-')
+    if sort_name not in sortable:
+        raise PaginationError(f"Cannot sort by {sort_name}; choose one of {', '.join(sortable)}")
+    sort_column = model.__table__.columns[sort_name]
+    id_column = model.__table__.columns['id']
+    limit = min(limit or DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE)
+
+    columns = select_columns(model, fields, sort_column)
+    # The sort column is only selected to build the cursor; id is always returned
+    requested = {name.strip() for name in fields.split(',')} | {'id'} if fields else None
+
+    total = None
+    if with_total:
+        total = (await session.exec(query.with_only_columns(func.count(id_column)).order_by(None))).one()
+
+    # A fresh select() keeps rows as rows; query.with_only_columns() would still be unpacked to scalars
+    page_query = select(*columns)
+    if query.whereclause is not None:
+        page_query = page_query.where(query.whereclause)
+    segments = [None]
+    if cursor:
+        position = decode_cursor(cursor, sort, sort_column)
+        segments = _after_cursor(sort_column, id_column, position["value"], position["id"], descending)
+    order = [sort_column.desc(), id_column.desc()] if descending else [sort_column, id_column]
+    if sort_column is id_column:
+        order = order[:1]
+    rows = []
+    for condition in segments:
+        segment_query = page_query if condition is None else page_query.where(condition)
+        rows += (await session.exec(segment_query.order_by(*order).limit(limit + 1 - len(rows)))).all()
+        if len(rows) > limit:
+            break
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]._mapping
+        next_cursor = encode_cursor(sort, last[sort_name], last['id'])
+
+    items = []
+    for row in rows:
+        item = dict(row._mapping)
+        if requested is not None:
+            item = {key: value for key, value in item.items() if key in requested}
+        items.append(item)
+    return {"items": items, "next_cursor": next_cursor, "total": total}
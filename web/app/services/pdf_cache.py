@@ -0,0 +1,134 @@
+"""
+Content-addressed on-disk cache for rendered worksheet PDFs.
+
+A worksheet is fully determined by its parameters, its seed and the
+generator version, so the hash of that tuple names the file. The wrong
+question previews (services/previews.py) use the same cache with their own
+directory and file suffix, keyed by the hash of the file they show. The cache
+keeps an LRU index in memory (rebuilt from file mtimes on startup) and
+evicts the least recently used files once the total size goes over budget.
+"""
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+import hashlib
+import json
+import os
+import threading
+import time
+
+PARTIAL_MAX_AGE = 3600  # seconds before sweep_partial() treats a .part file as left by a crashed write
+
+class PdfCache:
+    def __init__(self, directory: str, max_bytes: int, suffix: str = '.pdf'):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.suffix = suffix
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, int]" = OrderedDict()  # key -> size in bytes
+        self._total_bytes = 0
+        self._key_locks: Dict[str, List] = {}  # key -> [lock, number of threads holding or waiting for it]
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+
+    @staticmethod
+    def make_key(params: Dict[str, Any], seed: int, version: str) -> str:
+        payload = json.dumps({'params': params, 'seed': seed, 'version': version}, sort_keys=True)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def path_for(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}{self.suffix}")
+
+    def _load(self):
+        """Rebuild the LRU index from the files already on disk, oldest first."""
+        files = []
+        for filename in os.listdir(self.directory):
+            if not filename.endswith(self.suffix):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.directory, filename))
+            except OSError:
+                continue
+            files.append((stat.st_mtime, filename[:-len(self.suffix)], stat.st_size))
+        for _, key, size in sorted(files):
+            self._entries[key] = size
+            self._total_bytes += size
+
+    @contextmanager
+    def key_lock(self, key: str) -> Iterator[None]:
+        """Per-key lock so concurrent requests for one worksheet render it only once."""
+        with self._lock:
+            entry = self._key_locks.get(key)
+            if entry is None:
+                entry = self._key_locks[key] = [threading.Lock(), 0]
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            # Dropped only once nobody holds or waits for it, so no second lock is made for the key meanwhile
+            with self._lock:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self._key_locks[key]
+
+    def get(self, key: str) -> Optional[str]:
+        path = self.path_for(key)
+        with self._lock:
+            if key not in self._entries:
+                return None
+            if not os.path.exists(path):
+                self._total_bytes -= self._entries.pop(key)
+                return None
+            self._entries.move_to_end(key)
+        try:
+            # Keep the recency on disk too, so the order survives a restart
+            os.utime(path)
+        except OSError:
+            pass
+        return path
+
+    def put(self, key: str, data: bytes) -> str:
+        path = self.path_for(key)
+        tmp_path = f"{path}.{threading.get_ident()}.part"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._total_bytes -= self._entries.pop(key, 0)
+            self._entries[key] = len(data)
+            self._total_bytes += len(data)
+        self.evict()
+        return path
+
+    def evict(self) -> int:
+        """Remove least recently used files until the cache fits its budget. Returns the number removed."""
+        removed = []
+        with self._lock:
+            while self._entries and self._total_bytes > self.max_bytes:
+                key, size = self._entries.popitem(last=False)
+                self._total_bytes -= size
+                removed.append(key)
+        for key in removed:
+            try:
+                os.remove(self.path_for(key))
+            except OSError as e:
+                print(f"Error deleting cached file {key}{self.suffix}: {e}")
+        return len(removed)
+
+    def sweep_partial(self, max_age: float = PARTIAL_MAX_AGE) -> int:
+        """Delete .part files older than `max_age` seconds, left behind by writes that died. Returns the number removed."""
+        cutoff = time.time() - max_age
+        removed = 0
+        for entry in os.scandir(self.directory):
+            try:
+                if entry.name.endswith('.part') and entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+                    removed += 1
+            except OSError:
+                pass
+        return removed
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._total_bytes, "max_bytes": self.max_bytes}
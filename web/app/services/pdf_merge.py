@@ -0,0 +1,285 @@
+"""
+Merge pipeline for wrong-question books.
+
+- Each source file is opened once per book, however often it is used.
+- The first page of every source is scaled to A4 once and kept in an LRU
+  cache keyed on (path, mtime, size), so the same scan is not re-parsed and
+  re-scaled for every book it appears in.
+- Large books normalize their uncached pages on a process pool; the workers
+  send back one-page A4 PDFs and the pages are assembled in request order.
+- The merged document is written straight into the response in chunks
+  instead of going through a temporary file.
+"""
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+import io
+import multiprocessing
+import os
+import queue
+import threading
+
+from pypdf import PdfReader, PdfWriter, PageObject
+
+from app.services.metrics import PDF_SECONDS
+
+A4_WIDTH = 595
+A4_HEIGHT = 842
+
+PAGE_CACHE_MAX_BYTES = int(os.environ.get('LMS_PAGE_CACHE_BYTES', 256 * 1024 * 1024))
+STREAM_CHUNK_SIZE = 64 * 1024
+MERGE_WORKERS = int(os.environ.get('LMS_MERGE_WORKERS', os.cpu_count() or 1))
+PARALLEL_MIN_PAGES = int(os.environ.get('LMS_MERGE_PARALLEL_MIN', 32))  # below this the pool costs more than it saves
+
+class _CachedPage:
+    __slots__ = ('page', 'size', 'lock')
+
+    def __init__(self, page: PageObject, size: int):
+        self.page = page
+        self.size = size
+        # The page reads lazily from its reader, which is not safe to share between threads
+        self.lock = threading.Lock()
+
+class PageCache:
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Tuple[str, int, int], _CachedPage]" = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key_for(path: str) -> Tuple[str, int, int]:
+        stat = os.stat(path)
+        return (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+
+    def lookup(self, key: Tuple[str, int, int]) -> Optional[_CachedPage]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def add(self, key: Tuple[str, int, int], page: PageObject) -> _CachedPage:
+        entry = _CachedPage(page, key[2])
+        with self._lock:
+            if key in self._entries:
+                return self._entries[key]
+            self._entries[key] = entry
+            self._total_bytes += entry.size
+            while self._entries and self._total_bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._total_bytes -= evicted.size
+        return entry
+
+    def get(self, path: str) -> _CachedPage:
+        key = self.key_for(path)
+        entry = self.lookup(key)
+        if entry is None:
+            page = PdfReader(path).pages[0]
+            page.scale_to(A4_WIDTH, A4_HEIGHT)
+            entry = self.add(key, page)
+        return entry
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._total_bytes = 0
+
+page_cache = PageCache(PAGE_CACHE_MAX_BYTES)
+
+# --- Parallel normalization ---
+def normalize_page(path: str) -> bytes:
+    """Worker side: the first page of `path` scaled to A4, as a standalone one-page PDF."""
+    page = PdfReader(path).pages[0]
+    page.scale_to(A4_WIDTH, A4_HEIGHT)
+    writer = PdfWriter()
+    writer.add_page(page)
+    buffer = io.BytesIO()
+    writer.write(buffer)
+    return buffer.getvalue()
+
+def _normalize_safely(path: str) -> Tuple[Optional[bytes], Optional[str]]:
+    try:
+        return normalize_page(path), None
+    except Exception as e:
+        return None, str(e) or e.__class__.__name__
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+def _get_pool(workers: int) -> ProcessPoolExecutor:
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is not None and _pool_workers != workers:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+            _pool_workers = workers
+        return _pool
+
+def shutdown_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+def _normalize_in_pool(paths: List[str], workers: int, opened: Dict[str, Tuple[Optional[_CachedPage], Optional[str]]], done: Callable[[], None]):
+    chunksize = max(1, len(paths) // (workers * 4))
+    # map() yields in submission order, which is what keeps the book in request order
+    for path, (data, error) in zip(paths, _get_pool(workers).map(_normalize_safely, paths, chunksize=chunksize)):
+        if error is None:
+            try:
+                opened[path] = (page_cache.add(page_cache.key_for(path), PdfReader(io.BytesIO(data)).pages[0]), None)
+            except Exception as e:
+                opened[path] = (None, str(e) or e.__class__.__name__)
+        else:
+            opened[path] = (None, error)
+        done()
+
+@PDF_SECONDS.time(operation='merge')
+def merge_first_pages(
+    sources: List[Tuple[str, str]],
+    progress: Optional[Callable[[float], None]] = None,
+    workers: Optional[int] = None,
+) -> Tuple[PdfWriter, List[Dict[str, str]]]:
+    """
+    Build a writer holding the A4-normalized first page of every (kind, path) source, in order.
+
+    Sources that cannot be read are skipped and listed in the returned error report as
+    {"kind", "path", "error"} dicts. When `workers` (default LMS_MERGE_WORKERS) is above one
+    and enough pages are missing from the cache, they are normalized on the process pool.
+    """
+    workers = MERGE_WORKERS if workers is None else workers
+    total = len(sources) * 2  # one step to normalize a source, one to add it
+    steps = 0
+
+    def step():
+        nonlocal steps
+        steps += 1
+        if progress:
+            progress(steps / total)
+
+    # path -> (cached page, error); each file is only opened once however often it is used
+    opened: Dict[str, Tuple[Optional[_CachedPage], Optional[str]]] = {}
+    missing = []
+    for kind, path in sources:
+        if path in opened:
+            step()
+            continue
+        try:
+            entry = page_cache.lookup(page_cache.key_for(path))
+        except FileNotFoundError:
+            opened[path] = (None, "File not found")  # The message would show the server path
+            step()
+            continue
+        except OSError as e:
+            opened[path] = (None, str(e))
+            step()
+            continue
+        if entry is None:
+            missing.append(path)
+            opened[path] = (None, None)
+        else:
+            opened[path] = (entry, None)
+            step()
+
+    if workers > 1 and len(missing) >= PARALLEL_MIN_PAGES:
+        try:
+            _normalize_in_pool(missing, workers, opened, step)
+        except BrokenProcessPool as e:
+            print(f"Merge worker pool failed, normalizing the rest serially: {e}")
+            shutdown_pool()
+        missing = [path for path in missing if opened[path] == (None, None)]
+    for path in missing:
+        try:
+            opened[path] = (page_cache.get(path), None)
+        except Exception as e:
+            opened[path] = (None, str(e) or e.__class__.__name__)
+        step()
+
+    output_pdf = PdfWriter()
+    errors = []
+    for kind, path in sources:
+        entry, error = opened[path]
+        if entry is not None:
+            try:
+                with entry.lock:
+                    output_pdf.add_page(entry.page)
+            except Exception as e:
+                error = str(e) or e.__class__.__name__
+        if error is not None:
+            print(f"Error processing {kind} file {path}: {error}")
+            errors.append({"kind": kind, "path": path, "error": error})
+        step()
+    return output_pdf, errors
+
+class _ChunkSink:
+    """File-like object that hands what pypdf writes to a queue in fixed-size chunks."""
+    def __init__(self, chunks: "queue.Queue", stopped: threading.Event):
+        self._chunks = chunks
+        self._stopped = stopped
+        self._buffer = bytearray()
+        self._position = 0
+
+    def _put(self, item):
+        while not self._stopped.is_set():
+            try:
+                self._chunks.put(item, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+        raise BrokenPipeError("Client went away")
+
+    def write(self, data) -> int:
+        self._buffer += data
+        self._position += len(data)
+        if len(self._buffer) >= STREAM_CHUNK_SIZE:
+            self._put(bytes(self._buffer))
+            self._buffer.clear()
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self):
+        if self._buffer:
+            self._put(bytes(self._buffer))
+            self._buffer.clear()
+
+_DONE = object()
+
+def stream_pdf(writer: PdfWriter) -> Iterator[bytes]:
+    """Serialize the writer on a background thread and yield the output as it is produced."""
+    chunks: "queue.Queue" = queue.Queue(maxsize=16)
+    stopped = threading.Event()
+    sink = _ChunkSink(chunks, stopped)
+
+    def produce():
+        try:
+            writer.write(sink)
+            sink._put(_DONE)
+        except BrokenPipeError:
+            pass
+        except Exception as e:
+            try:
+                sink._put(e)
+            except BrokenPipeError:
+                pass
+
+    thread = threading.Thread(target=produce, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = chunks.get()
+            if item is _DONE:
+                break
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        stopped.set()
+        thread.join(timeout=5)
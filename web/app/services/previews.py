@@ -0,0 +1,153 @@
+"""
+Thumbnails of wrong question files for the list view.
+
+The first page of a PDF, or the image itself, is rendered once at each of
+PREVIEW_SIZES (longest side, in pixels) and written to an LRU disk cache
+keyed by the SHA-256 of the file, so a file shared by several questions is
+rendered once and a preview never goes stale. Blob store files carry their
+hash in their name; older files are hashed once and remembered by path,
+size and mtime.
+
+Rendering starts on a small thread pool as soon as a question is created;
+a request that arrives first renders, or waits for, the same work under the
+cache's per-key lock. PDFs are rasterized with pypdfium2 when it is
+installed. Without it, the preview is the largest image embedded in the
+first page, which for a scanned page is the scan itself.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional, Set, Tuple
+import hashlib
+import io
+import os
+import re
+import threading
+
+from PIL import Image, ImageOps, features
+from pypdf import PdfReader
+
+from app.services.metrics import PDF_SECONDS
+from app.services.pdf_cache import PdfCache
+
+try:
+    import pypdfium2
+except ImportError:  # Optional, see above
+    pypdfium2 = None
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+PREVIEW_DIR = os.path.join(BASE_DIR, '..', 'tmp', 'previews')
+PREVIEW_CACHE_MAX_BYTES = int(os.environ.get('LMS_PREVIEW_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+PREVIEW_WORKERS = int(os.environ.get('LMS_PREVIEW_WORKERS', 2))
+CHUNK_SIZE = 1024 * 1024  # bytes hashed at a time
+
+PREVIEW_SIZES = (160, 320, 640)
+DEFAULT_PREVIEW_SIZE = 320
+PREVIEW_FORMAT, PREVIEW_SUFFIX, PREVIEW_MEDIA_TYPE = (
+    ('WEBP', '.webp', 'image/webp') if features.check('webp') else ('PNG', '.png', 'image/png')
+)
+
+_BLOB_NAME = re.compile(r'^([0-9a-f]{64})(\.[a-z0-9]+)?$')
+
+preview_cache = PdfCache(PREVIEW_DIR, PREVIEW_CACHE_MAX_BYTES, suffix=PREVIEW_SUFFIX)
+_executor = ThreadPoolExecutor(max_workers=PREVIEW_WORKERS, thread_name_prefix='preview')
+_lock = threading.Lock()
+_file_digests: Dict[Tuple[str, int, float], str] = {}
+_unsupported: Set[str] = set()  # digests of files nothing could be rendered from
+
+def content_digest(path: str) -> str:
+    """SHA-256 of the file at `path`, free for blob store files."""
+    match = _BLOB_NAME.match(os.path.basename(path))
+    if match:
+        return match.group(1)
+    stat = os.stat(path)
+    key = (path, stat.st_size, stat.st_mtime)
+    with _lock:
+        digest = _file_digests.get(key)
+    if digest is None:
+        sha256 = hashlib.sha256()
+        with open(path, 'rb') as f:
+            while chunk := f.read(CHUNK_SIZE):
+                sha256.update(chunk)
+        digest = sha256.hexdigest()
+        with _lock:
+            _file_digests[key] = digest
+    return digest
+
+def _first_page(path: str, max_size: int) -> Optional[Image.Image]:
+    with open(path, 'rb') as f:
+        is_pdf = f.read(5) == b'%PDF-'
+    if not is_pdf:
+        image = Image.open(path)
+        image.draft('RGB', (max_size, max_size))  # JPEG decodes straight to a smaller scale
+        return ImageOps.exif_transpose(image)
+    if pypdfium2 is not None:
+        document = pypdfium2.PdfDocument(path)
+        try:
+            page = document[0]
+            scale = max_size / max(page.get_size())
+            return page.render(scale=scale).to_pil()
+        finally:
+            document.close()
+    images = PdfReader(path).pages[0].images
+    if not images:
+        return None
+    return max(images, key=lambda i: len(i.data)).image
+
+@PDF_SECONDS.time(operation='preview')
+def render(path: str) -> Optional[Dict[int, bytes]]:
+    """Encoded thumbnails of the first page of `path` by size, or None if nothing can be rendered from it."""
+    image = _first_page(path, max(PREVIEW_SIZES))
+    if image is None:
+        return None
+    if image.mode not in ('RGB', 'RGBA', 'L'):
+        image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+    thumbnails = {}
+    for size in sorted(PREVIEW_SIZES, reverse=True):
+        # Each size is scaled from the next larger one, which is cheaper and looks the same
+        image = image.copy()
+        image.thumbnail((size, size), Image.LANCZOS)
+        buffer = io.BytesIO()
+        if PREVIEW_FORMAT == 'WEBP':
+            image.save(buffer, PREVIEW_FORMAT, quality=80, method=4)
+        else:
+            image.save(buffer, PREVIEW_FORMAT, optimize=True)
+        thumbnails[size] = buffer.getvalue()
+    return thumbnails
+
+def get_preview(path: str, size: int, digest: Optional[str] = None) -> Optional[str]:
+    """Path of the cached thumbnail of `path` at `size`, rendering it first if needed. None if it has no preview."""
+    digest = digest or content_digest(path)
+    key = f"{digest}-{size}"
+    cached = preview_cache.get(key)
+    if cached or digest in _unsupported:
+        return cached
+    with preview_cache.key_lock(digest):
+        cached = preview_cache.get(key)  # Rendered while this thread waited for the lock
+        if cached or digest in _unsupported:
+            return cached
+        try:
+            thumbnails = render(path)
+        except Exception as e:
+            print(f"Failed to render a preview of {path}: {e}")
+            thumbnails = None
+        if thumbnails is None:
+            with _lock:
+                _unsupported.add(digest)
+            return None
+        for thumbnail_size, data in thumbnails.items():
+            preview_cache.put(f"{digest}-{thumbnail_size}", data)
+    return preview_cache.get(key)
+
+def _warm(path: str):
+    try:
+        get_preview(path, DEFAULT_PREVIEW_SIZE)
+    except Exception as e:
+        print(f"Failed to prepare a preview of {path}: {e}")
+
+def schedule(*paths: Optional[str]):
+    """Render the previews of new files in the background."""
+    for path in paths:
+        if path:
+            _executor.submit(_warm, path)
+
+def shutdown():
+    _executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,195 @@
+"""
+Batch arithmetic problem generator.
+
+Whole batches of problems are drawn as NumPy operand/operator matrices.
+Every operator and operand is sampled only from the choices that the
+precomputed ProblemIndex marks as able to finish the chain, so no problem
+is ever thrown away half built. Rows are only dropped to honour the cap on
+repeated-operator problems, and the batch is topped up until enough
+problems have been collected.
+"""
+from typing import List, Optional, Tuple
+import numpy as np
+
+from app.services.problem_index import (
+    ADD, SUB, MUL, DIV, OP_MAP, MAX_NUMBER_LIMIT, MAX_OPERANDS, SINGLE_DIGITS,
+    ProblemIndex, get_problem_index, range_count,
+)
+
+MIN_BATCH_SIZE = 64
+MAX_ROUNDS = 50
+
+def _choose_column(rng: np.random.Generator, mask: np.ndarray) -> np.ndarray:
+    """Pick a random allowed column per row."""
+    keys = rng.random(mask.shape)
+    keys[~mask] = -1.0
+    return keys.argmax(axis=1)
+
+def _sample_in_range(rng: np.random.Generator, counts: np.ndarray, low: np.ndarray, high: np.ndarray) -> np.ndarray:
+    """Pick a random reachable value in [low, high] per row. Rows without one get garbage."""
+    available = range_count(counts, low, high)
+    offset = (rng.random(available.shape) * available).astype(np.int64)
+    rank = counts[np.clip(low, 0, len(counts) - 1)] + offset
+    return np.searchsorted(counts, rank + 1, side='left') - 1
+
+def _draw_chains(rng: np.random.Generator, index: ProblemIndex, op_set: Tuple[int, ...], batch: int, num_ops: int):
+    """Draw `batch` problems whose operators all come from op_set."""
+    _, counts = index.reachable(op_set, num_ops)
+    current = _sample_in_range(rng, counts, np.full(batch, index.min_number), np.full(batch, index.max_number))
+
+    ops = np.zeros((batch, num_ops), dtype=np.int64)
+    nums = np.zeros((batch, num_ops + 1), dtype=np.int64)
+    nums[:, 0] = current
+    rows = np.arange(batch)
+    op_codes = np.array(op_set)
+
+    for i in range(num_ops):
+        table, counts = index.reachable(op_set, num_ops - i - 1)
+        feasible = np.zeros((batch, len(op_set)), dtype=bool)
+        operands = np.zeros((batch, len(op_set)), dtype=np.int64)
+        results = np.zeros((batch, len(op_set)), dtype=np.int64)
+
+        for j, op in enumerate(op_set):
+            if op in (ADD, SUB):
+                low, high = index.result_range(op, current)
+                feasible[:, j] = range_count(counts, low, high) > 0
+                results[:, j] = _sample_in_range(rng, counts, low, high)
+                operands[:, j] = results[:, j] - current if op == ADD else current - results[:, j]
+            else:
+                mask = index.digit_mask(op, current, table)
+                feasible[:, j] = mask.any(axis=1)
+                digits = SINGLE_DIGITS[_choose_column(rng, mask)]
+                operands[:, j] = digits
+                results[:, j] = current * digits if op == MUL else current // np.maximum(digits, 1)
+
+        choice = _choose_column(rng, feasible)
+        ops[:, i] = op_codes[choice]
+        nums[:, i + 1] = operands[rows, choice]
+        current = results[rows, choice]
+
+    return ops, nums, current
+
+def _draw_batch(rng, index: ProblemIndex, batch: int, num_ops: int, op_mode: str, start_ops: Tuple[int, ...]):
+    if op_mode == 'mixed':
+        return _draw_chains(rng, index, index.allowed_ops, batch, num_ops)
+
+    # Sequential mode: one operator per problem, picked among those that can form a chain
+    ops = np.zeros((batch, num_ops), dtype=np.int64)
+    nums = np.zeros((batch, num_ops + 1), dtype=np.int64)
+    results = np.zeros(batch, dtype=np.int64)
+    row_ops = rng.choice(start_ops, size=batch)
+    for op in start_ops:
+        rows = np.flatnonzero(row_ops == op)
+        if len(rows):
+            ops[rows], nums[rows], results[rows] = _draw_chains(rng, index, (op,), len(rows), num_ops)
+    return ops, nums, results
+
+def _format_simple(ops_row, nums_row) -> str:
+    problem_str = str(nums_row[0])
+    for i, op in enumerate(ops_row):
+        if op == DIV:
+            problem_str += f" ÷ {nums_row[i+1]}"
+        elif op == MUL:
+            problem_str += f" × {nums_row[i+1]}"
+        else:
+            problem_str += f" {'+' if op == ADD else '-'} {nums_row[i+1]}"
+    return f"{problem_str} = "
+
+def _format_missing(ops_row, nums_row, result, missing_pos) -> str:
+    problem_str = ""
+    for i in range(len(nums_row)):
+        if i == missing_pos:
+            problem_str += "▢"
+        else:
+            problem_str += str(nums_row[i])
+
+        if i < len(ops_row):
+            if ops_row[i] == DIV:
+                problem_str += "÷"
+            elif ops_row[i] == MUL:
+                problem_str += "×"
+            else:
+                problem_str += f" {'+' if ops_row[i] == ADD else '-'} "
+    return f"{problem_str} = {result}"
+
+def generate_problems(
+    problem_type: str,
+    max_number: int,
+    min_number: int,
+    num_operands: int,
+    operators: str,
+    num_problems: int,
+    op_mode: str,
+    rng: Optional[np.random.Generator] = None,
+) -> List[str]:
+    """
+    Generate num_problems arithmetic problems.
+
+    Rules:
+    - intermediate values never go negative and never exceed max_number
+    - multipliers and divisors are single digits (2-9) and divisions are exact
+    - in mixed mode at most 10% of the problems use one repeated operator
+
+    Raises ValueError when the settings cannot produce any problem.
+    """
+    if problem_type not in ('simple_calculation', 'find_missing_number'):
+        raise ValueError(f"Unknown problem type: {problem_type}")
+    if problem_type == 'simple_calculation' and num_operands < 2:
+        raise ValueError("A simple calculation needs at least two operands")
+    if not 1 <= num_operands <= MAX_OPERANDS:
+        raise ValueError(f"The number of operands must be between 1 and {MAX_OPERANDS}")
+    if not 0 <= min_number <= max_number <= MAX_NUMBER_LIMIT:
+        raise ValueError(f"Numbers must satisfy 0 <= min_number <= max_number <= {MAX_NUMBER_LIMIT}")
+    if num_problems <= 0:
+        return []
+
+    if operators not in OP_MAP:
+        operators = 'add_subtract'
+    op_mode = 'mixed' if op_mode == 'mixed' else 'sequential'
+    index = get_problem_index(min_number, max_number, operators, op_mode)
+    num_ops = num_operands - 1
+
+    # Reject impossible settings up front instead of searching forever
+    if op_mode == 'mixed':
+        start_ops = index.allowed_ops
+        feasible = index.start_count(index.allowed_ops, num_ops) > 0
+    else:
+        start_ops = tuple(op for op in index.allowed_ops if index.start_count((op,), num_ops) > 0)
+        feasible = bool(start_ops)
+    if not feasible:
+        raise ValueError(
+            f"No valid problem with {num_operands} operands exists for numbers between {min_number} and {max_number}"
+        )
+
+    rng = rng or np.random.default_rng()
+    caps_sequential = op_mode == 'mixed' and num_ops > 1
+    sequential_left = num_problems // 10  # 10% limit
+
+    problems = []
+    kept_ratio = 1.0
+    for _ in range(MAX_ROUNDS):
+        needed = num_problems - len(problems)
+        if needed <= 0:
+            break
+        batch = max(MIN_BATCH_SIZE, int(needed / kept_ratio * 1.2)) if caps_sequential else needed
+        ops, nums, results = _draw_batch(rng, index, batch, num_ops, op_mode, start_ops)
+
+        keep = np.ones(batch, dtype=bool)
+        if caps_sequential:
+            sequential = (ops == ops[:, :1]).all(axis=1)
+            keep[np.flatnonzero(sequential)[sequential_left:]] = False
+            kept_ratio = max(keep.mean(), 1.0 / batch)
+
+        rows = np.flatnonzero(keep)[:needed]
+        if caps_sequential:
+            sequential_left -= int(sequential[rows].sum())
+
+        if problem_type == 'simple_calculation':
+            problems.extend(_format_simple(ops[r], nums[r]) for r in rows)
+        else:
+            missing_pos = rng.integers(0, num_operands, size=batch)
+            problems.extend(_format_missing(ops[r], nums[r], results[r], missing_pos[r]) for r in rows)
+
+    if len(problems) < num_problems:
+        raise ValueError("These settings only allow problems that repeat one operator; use sequential mode instead")
+    return problems
@@ -0,0 +1,101 @@
+"""
+Precomputed lookup tables for the problem generator.
+
+For a given (min_number, max_number, mode) the index holds:
+- a divisor table: which single digits divide each value 0..max_number
+- a multiplier table: which single digits keep each value within max_number
+- reachability tables: which running values can still finish a valid chain
+  of k remaining operators drawn from a given operator set
+
+With these the generator only ever samples operands that lead somewhere,
+so it never has to throw a problem away and start again.
+"""
+from functools import lru_cache
+from typing import Dict, Tuple
+import numpy as np
+
+# Operator codes used in the operator matrix
+ADD, SUB, MUL, DIV = 0, 1, 2, 3
+
+OP_MAP = {
+    'add_subtract': (ADD, SUB),
+    'multiply_divide': (MUL, DIV),
+    'all': (ADD, SUB, MUL, DIV),
+}
+
+SINGLE_DIGIT_MIN = 2
+SINGLE_DIGIT_MAX = 9
+SINGLE_DIGITS = np.arange(SINGLE_DIGIT_MIN, SINGLE_DIGIT_MAX + 1)
+
+# Bounds that keep the tables small enough to memoize
+MAX_NUMBER_LIMIT = 100_000
+MAX_OPERANDS = 10
+
+def range_count(counts: np.ndarray, low: np.ndarray, high: np.ndarray) -> np.ndarray:
+    """Number of reachable values in [low, high] given a prefix count table."""
+    last = len(counts) - 1
+    low_idx = np.clip(low, 0, last)
+    high_idx = np.clip(high + 1, 0, last)
+    return np.where(high >= low, counts[high_idx] - counts[low_idx], 0)
+
+class ProblemIndex:
+    def __init__(self, min_number: int, max_number: int, operators: str, op_mode: str):
+        self.min_number = min_number
+        self.max_number = max_number
+        self.allowed_ops = OP_MAP.get(operators, OP_MAP['add_subtract'])
+        # In mixed add/subtract mode a '-' may not bring the running value down to zero
+        self.sub_floor = 1 if (op_mode == 'mixed' and operators == 'add_subtract') else 0
+
+        values = np.arange(max_number + 1)
+        self.values = values
+        self.divisor_table = (values[:, None] % SINGLE_DIGITS == 0) & (values[:, None] > 0)
+        self.multiplier_table = values[:, None] * SINGLE_DIGITS <= max_number
+        self._tables: Dict[Tuple[Tuple[int, ...], int], Tuple[np.ndarray, np.ndarray]] = {}
+
+    # --- Single operator transitions ---
+    def result_range(self, op: int, values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Range of running values a '+' or '-' can lead to."""
+        if op == ADD:
+            return values + self.min_number, np.full_like(values, self.max_number)
+        return np.full_like(values, self.sub_floor), values - self.min_number
+
+    def digit_mask(self, op: int, values: np.ndarray, table: np.ndarray) -> np.ndarray:
+        """Single digits a '*' or '/' may use so that the result is still reachable."""
+        if op == MUL:
+            results = np.minimum(values[:, None] * SINGLE_DIGITS, self.max_number)
+            return self.multiplier_table[values] & table[results]
+        return self.divisor_table[values] & table[values[:, None] // SINGLE_DIGITS]
+
+    def can_apply(self, op: int, values: np.ndarray, table: np.ndarray, counts: np.ndarray) -> np.ndarray:
+        if op in (ADD, SUB):
+            low, high = self.result_range(op, values)
+            return range_count(counts, low, high) > 0
+        return self.digit_mask(op, values, table).any(axis=1)
+
+    # --- Chains ---
+    def reachable(self, ops: Tuple[int, ...], remaining: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Values from which `remaining` more operators from `ops` can still be applied.
+        Returns the boolean table and its prefix counts (counts[i] = reachable values below i).
+        """
+        key = (ops, remaining)
+        if key not in self._tables:
+            if remaining == 0:
+                table = np.ones(self.max_number + 1, dtype=bool)
+            else:
+                next_table, next_counts = self.reachable(ops, remaining - 1)
+                table = np.zeros(self.max_number + 1, dtype=bool)
+                for op in ops:
+                    table |= self.can_apply(op, self.values, next_table, next_counts)
+            counts = np.concatenate(([0], np.cumsum(table, dtype=np.int32)))
+            self._tables[key] = (table, counts)
+        return self._tables[key]
+
+    def start_count(self, ops: Tuple[int, ...], num_ops: int) -> int:
+        """How many first operands can start a valid chain."""
+        _, counts = self.reachable(ops, num_ops)
+        return int(range_count(counts, np.array(self.min_number), np.array(self.max_number)))
+
+@lru_cache(maxsize=16)
+def get_problem_index(min_number: int, max_number: int, operators: str, op_mode: str) -> ProblemIndex:
+    return ProblemIndex(min_number, max_number, operators, op_mode)
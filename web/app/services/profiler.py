@@ -0,0 +1,213 @@
+"""
+On-demand sampling profiles of single requests.
+
+Profiling is off unless LMS_PROFILE_TOKEN is set. A request carrying that
+token in the X-LMS-Profile header or the lms_profile query parameter then
+runs with a sampler thread that records the Python stack of every busy
+thread each LMS_PROFILE_INTERVAL_MS, so the event loop and the threadpool
+worker running a sync endpoint are both seen. Idle threads (waiting on a
+lock, a queue or the event loop's select) are left out. Stacks are stored
+in PROFILE_DIR in the collapsed format of flamegraph.pl, which speedscope
+also opens, and the response says where with an X-Profile-Id header; GET
+/profiles/{id} with the same token returns the file.
+
+Only one request is profiled at a time, and never more than
+LMS_PROFILE_FRACTION of the requests the server has seen, so the first
+profile needs 1 / LMS_PROFILE_FRACTION requests since startup; a request
+over the limit runs unprofiled with X-Profile-Skipped.
+Other requests running at the same moment show up in the samples too, and
+work done in the job and merge worker processes does not.
+"""
+from collections import Counter
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs
+import hmac
+import os
+import sys
+import threading
+import time
+import uuid
+
+import anyio
+from fastapi.concurrency import run_in_threadpool
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_ROOT = os.path.dirname(os.path.dirname(BASE_DIR))
+PROFILE_DIR = os.path.join(BASE_DIR, '..', 'tmp', 'profiles')
+
+PROFILE_TOKEN = os.environ.get('LMS_PROFILE_TOKEN', '')
+PROFILE_FRACTION = float(os.environ.get('LMS_PROFILE_FRACTION', 0.01))
+SAMPLE_INTERVAL = float(os.environ.get('LMS_PROFILE_INTERVAL_MS', 5)) / 1000
+MAX_PROFILE_SECONDS = 120  # the sampler stops on its own after this
+MAX_PROFILES = 50  # older profiles are deleted as new ones are stored
+
+HEADER = 'x-lms-profile'
+QUERY = 'lms_profile'
+PROFILE_ROUTE = '/profiles/'
+
+# Innermost Python frames of a thread that is waiting, by (file as _where() shows it, function).
+# Worker loops are there because they block in C, on a SimpleQueue.
+IDLE_FRAMES = {
+    ('threading.py', 'wait'),
+    ('threading.py', '_wait_for_tstate_lock'),
+    ('selectors.py', 'select'),
+    ('queue.py', 'get'),
+    ('thread.py', '_worker'),
+    ('aiosqlite/core.py', '_connection_worker_thread'),
+}
+
+def authorized(token: Optional[str]) -> bool:
+    return bool(PROFILE_TOKEN) and token is not None and hmac.compare_digest(token.encode(), PROFILE_TOKEN.encode())
+
+def requested_token(scope: Scope) -> Optional[str]:
+    for name, value in scope.get('headers', ()):
+        if name.lower() == HEADER.encode():
+            return value.decode('latin-1')
+    values = parse_qs(scope.get('query_string', b'').decode('latin-1')).get(QUERY)
+    return values[0] if values else None
+
+def profile_path(profile_id: str) -> Optional[str]:
+    """Where the profile with `profile_id` is stored, or None if that cannot be a profile id."""
+    if len(profile_id) != 32 or any(c not in '0123456789abcdef' for c in profile_id):
+        return None
+    return os.path.join(PROFILE_DIR, f"{profile_id}.folded")
+
+class RateLimit:
+    """One profile at a time, and never more than `fraction` of the requests seen, profiled ones included."""
+
+    def __init__(self, fraction: float):
+        self.fraction = fraction
+        self.requests = 0
+        self.profiled = 0
+        self.active = False
+        self._lock = threading.Lock()
+
+    def seen(self):
+        with self._lock:
+            self.requests += 1
+
+    def acquire(self) -> bool:
+        with self._lock:
+            if self.active or self.profiled + 1 > self.fraction * self.requests:
+                return False
+            self.active = True
+            self.profiled += 1
+            return True
+
+    def release(self):
+        with self._lock:
+            self.active = False
+
+rate_limit = RateLimit(PROFILE_FRACTION)
+
+def _where(filename: str) -> str:
+    if 'site-packages' in filename:
+        return filename.split('site-packages' + os.sep, 1)[-1]
+    if filename.startswith(APP_ROOT):
+        return os.path.relpath(filename, APP_ROOT)
+    return os.path.basename(filename)
+
+class Sampler(threading.Thread):
+    def __init__(self, interval: Optional[float] = None):
+        super().__init__(name='lms-profiler', daemon=True)
+        self.interval = SAMPLE_INTERVAL if interval is None else interval
+        self.samples = 0
+        self.stacks: Counter = Counter()
+        self._labels: Dict[object, str] = {}
+        self._idle: Dict[object, bool] = {}
+        self._done = threading.Event()
+
+    def _label(self, code) -> str:
+        label = self._labels.get(code)
+        if label is None:
+            # Per function rather than per line, so one function is one box in the flame graph
+            label = self._labels[code] = f"{code.co_name} ({_where(code.co_filename)}:{code.co_firstlineno})".replace(';', ',')
+        return label
+
+    def _collapse(self, thread: str, frame) -> Optional[str]:
+        code = frame.f_code
+        idle = self._idle.get(code)
+        if idle is None:
+            idle = self._idle[code] = (_where(code.co_filename), code.co_name) in IDLE_FRAMES
+        if idle:
+            return None
+        labels: List[str] = []
+        while frame is not None:
+            labels.append(self._label(frame.f_code))
+            frame = frame.f_back
+        labels.append(thread)
+        return ';'.join(reversed(labels))
+
+    def run(self):
+        me = threading.get_ident()
+        deadline = time.monotonic() + MAX_PROFILE_SECONDS
+        while not self._done.wait(self.interval) and time.monotonic() < deadline:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = self._collapse(names.get(ident, str(ident)).replace(';', ','), frame)
+                if stack:
+                    self.stacks[stack] += 1
+            self.samples += 1
+
+    def stop(self):
+        self._done.set()
+        self.join()
+
+    def collapsed(self) -> str:
+        return ''.join(f"{stack} {count}\n" for stack, count in sorted(self.stacks.items()))
+
+def store(profile_id: str, sampler: Sampler) -> str:
+    """Stop `sampler` and write what it collected. Blocks, so it runs off the event loop."""
+    sampler.stop()
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    path = profile_path(profile_id)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(sampler.collapsed())
+    stored = sorted((entry for entry in os.scandir(PROFILE_DIR) if entry.name.endswith('.folded')), key=lambda e: e.stat().st_mtime)
+    for entry in stored[:-MAX_PROFILES]:
+        try:
+            os.remove(entry.path)
+        except OSError:
+            pass
+    return path
+
+def _with_header(message: Message, name: str, value: str) -> Message:
+    if message['type'] == 'http.response.start':
+        message['headers'] = list(message.get('headers', ())) + [(name.encode(), value.encode())]
+    return message
+
+class ProfilerMiddleware:
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        rate_limit.seen()
+        if scope['path'].startswith(PROFILE_ROUTE) or not authorized(requested_token(scope)):
+            await self.app(scope, receive, send)
+            return
+        if not rate_limit.acquire():
+            await self.app(scope, receive, lambda message: send(_with_header(message, 'x-profile-skipped', 'rate limited')))
+            return
+
+        profile_id = uuid.uuid4().hex
+        sampler = Sampler()
+        sampler.start()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, lambda message: send(_with_header(message, 'x-profile-id', profile_id)))
+        finally:
+            seconds = time.perf_counter() - started
+            try:
+                # Shielded: a request cancelled by a disconnect still stores its profile
+                with anyio.CancelScope(shield=True):
+                    await run_in_threadpool(store, profile_id, sampler)
+            finally:
+                rate_limit.release()
+            print(f"[profile] {scope['method']} {scope['path']} took {seconds * 1000:.0f}ms, "
+                  f"{sampler.samples} samples stored as {profile_id}")
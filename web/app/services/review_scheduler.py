@@ -0,0 +1,152 @@
+"""
+Event-driven review scheduler.
+
+Completed papers (status '3') become due for review (status '4') once their
+next_review_date passes. Instead of scanning the table on a timer, the
+scheduler keeps a min-heap of upcoming review dates, loaded from
+ix_paper_status_next_review_date at startup and kept current by the paper
+endpoints, and a thread that sleeps until the earliest one. When it wakes it
+flips every due paper with one UPDATE, so the work follows the number of due
+papers rather than the size of the table.
+
+Heap entries are never removed in place: rescheduling a paper pushes a new
+entry and records it in `_due`, and entries that no longer match are skipped
+when they reach the top.
+"""
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+import heapq
+import os
+import threading
+import time
+
+from sqlalchemy import update
+from sqlmodel import Session, select
+from app.db import SQLite_DB
+from app.services import events, metrics
+from app.services.http_cache import table_versions
+
+# Longest the thread sleeps without looking at the heap again, so wall clock jumps
+# (suspend, NTP) delay a review by at most this long. Waking up costs no query.
+MAX_SLEEP = float(os.environ.get('LMS_REVIEW_MAX_SLEEP', 60))
+RETRY_DELAY = 30  # seconds to back off after a failed UPDATE
+
+def _naive(value: datetime) -> datetime:
+    # Aware datetimes are stored without their offset, so compare them the same way
+    return value.replace(tzinfo=None)
+
+class ReviewScheduler:
+    def __init__(self):
+        self._heap: List[Tuple[datetime, int]] = []
+        self._due: Dict[int, datetime] = {}
+        self._wakeup = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+
+    def start(self):
+        self.load()
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name='review-scheduler', daemon=True)
+        self._thread.start()
+
+    def shutdown(self):
+        with self._wakeup:
+            self._stopping = True
+            self._wakeup.notify()
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def load(self) -> int:
+        """Rebuild the heap from the database. Returns the number of upcoming reviews."""
+        with Session(SQLite_DB.engine) as session:
+            rows = session.exec(
+                select(SQLite_DB.Paper.id, SQLite_DB.Paper.next_review_date).where(
+                    SQLite_DB.Paper.status == "3",
+                    SQLite_DB.Paper.next_review_date != None
+                )
+            ).all()
+        with self._wakeup:
+            self._due = {paper_id: _naive(due) for paper_id, due in rows}
+            self._heap = [(due, paper_id) for paper_id, due in self._due.items()]
+            heapq.heapify(self._heap)
+            self._wakeup.notify()
+        return len(rows)
+
+    def schedule(self, paper: SQLite_DB.Paper):
+        """Track a paper that was just written: completed papers wait for their review date, others are dropped."""
+        if paper.status != "3" or paper.next_review_date is None:
+            self.unschedule(paper.id)
+            return
+        due = _naive(paper.next_review_date)
+        with self._wakeup:
+            if self._due.get(paper.id) == due:
+                return
+            self._due[paper.id] = due
+            heapq.heappush(self._heap, (due, paper.id))
+            if self._heap[0] == (due, paper.id):
+                self._wakeup.notify()  # Earlier than what the thread is sleeping towards
+
+    def unschedule(self, paper_id: int):
+        with self._wakeup:
+            self._due.pop(paper_id, None)
+
+    def next_due(self) -> Optional[datetime]:
+        with self._wakeup:
+            return self._peek()
+
+    def pending_count(self) -> int:
+        with self._wakeup:
+            return len(self._due)
+
+    def _peek(self) -> Optional[datetime]:
+        # Caller holds the lock
+        while self._heap:
+            due, paper_id = self._heap[0]
+            if self._due.get(paper_id) == due:
+                return due
+            heapq.heappop(self._heap)
+        return None
+
+    def flip_due(self, now: Optional[datetime] = None) -> int:
+        """Move every completed paper whose review date has passed to '4' (pending review)."""
+        now = now or datetime.now()
+        with SQLite_DB.engine.begin() as conn:
+            flipped = conn.execute(
+                update(SQLite_DB.Paper).where(
+                    SQLite_DB.Paper.status == "3",  # Status '3' means '已完成'
+                    SQLite_DB.Paper.next_review_date <= now
+                ).values(status="4")  # Status '4' means '未复习' (Pending Review)
+                .returning(SQLite_DB.Paper.id, SQLite_DB.Paper.title)
+            ).all()
+        with self._wakeup:
+            while self._heap and self._heap[0][0] <= now:
+                due, paper_id = heapq.heappop(self._heap)
+                if self._due.get(paper_id) == due:
+                    del self._due[paper_id]
+        if flipped:
+            table_versions.bump('paper')
+            print(f"Checked for reviews at {now}. Found {len(flipped)} papers to review.")
+            events.reviews_due([{"id": paper_id, "title": title} for paper_id, title in flipped])
+        return len(flipped)
+
+    def _run(self):
+        while True:
+            with self._wakeup:
+                while not self._stopping:
+                    due = self._peek()
+                    delay = MAX_SLEEP if due is None else (due - datetime.now()).total_seconds()
+                    if delay <= 0:
+                        break
+                    self._wakeup.wait(min(delay, MAX_SLEEP))
+                if self._stopping:
+                    return
+            try:
+                with metrics.SCHEDULER_JOB_SECONDS.time(job='flip_due'):
+                    self.flip_due()
+            except Exception as e:
+                metrics.SCHEDULER_JOB_FAILURES.inc(job='flip_due')
+                print(f"Review scheduler failed to flip due papers: {e}")
+                time.sleep(RETRY_DELAY)
+
+review_scheduler = ReviewScheduler()
@@ -0,0 +1,409 @@
+"""
+Spaced repetition engine for papers and wrong questions.
+
+Three algorithms are available: "ebbinghaus", the fixed ladder of intervals
+the app has always used; "sm2", SuperMemo 2 with a per-item ease factor; and
+"fsrs", FSRS v4.5 with a per-item stability and difficulty. The active one
+and its parameters come from settings.json ("srs_algorithm", "srs_params").
+
+Algorithms work on item state held in numpy arrays, one entry per item. The
+same code reviews a single item and re-plans every item in one pass after
+the settings change. The state arrays are:
+    stage       successful reviews since the item was learned or last forgotten (-1 before it is learned)
+    interval    days from the last review to the next one (NaN: no further review)
+    ease        SM-2 ease factor
+    stability   FSRS stability, in days
+    difficulty  FSRS difficulty, 1 to 10
+NaN marks values an algorithm has not set yet, for example after a switch
+from another algorithm. Ratings are 1 (again), 2 (hard), 3 (good) and 4 (easy).
+"""
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+import math
+
+import numpy as np
+from sqlalchemy import bindparam, select, update
+from app.db import SQLite_DB
+from app.services.http_cache import table_versions
+
+AGAIN, HARD, GOOD, EASY = 1, 2, 3, 4
+
+State = Dict[str, np.ndarray]
+
+# State key -> column on Paper and WrongQuestion
+STATE_COLUMNS = {
+    'stage': 'review_stage',
+    'interval': 'srs_interval',
+    'ease': 'srs_ease',
+    'stability': 'srs_stability',
+    'difficulty': 'srs_difficulty',
+}
+# Column holding the next review date, by table
+DUE_COLUMNS = {
+    'paper': 'next_review_date',
+    'wrongquestion': 'review_at',
+}
+
+def new_state(size: int) -> State:
+    state = {key: np.full(size, np.nan) for key in STATE_COLUMNS}
+    state['stage'] = np.full(size, -1.0)
+    return state
+
+class Algorithm:
+    name = ''
+    DEFAULTS: Dict[str, Any] = {}
+
+    def __init__(self, **params):
+        unknown = sorted(set(params) - set(self.DEFAULTS))
+        if unknown:
+            raise ValueError(f"Unknown {self.name} parameters: {', '.join(unknown)}")
+        self.params = {**self.DEFAULTS, **params}
+        self.validate()
+
+    def validate(self):
+        pass
+
+    def step(self, state: State, rating: np.ndarray, elapsed: np.ndarray) -> State:
+        """State after rating each item `elapsed` days after its last review."""
+        raise NotImplementedError
+
+    def plan(self, state: State) -> State:
+        """State with `interval` recomputed from what the items already hold, without a new review."""
+        raise NotImplementedError
+
+    def _positive(self, *names):
+        for name in names:
+            value = self.params[name]
+            if not isinstance(value, (int, float)) or value <= 0:
+                raise ValueError(f"{self.name} parameter {name} must be a positive number")
+
+class Ebbinghaus(Algorithm):
+    """Fixed intervals: stage n is followed by a review intervals[n] days later, none after the last."""
+    name = 'ebbinghaus'
+    DEFAULTS = {'intervals': [1, 2, 4, 7, 15, 30, 60]}
+
+    def validate(self):
+        intervals = self.params['intervals']
+        if not isinstance(intervals, list) or not intervals or not all(isinstance(d, (int, float)) and d > 0 for d in intervals):
+            raise ValueError("ebbinghaus parameter intervals must be a non-empty list of positive numbers of days")
+        self._ladder = np.array(intervals + [np.nan], dtype=float)
+
+    def _interval(self, stage: np.ndarray) -> np.ndarray:
+        return self._ladder[np.clip(np.nan_to_num(stage), 0, len(self._ladder) - 1).astype(int)]
+
+    def step(self, state, rating, elapsed):
+        state = dict(state)
+        state['stage'] = np.where((rating == AGAIN) | (state['stage'] < 0), 0, state['stage'] + 1)
+        state['interval'] = self._interval(state['stage'])
+        return state
+
+    def plan(self, state):
+        return {**state, 'interval': self._interval(state['stage'])}
+
+class SM2(Algorithm):
+    """
+    SuperMemo 2. A failed review restarts the item at first_interval; otherwise the
+    intervals run first_interval, second_interval, then the previous interval times the
+    ease, which each review moves by its quality.
+    """
+    name = 'sm2'
+    DEFAULTS = {
+        'initial_ease': 2.5,
+        'minimum_ease': 1.3,
+        'first_interval': 1,
+        'second_interval': 6,
+        'maximum_interval': 36500,
+    }
+    # SM-2 quality (0-5) for each rating; below 3 counts as forgotten
+    QUALITY = np.array([0, 2, 3, 4, 5])
+
+    def validate(self):
+        self._positive(*self.DEFAULTS)
+        if self.params['initial_ease'] < self.params['minimum_ease']:
+            raise ValueError("sm2 parameter initial_ease must not be below minimum_ease")
+
+    def _closed_form(self, stage, ease):
+        # Interval for `stage` if the ease never changed; used where no previous interval is known
+        p = self.params
+        later = p['second_interval'] * np.power(ease, np.maximum(stage - 1, 0))
+        return np.where(stage <= 0, p['first_interval'], np.where(stage == 1, p['second_interval'], later))
+
+    def _clip(self, interval):
+        return np.clip(np.round(interval), 1, self.params['maximum_interval'])
+
+    def step(self, state, rating, elapsed):
+        p = self.params
+        state = dict(state)
+        ease = np.where(np.isnan(state['ease']), p['initial_ease'], state['ease'])
+        previous = np.where(np.isnan(state['interval']), self._closed_form(state['stage'], ease), state['interval'])
+        lapse = 5 - self.QUALITY[rating]
+        ease = np.maximum(p['minimum_ease'], ease + 0.1 - lapse * (0.08 + lapse * 0.02))
+        stage = np.where((rating == AGAIN) | (state['stage'] < 0), 0, state['stage'] + 1)
+        interval = np.where(stage == 0, p['first_interval'], np.where(stage == 1, p['second_interval'], previous * ease))
+        state.update(stage=stage, ease=ease, interval=self._clip(interval))
+        return state
+
+    def plan(self, state):
+        ease = np.where(np.isnan(state['ease']), self.params['initial_ease'], state['ease'])
+        return {**state, 'ease': ease, 'interval': self._clip(self._closed_form(state['stage'], ease))}
+
+class FSRS(Algorithm):
+    """
+    Free Spaced Repetition Scheduler v4.5. Each review updates the item's memory
+    stability and difficulty from the rating and how much of it was likely still
+    retained; the next review is planned for when recall drops to desired_retention.
+    """
+    name = 'fsrs'
+    DEFAULTS = {
+        'weights': [0.4872, 1.4003, 3.7145, 13.8206, 5.1618, 1.2298, 0.8975, 0.031, 1.6474,
+                    0.1367, 1.0461, 2.1072, 0.0793, 0.3246, 1.587, 0.2272, 2.8755],
+        'desired_retention': 0.9,
+        'maximum_interval': 36500,
+    }
+    DECAY = -0.5
+    FACTOR = 0.9 ** (1 / DECAY) - 1
+    MAX_REPLAY = 64
+
+    def validate(self):
+        weights = self.params['weights']
+        if not isinstance(weights, list) or len(weights) != 17 or not all(isinstance(w, (int, float)) for w in weights):
+            raise ValueError("fsrs parameter weights must be a list of 17 numbers")
+        if not 0 < self.params['desired_retention'] < 1:
+            raise ValueError("fsrs parameter desired_retention must be between 0 and 1")
+        self._positive('maximum_interval')
+        self._w = np.array(weights, dtype=float)
+
+    def _interval(self, stability):
+        retention = self.params['desired_retention']
+        interval = stability / self.FACTOR * (retention ** (1 / self.DECAY) - 1)
+        return np.clip(np.round(interval), 1, self.params['maximum_interval'])
+
+    def _next(self, state, rating, elapsed):
+        w = self._w
+        stage, stability, difficulty = state['stage'], state['stability'], state['difficulty']
+        new = stage < 0
+        with np.errstate(invalid='ignore', divide='ignore'):
+            retrievability = np.power(1 + self.FACTOR * elapsed / stability, self.DECAY)
+            recall = stability * (1 + np.exp(w[8]) * (11 - difficulty) * np.power(stability, -w[9])
+                                  * (np.exp((1 - retrievability) * w[10]) - 1)
+                                  * np.where(rating == HARD, w[15], 1) * np.where(rating == EASY, w[16], 1))
+            forget = (w[11] * np.power(difficulty, -w[12]) * (np.power(stability + 1, w[13]) - 1)
+                      * np.exp((1 - retrievability) * w[14]))
+        initial_difficulty = np.clip(w[4] - (rating - 3) * w[5], 1, 10)
+        # Difficulty moves with the rating and reverts slightly towards that of a "good" first review
+        next_difficulty = np.clip(w[7] * w[4] + (1 - w[7]) * (difficulty - w[6] * (rating - 3)), 1, 10)
+        stability = np.where(new, w[np.clip(rating, 1, 4) - 1], np.where(rating == AGAIN, forget, recall))
+        result = dict(state)
+        result.update(
+            stage=np.where(new | (rating == AGAIN), 0, stage + 1),
+            stability=stability,
+            difficulty=np.where(new, initial_difficulty, next_difficulty),
+            interval=self._interval(stability),
+        )
+        return result
+
+    def _fill(self, state: State) -> State:
+        """
+        Give items learned under another algorithm a stability and difficulty by
+        replaying their stage as on-time "good" reviews.
+        """
+        missing = (state['stage'] >= 0) & (np.isnan(state['stability']) | np.isnan(state['difficulty']))
+        if not missing.any():
+            return state
+        target = state['stage'][missing]
+        replay = new_state(len(target))
+        for k in range(min(int(target.max()), self.MAX_REPLAY) + 1):
+            stepped = self._next(replay, np.full(len(target), GOOD), np.nan_to_num(replay['interval']))
+            active = target >= k
+            replay = {key: np.where(active, stepped[key], value) for key, value in replay.items()}
+        state = {key: value.copy() for key, value in state.items()}
+        for key in ('stability', 'difficulty'):
+            state[key][missing] = replay[key]
+        return state
+
+    def step(self, state, rating, elapsed):
+        return self._next(self._fill(state), rating, elapsed)
+
+    def plan(self, state):
+        state = self._fill(state)
+        return {**state, 'interval': np.where(state['stage'] >= 0, self._interval(state['stability']), np.nan)}
+
+ALGORITHMS = {algorithm.name: algorithm for algorithm in (Ebbinghaus, SM2, FSRS)}
+DEFAULT_ALGORITHM = 'ebbinghaus'
+
+_current: Optional[Algorithm] = None
+
+def create_algorithm(name: str, params: Optional[Dict[str, Any]] = None) -> Algorithm:
+    if name not in ALGORITHMS:
+        raise ValueError(f"Unknown algorithm '{name}'; choose one of {', '.join(ALGORITHMS)}")
+    return ALGORITHMS[name](**(params or {}))
+
+def get_algorithm() -> Algorithm:
+    """The algorithm configured in settings.json, read once."""
+    global _current
+    if _current is None:
+        from app.routers.settings import load_settings
+        settings = load_settings()
+        try:
+            _current = create_algorithm(settings.get('srs_algorithm', DEFAULT_ALGORITHM), settings.get('srs_params'))
+        except ValueError as e:
+            print(f"Invalid spaced repetition settings ({e}), using '{DEFAULT_ALGORITHM}'.")
+            _current = create_algorithm(DEFAULT_ALGORITHM)
+    return _current
+
+def set_algorithm(algorithm: Algorithm):
+    global _current
+    _current = algorithm
+
+# --- Single items ---
+def _state_of(item) -> State:
+    values = {key: getattr(item, column) for key, column in STATE_COLUMNS.items()}
+    values['stage'] = values['stage'] or 0
+    return {key: np.array([value], dtype=float) for key, value in values.items()}
+
+def _apply(item, state: State, now: datetime):
+    for key, column in STATE_COLUMNS.items():
+        value = float(state[key][0])
+        setattr(item, column, None if math.isnan(value) else value)
+    item.review_stage = int(state['stage'][0])
+    item.last_reviewed_at = now
+    interval = item.srs_interval
+    setattr(item, DUE_COLUMNS[item.__tablename__], None if interval is None else now + timedelta(days=interval))
+
+def learn(item, now: Optional[datetime] = None, algorithm: Optional[Algorithm] = None):
+    """Start the review cycle of a Paper or WrongQuestion from scratch. The caller commits."""
+    algorithm = algorithm or get_algorithm()
+    now = now or datetime.now()
+    state = algorithm.step(new_state(1), np.array([GOOD]), np.zeros(1))
+    _apply(item, state, now)
+
+def review(item, rating: int = GOOD, now: Optional[datetime] = None, algorithm: Optional[Algorithm] = None):
+    """Record a review of a Paper or WrongQuestion and plan its next one. The caller commits."""
+    algorithm = algorithm or get_algorithm()
+    now = now or datetime.now()
+    elapsed = 0.0
+    if item.last_reviewed_at is not None:
+        elapsed = max((now - item.last_reviewed_at.replace(tzinfo=None)).total_seconds() / 86400, 0.0)
+    state = algorithm.step(_state_of(item), np.array([rating]), np.array([elapsed]))
+    _apply(item, state, now)
+
+# --- Batches ---
+def learned_values(model, now: Optional[datetime] = None, algorithm: Optional[Algorithm] = None) -> Dict[str, Any]:
+    """Column values learn() sets. They are the same for every row, so a batch is learned with one UPDATE."""
+    algorithm = algorithm or get_algorithm()
+    now = now or datetime.now()
+    state = algorithm.step(new_state(1), np.array([GOOD]), np.zeros(1))
+    values = {column: _column_values(state[key])[0] for key, column in STATE_COLUMNS.items()}
+    values['review_stage'] = int(state['stage'][0])
+    values['last_reviewed_at'] = now
+    interval = values['srs_interval']
+    values[DUE_COLUMNS[model.__tablename__]] = None if interval is None else now + timedelta(days=interval)
+    return values
+
+def review_where(
+    conn,
+    model,
+    criteria: list,
+    rating: int = GOOD,
+    now: Optional[datetime] = None,
+    algorithm: Optional[Algorithm] = None,
+    values: Optional[Dict[str, Any]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    review() every row matching `criteria` with one step over the whole batch and one executemany
+    UPDATE on `conn`, also setting `values`. Returns the id and the new column values of each row.
+    """
+    algorithm = algorithm or get_algorithm()
+    now = now or datetime.now()
+    table = model.__table__
+    due_column = DUE_COLUMNS[table.name]
+    columns = [table.c.id, table.c.last_reviewed_at] + [table.c[column] for column in STATE_COLUMNS.values()]
+    rows = conn.execute(select(*columns).where(*criteria)).all()
+    if not rows:
+        return []
+
+    columns = list(zip(*rows))
+    state = {key: np.array(columns[i + 2], dtype=float) for i, key in enumerate(STATE_COLUMNS)}
+    state['stage'] = np.nan_to_num(state['stage'])
+    last = np.array(columns[1], dtype='datetime64[us]')
+    elapsed = (np.datetime64(now, 'us') - last) / np.timedelta64(1, 'D')
+    elapsed = np.maximum(np.nan_to_num(elapsed), 0.0)  # Never reviewed counts as reviewed just now, like review()
+    state = algorithm.step(state, np.full(len(rows), rating), elapsed)
+
+    planned = ~np.isnan(state['interval'])
+    offsets = (np.nan_to_num(state['interval']) * 86_400_000_000).astype('timedelta64[us]')
+    due = np.where(planned, np.datetime64(now, 'us') + offsets, np.datetime64('NaT'))
+    parameters = {
+        'b_id': list(columns[0]),
+        'b_due': due.astype(object).tolist(),
+        'b_review_stage': state['stage'].astype(int).tolist(),
+    }
+    for key, column in STATE_COLUMNS.items():
+        if key != 'stage':
+            parameters[f'b_{column}'] = _column_values(state[key])
+    assignments = {column: bindparam(f'b_{column}') for column in STATE_COLUMNS.values()}
+    assignments.update({due_column: bindparam('b_due'), 'last_reviewed_at': now, **(values or {})})
+
+    statement = update(table).where(table.c.id == bindparam('b_id')).values(assignments)
+    conn.execute(statement, [dict(zip(parameters, row)) for row in zip(*parameters.values())])
+    return [
+        {'id': row_id, due_column: row_due, 'review_stage': stage, 'last_reviewed_at': now, **(values or {})}
+        for row_id, row_due, stage in zip(parameters['b_id'], parameters['b_due'], parameters['b_review_stage'])
+    ]
+
+# --- Every item at once ---
+def _column_values(values: np.ndarray) -> List[Optional[float]]:
+    return np.where(np.isnan(values), None, values.astype(object)).tolist()
+
+def _reschedule_table(conn, model, algorithm: Algorithm, now: datetime) -> int:
+    table = model.__table__
+    due_column = DUE_COLUMNS[table.name]
+    columns = [table.c.id, table.c.last_reviewed_at] + [table.c[column] for column in STATE_COLUMNS.values()]
+    query = select(*columns).where(table.c.last_reviewed_at != None)
+    if model is SQLite_DB.Paper:
+        query = query.where(table.c.status.in_(("3", "4")))  # Completed or pending review
+    rows = conn.execute(query).all()
+    if not rows:
+        return 0
+
+    values = list(zip(*rows))
+    state = {key: np.array(values[i + 2], dtype=float) for i, key in enumerate(STATE_COLUMNS)}
+    state['stage'] = np.nan_to_num(state['stage'])
+    state = algorithm.plan(state)
+
+    last = np.array(values[1], dtype='datetime64[us]')
+    planned = ~np.isnan(state['interval'])
+    offsets = (np.nan_to_num(state['interval']) * 86_400_000_000).astype('timedelta64[us]')
+    due = np.where(planned, last + offsets, np.datetime64('NaT'))
+    parameters = {
+        'b_id': list(values[0]),
+        'b_due': due.astype(object).tolist(),
+    }
+    for key, column in STATE_COLUMNS.items():
+        if key != 'stage':
+            parameters[f'b_{column}'] = _column_values(state[key])
+    assignments = {due_column: bindparam('b_due')}
+    assignments.update({column: bindparam(f'b_{column}') for column in STATE_COLUMNS.values() if column != 'review_stage'})
+    if model is SQLite_DB.Paper:
+        # Papers whose new date has already passed are pending review now
+        parameters['b_status'] = np.where(planned & (due <= np.datetime64(now, 'us')), "4", "3").tolist()
+        assignments['status'] = bindparam('b_status')
+
+    statement = update(table).where(table.c.id == bindparam('b_id')).values(assignments)
+    conn.execute(statement, [dict(zip(parameters, row)) for row in zip(*parameters.values())])
+    return len(rows)
+
+def reschedule_all(algorithm: Optional[Algorithm] = None, now: Optional[datetime] = None) -> Dict[str, int]:
+    """
+    Re-plan the next review of every paper and wrong question in a review cycle
+    under `algorithm`, in one transaction. Returns the number of rows per table.
+    """
+    algorithm = algorithm or get_algorithm()
+    now = now or datetime.now()
+    with SQLite_DB.engine.begin() as conn:
+        counts = {
+            model.__tablename__: _reschedule_table(conn, model, algorithm, now)
+            for model in (SQLite_DB.Paper, SQLite_DB.WrongQuestion)
+        }
+    table_versions.bump(*counts)
+    return counts
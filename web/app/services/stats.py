@@ -0,0 +1,63 @@
+"""
+Paper counters for the dashboard.
+
+The paper_stats table (see SQLite_DB) holds one row per status and one per
+day of last review, kept current by triggers on paper. Reading a count is a
+primary key lookup whatever the size of the paper table. check_paper_stats
+recounts everything from the paper table and reports where the stored
+counters drifted, optionally rewriting them.
+"""
+from datetime import date
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import Engine
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from app.db import SQLite_DB
+from app.services.http_cache import table_versions
+
+async def status_counts(session: AsyncSession, statuses: Sequence[str]) -> Dict[str, int]:
+    counters = SQLite_DB.paper_stats.c
+    rows = (await session.exec(
+        select(counters.key, counters.count).where(counters.kind == 'status', counters.key.in_(statuses))
+    )).all()
+    counts = {status: 0 for status in statuses}
+    counts.update({key: count for key, count in rows})
+    return counts
+
+async def reviewed_per_day(session: AsyncSession, since: date) -> Dict[str, int]:
+    """Papers last reviewed on each day from `since` on, keyed by ISO date."""
+    counters = SQLite_DB.paper_stats.c
+    rows = (await session.exec(
+        select(counters.key, counters.count).where(counters.kind == 'reviewed_on', counters.key >= since.isoformat())
+    )).all()
+    return {key: count for key, count in rows if count}
+
+def check_paper_stats(db_engine: Optional[Engine] = None, repair: bool = False) -> List[Dict]:
+    """
+    Rebuild the counters from the paper table and compare them with the stored ones.
+    Returns one {kind, key, stored, actual} entry per counter that differs; with
+    `repair`, the stored counters are replaced by the rebuilt ones in the same transaction.
+    """
+    db_engine = db_engine or SQLite_DB.engine
+    with db_engine.begin() as conn:
+        stored: Dict[Tuple[str, str], int] = {
+            (kind, key): count for kind, key, count in conn.exec_driver_sql("SELECT kind, key, count FROM paper_stats")
+        }
+        actual: Dict[Tuple[str, str], int] = {
+            (kind, key): count for kind, key, count in conn.exec_driver_sql(SQLite_DB.PAPER_STATS_QUERY)
+        }
+        drift = [
+            {"kind": kind, "key": key, "stored": stored.get((kind, key), 0), "actual": actual.get((kind, key), 0)}
+            for kind, key in sorted(stored.keys() | actual.keys())
+            if stored.get((kind, key), 0) != actual.get((kind, key), 0)
+        ]
+        if repair:
+            # Also drops counters that reached zero
+            conn.exec_driver_sql("DELETE FROM paper_stats")
+            conn.exec_driver_sql(f"INSERT INTO paper_stats (kind, key, count) {SQLite_DB.PAPER_STATS_QUERY}")
+    if drift and repair:
+        table_versions.bump('paper')  # The dashboard reads these counters
+    if drift:
+        print(f"Paper counters drifted on {len(drift)} keys{', repaired' if repair else ''}: {drift[:10]}")
+    return drift
@@ -0,0 +1,128 @@
+"""
+Load test: sync Session handlers in the threadpool against the async handlers on aiosqlite.
+
+Run from the web directory:
+    python -m benchmarks.bench_async_db [--clients 200] [--seconds 10] [--rows 20000]
+
+Each mode is served by uvicorn in its own process against the same seeded
+database (LMS_DB_PATH). "sync" serves copies of the paper list and status
+update handlers as they were before the port (plain def, SessionDep); "async"
+serves the real paper router. --clients concurrent clients send a 90/10 mix of
+filtered list requests and status updates for --seconds.
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Optional
+
+import httpx
+from fastapi import FastAPI, HTTPException
+
+from app.db import SQLite_DB
+from app.routers import paper
+
+SUBJECTS = ['chinese', 'math', 'english', 'physics', 'chemistry', 'biology']
+
+# --- Apps under test (imported by the uvicorn subprocess) ---
+sync_app = FastAPI()
+
+@sync_app.get("/paper/")
+def sync_get_paper(session: SQLite_DB.SessionDep, subject: Optional[str] = None, grade: Optional[str] = None):
+    return session.exec(paper.build_paper_query(subject=subject, grade=grade)).all()
+
+@sync_app.put("/paper/{paper_id}/status")
+def sync_update_paper_status(paper_id: int, status_update: paper.PaperStatusUpdate, session: SQLite_DB.SessionDep):
+    db_paper = session.get(SQLite_DB.Paper, paper_id)
+    if not db_paper:
+        raise HTTPException(status_code=404, detail="Paper not found")
+    db_paper.status = status_update.status
+    session.add(db_paper)
+    session.commit()
+    session.refresh(db_paper)
+    return db_paper
+
+async_app = FastAPI()
+async_app.include_router(paper.router)
+
+# --- Driver ---
+def seed(rows):
+    SQLite_DB.create_db_and_tables()
+    rng = random.Random(0)
+    now = datetime.now()
+    with SQLite_DB.engine.begin() as conn:
+        conn.execute(SQLite_DB.Paper.__table__.insert(), [{
+            'title': f"Paper {i}",
+            'subject': rng.choice(SUBJECTS),
+            'grade': str(rng.randint(1, 60)),  # ~50 rows per subject + grade
+            'type': str(rng.randint(1, 5)),
+            'status': rng.choice('12345'),
+            'start_date': now + timedelta(days=rng.uniform(-30, 30)),
+        } for i in range(rows)])
+
+async def client_loop(client, rows, deadline, latencies, errors):
+    rng = random.Random()
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        try:
+            if rng.random() < 0.9:
+                response = await client.get('/paper/', params={'subject': rng.choice(SUBJECTS), 'grade': str(rng.randint(1, 60))})
+            else:
+                response = await client.put(f'/paper/{rng.randint(1, rows)}/status', json={'status': rng.choice('12345')})
+            response.raise_for_status()
+            latencies.append(time.perf_counter() - start)
+        except httpx.HTTPError:
+            errors.append(1)
+
+async def drive(port, clients, seconds, rows):
+    limits = httpx.Limits(max_connections=clients, max_keepalive_connections=clients)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=60) as client:
+        for _ in range(50):  # wait for the server to come up
+            try:
+                await client.get('/paper/', params={'subject': 'none'})
+                break
+            except httpx.TransportError:
+                await asyncio.sleep(0.2)
+        latencies, errors = [], []
+        deadline = time.perf_counter() + seconds
+        await asyncio.gather(*(client_loop(client, rows, deadline, latencies, errors) for _ in range(clients)))
+    return latencies, len(errors)
+
+def run_mode(mode, options, env, port):
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', f'benchmarks.bench_async_db:{mode}_app', '--port', str(port), '--log-level', 'warning'],
+        env=env,
+    )
+    try:
+        latencies, errors = asyncio.run(drive(port, options.clients, options.seconds, options.rows))
+    finally:
+        server.terminate()
+        server.wait()
+    ordered = sorted(latencies) or [0]
+    p99 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+    print(f"{mode:<8}{len(latencies) / options.seconds:>10.0f}{statistics.median(ordered) * 1000:>10.1f}ms{p99 * 1000:>10.1f}ms{errors:>8}")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--clients', type=int, default=200)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--rows', type=int, default=20_000)
+    parser.add_argument('--port', type=int, default=8765)
+    options = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        env = dict(os.environ, LMS_DB_PATH=os.path.join(directory, 'bench.db'), LMS_SQL_ECHO='off')
+        # Seed in a child so this process never opens the database it is pointed at by default
+        subprocess.run([sys.executable, '-c', f'from benchmarks.bench_async_db import seed; seed({options.rows})'], env=env, check=True)
+        print(f"{'mode':<8}{'req/s':>10}{'median':>12}{'p99':>12}{'errors':>8}")
+        for mode in ('sync', 'async'):
+            run_mode(mode, options, env, options.port)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+"""
+Loading papers one POST /paper/ at a time against POST /paper/import, and
+the memory taken by GET /paper/export.
+
+Run from the web directory:
+    python -m benchmarks.bench_bulk_import [--rows 5000] [--export-rows 20000 200000]
+
+Posts --rows papers one request each, the way a migration script had to,
+then imports the same rows as NDJSON and as CSV in one request each, and
+checks every copy made it in. Then seeds tables of each --export-rows size
+and reports the peak Python allocation (tracemalloc) of streaming the NDJSON
+export, next to that of GET /paper/ returning every paper. The export is
+read straight from the generator behind /paper/export, because the test
+client buffers whole responses.
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+
+from fastapi.testclient import TestClient
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlmodel import select, func
+
+from app.db import SQLite_DB
+from app.services import bulk_io
+from benchmarks.bench_calendar_query import seed
+
+def paper_rows(rows):
+    return [
+        {"title": f"试卷 {i}", "subject": "math", "grade": str(i % 6 + 1), "type": str(i % 5 + 1), "status": "3",
+         "start_date": f"2025-{i % 12 + 1:02d}-{i % 28 + 1:02d}", "next_review_date": "2030-01-01T08:00:00"}
+        for i in range(rows)
+    ]
+
+def as_csv(rows):
+    fields = list(rows[0])
+    lines = [','.join(fields)] + [','.join(str(row[field]) for field in fields) for row in rows]
+    return '\n'.join(lines).encode('utf-8')
+
+def use_database(directory, name):
+    db_path = os.path.join(directory, name)
+    SQLite_DB.engine = SQLite_DB.create_db_engine(f"sqlite:///{db_path}")
+    SQLite_DB.async_engine = create_async_engine(f"sqlite+aiosqlite:///{db_path}")
+    return db_path
+
+def paper_count():
+    with SQLite_DB.engine.connect() as conn:
+        return conn.execute(select(func.count()).select_from(SQLite_DB.Paper)).scalar()
+
+def peak_during(run):
+    # Timed untraced, since tracemalloc slows allocation down several times
+    began = time.perf_counter()
+    size = run()
+    elapsed = time.perf_counter() - began
+    tracemalloc.start()
+    run()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak, size
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=5000)
+    parser.add_argument('--export-rows', type=int, nargs='+', default=[20_000, 200_000])
+    options = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        use_database(directory, 'import.db')
+        SQLite_DB.create_db_and_tables()
+        from app.main import app
+        from app.services.http_cache import response_cache
+        client = TestClient(app)
+
+        rows = paper_rows(options.rows)
+        began = time.perf_counter()
+        for row in rows:
+            client.post('/paper/', json=row).raise_for_status()
+        one_by_one = time.perf_counter() - began
+
+        ndjson = '\n'.join(json.dumps(row, ensure_ascii=False) for row in rows).encode('utf-8')
+        timings = {}
+        for name, body in (('papers.ndjson', ndjson), ('papers.csv', as_csv(rows))):
+            began = time.perf_counter()
+            report = client.post('/paper/import', files={'file': (name, body)}).json()
+            timings[name] = time.perf_counter() - began
+            if report['imported'] != options.rows or report['failed']:
+                raise SystemExit(f"{name} did not import cleanly: {report}")
+        if paper_count() != options.rows * 3:
+            raise SystemExit(f"Expected {options.rows * 3} papers, found {paper_count()}")
+
+        print(f"{options.rows} papers")
+        print(f"{'POST /paper/ each':<22}{one_by_one:>8.2f}s{options.rows / one_by_one:>10.0f} rows/s")
+        for name, elapsed in timings.items():
+            print(f"{'import ' + name.split('.')[1]:<22}{elapsed:>8.2f}s{options.rows / elapsed:>10.0f} rows/s")
+
+        print(f"\n{'rows':>8}{'export':>10}{'peak':>10}{'list':>10}{'peak':>10}")
+        for size in options.export_rows:
+            use_database(directory, f'export{size}.db')
+            seed(SQLite_DB.engine, size)
+            SQLite_DB.create_db_and_tables()
+
+            def export():
+                query = select(*SQLite_DB.Paper.__table__.columns).order_by(SQLite_DB.Paper.id)
+                fields = list(SQLite_DB.Paper.__table__.columns.keys())
+                return sum(chunk.count(b'\n') for chunk in bulk_io.export_rows(SQLite_DB.engine, query, 'ndjson', fields))
+
+            def listing():
+                response_cache.clear()
+                return len(client.get('/paper/').json())
+
+            export_time, export_peak, exported = peak_during(export)
+            list_time, list_peak, listed = peak_during(listing)
+            if exported != size or listed != size:
+                raise SystemExit(f"Exported {exported} and listed {listed} of {size} papers")
+            print(f"{size:>8}{export_time:>9.2f}s{export_peak / 1024 / 1024:>8.1f}MB{list_time:>9.2f}s{list_peak / 1024 / 1024:>8.1f}MB")
+
+if __name__ == '__main__':
+    main()
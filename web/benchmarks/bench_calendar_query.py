@@ -0,0 +1,99 @@
+"""
+Calendar overlap query: B-tree OR predicate against the paper_interval R*Tree.
+
+Run from the web directory:
+    python -m benchmarks.bench_calendar_query [--rows 1000000] [--queries 200]
+
+Seeds a throwaway database with --rows papers spread over ten years (80% with
+a start date, half of those multi-day, half with a review date; the triggers
+fill the R*Tree as rows go in), then runs --queries random two-month windows
+like ScheduleView does. "btree" is the three-branch predicate on its own, as
+get_paper ran it before; "rtree" is build_paper_query, which adds the interval
+lookup in front of it. Both fetch full rows and must return the same ids.
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlmodel import Session, SQLModel, and_, create_engine, or_, select
+
+from app.db import SQLite_DB
+from app.routers.paper import build_paper_query
+
+BASE = datetime(2020, 1, 1)
+SPAN_DAYS = 3650
+
+def seed(engine, rows):
+    SQLModel.metadata.create_all(engine)
+    rng = random.Random(0)
+    fmt = '%Y-%m-%d %H:%M:%S.%f'
+    batch = []
+    raw = engine.raw_connection()
+    try:
+        for i in range(rows):
+            start = BASE + timedelta(days=rng.uniform(0, SPAN_DAYS)) if rng.random() < 0.8 else None
+            end = start + timedelta(days=rng.uniform(1, 14)) if start and rng.random() < 0.5 else None
+            review = BASE + timedelta(days=rng.uniform(0, SPAN_DAYS)) if rng.random() < 0.5 else None
+            batch.append((f"Paper {i}", 0, start and start.strftime(fmt), end and end.strftime(fmt), review and review.strftime(fmt)))
+            if len(batch) == 50_000 or i == rows - 1:
+                raw.executemany(
+                    "INSERT INTO paper (title, review_stage, start_date, end_date, next_review_date) VALUES (?, ?, ?, ?, ?)", batch
+                )
+                raw.commit()
+                batch = []
+    finally:
+        raw.close()
+
+def btree_query(start, end):
+    Paper = SQLite_DB.Paper
+    return select(Paper).where(or_(
+        and_(Paper.start_date != None, Paper.end_date != None, Paper.start_date <= end, Paper.end_date >= start),
+        and_(Paper.start_date != None, Paper.end_date == None, Paper.start_date >= start, Paper.start_date <= end),
+        and_(Paper.next_review_date != None, Paper.next_review_date >= start, Paper.next_review_date <= end),
+    ))
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--queries', type=int, default=200)
+    options = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_engine(f"sqlite:///{os.path.join(directory, 'calendar.db')}")
+        started = time.perf_counter()
+        seed(engine, options.rows)
+        print(f"Seeded {options.rows} papers in {time.perf_counter() - started:.1f}s")
+
+        rng = random.Random(1)
+        windows = []
+        for _ in range(options.queries):
+            start = BASE + timedelta(days=rng.uniform(0, SPAN_DAYS - 60))
+            windows.append((start, start + timedelta(days=61)))
+
+        timings = {'btree': [], 'rtree': []}
+        rows_returned = []
+        with Session(engine) as session:
+            for start, end in windows:
+                results = {}
+                for mode, query in (('btree', btree_query(start, end)), ('rtree', build_paper_query(start_date=start, end_date=end))):
+                    began = time.perf_counter()
+                    results[mode] = session.exec(query).all()
+                    timings[mode].append(time.perf_counter() - began)
+                    session.expunge_all()
+                if sorted(p.id for p in results['btree']) != sorted(p.id for p in results['rtree']):
+                    raise SystemExit(f"Results differ for {start} - {end}")
+                rows_returned.append(len(results['rtree']))
+
+    print(f"{options.queries} windows of 61 days, {statistics.mean(rows_returned):.0f} papers per window on average")
+    print(f"{'mode':<8}{'median':>10}{'p95':>10}{'max':>10}")
+    for mode, values in timings.items():
+        ordered = sorted(values)
+        p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+        print(f"{mode:<8}{statistics.median(ordered) * 1000:>8.1f}ms{p95 * 1000:>8.1f}ms{ordered[-1] * 1000:>8.1f}ms")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""
+Conditional GETs on the list endpoints: full query, response LRU and 304.
+
+Run from the web directory:
+    python -m benchmarks.bench_conditional_get [--rows 20000] [--requests 300]
+
+Seeds a throwaway database with --rows papers and times GET /paper/ (every
+paper, as the views load it) and GET /dashboard/stats through the ASGI app
+three ways: "query" clears the response cache before each request, so every
+one runs the query and serializes the result; "lru" repeats the request
+without a validator and is answered from the cache; "304" sends the ETag back
+in If-None-Match and gets an empty Not Modified.
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+from fastapi.testclient import TestClient
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlmodel import SQLModel, create_engine
+
+from app.db import SQLite_DB
+from benchmarks.bench_calendar_query import seed
+
+def timed(client, path, requests, headers=None, before=None):
+    timings = []
+    for _ in range(requests):
+        if before:
+            before()
+        began = time.perf_counter()
+        response = client.get(path, headers=headers)
+        timings.append(time.perf_counter() - began)
+    return timings, response
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=20_000)
+    parser.add_argument('--requests', type=int, default=300)
+    options = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        db_path = os.path.join(directory, 'conditional.db')
+        SQLite_DB.engine = create_engine(f"sqlite:///{db_path}")
+        SQLite_DB.async_engine = create_async_engine(f"sqlite+aiosqlite:///{db_path}")
+        seed(SQLite_DB.engine, options.rows)
+        SQLModel.metadata.create_all(SQLite_DB.engine)
+        SQLite_DB.ensure_paper_stats(SQLite_DB.engine)
+
+        from app.main import app
+        from app.services.http_cache import response_cache
+
+        client = TestClient(app)
+        print(f"{'endpoint':<18}{'mode':<8}{'median':>10}{'p95':>10}{'bytes':>10}")
+        for path in ('/paper/', '/dashboard/stats'):
+            etag = client.get(path).headers['etag']
+            runs = {
+                'query': timed(client, path, options.requests, before=response_cache.clear),
+                'lru': timed(client, path, options.requests),
+                '304': timed(client, path, options.requests, headers={'If-None-Match': etag}),
+            }
+            for mode, (values, response) in runs.items():
+                ordered = sorted(values)
+                p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+                print(f"{path:<18}{mode:<8}{statistics.median(ordered) * 1000:>8.2f}ms{p95 * 1000:>8.2f}ms{len(response.content):>10}")
+        SQLite_DB.engine.dispose()
+
+if __name__ == '__main__':
+    main()
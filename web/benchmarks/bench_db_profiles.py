@@ -0,0 +1,111 @@
+"""
+Concurrent read/write throughput of the engine profiles in SQLite_DB.
+
+Run from the web directory:
+    python -m benchmarks.bench_db_profiles [--rows 20000] [--readers 4] [--writers 2] [--seconds 5]
+
+For every profile a fresh database is seeded with --rows papers. Reader threads
+then run the paper list and dashboard style queries while writer threads update
+statuses and insert papers, each through its own Session as the request
+handlers do. Reported are completed operations per second and the operations
+that failed with "database is locked".
+"""
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, insert
+from sqlalchemy.exc import OperationalError
+from sqlmodel import Session, SQLModel, select
+
+from app.db import SQLite_DB
+
+SUBJECTS = ['chinese', 'math', 'english', 'physics']
+
+def seed(engine, rows):
+    SQLModel.metadata.create_all(engine)
+    rng = random.Random(0)
+    now = datetime.now()
+    with engine.begin() as conn:
+        conn.execute(insert(SQLite_DB.Paper), [{
+            'title': f"Paper {i}",
+            'subject': rng.choice(SUBJECTS),
+            'grade': str(rng.randint(1, 6)),
+            'type': str(rng.randint(1, 8)),
+            'status': rng.choice('12345'),
+            'next_review_date': now + timedelta(days=rng.uniform(-30, 30)),
+            'last_reviewed_at': now - timedelta(days=rng.uniform(0, 30)),
+        } for i in range(rows)])
+
+def reader(engine, rows, stop, counts):
+    rng = random.Random()
+    week_ago = datetime.now() - timedelta(days=7)
+    while not stop.is_set():
+        try:
+            with Session(engine) as session:
+                session.exec(select(SQLite_DB.Paper).where(
+                    SQLite_DB.Paper.subject == rng.choice(SUBJECTS), SQLite_DB.Paper.grade == str(rng.randint(1, 6))
+                ).limit(50)).all()
+                session.exec(select(func.count(SQLite_DB.Paper.id)).where(SQLite_DB.Paper.last_reviewed_at >= week_ago)).one()
+                session.get(SQLite_DB.Paper, rng.randint(1, rows))
+            counts['reads'] += 1
+        except OperationalError:
+            counts['read_errors'] += 1
+
+def writer(engine, rows, stop, counts):
+    rng = random.Random()
+    while not stop.is_set():
+        try:
+            with Session(engine) as session:
+                paper = session.get(SQLite_DB.Paper, rng.randint(1, rows))
+                paper.status = rng.choice('12345')
+                paper.last_reviewed_at = datetime.now()
+                session.add(paper)
+                session.add(SQLite_DB.Paper(title="New paper", subject=rng.choice(SUBJECTS), status='1'))
+                session.commit()
+            counts['writes'] += 1
+        except OperationalError:
+            counts['write_errors'] += 1
+
+def run_profile(profile, options):
+    with tempfile.TemporaryDirectory() as directory:
+        engine = SQLite_DB.create_db_engine(f"sqlite:///{os.path.join(directory, 'bench.db')}", profile, sql_echo='off')
+        seed(engine, options.rows)
+        stop = threading.Event()
+        workers = [(reader, {'reads': 0, 'read_errors': 0}) for _ in range(options.readers)]
+        workers += [(writer, {'writes': 0, 'write_errors': 0}) for _ in range(options.writers)]
+        threads = [threading.Thread(target=target, args=(engine, options.rows, stop, counts)) for target, counts in workers]
+        for thread in threads:
+            thread.start()
+        time.sleep(options.seconds)
+        stop.set()
+        for thread in threads:
+            thread.join()
+        engine.dispose()
+    totals = {'reads': 0, 'writes': 0, 'read_errors': 0, 'write_errors': 0}
+    for _, counts in workers:  # one dict per thread, so no counter is shared
+        for key, value in counts.items():
+            totals[key] += value
+    return totals
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=20_000)
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--writers', type=int, default=2)
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--profiles', default=','.join(SQLite_DB.ENGINE_PROFILES))
+    options = parser.parse_args()
+
+    print(f"{'profile':<12}{'reads/s':>10}{'writes/s':>10}{'locked reads':>14}{'locked writes':>15}")
+    for profile in options.profiles.split(','):
+        counts = run_profile(profile, options)
+        print(f"{profile:<12}{counts['reads'] / options.seconds:>10.0f}{counts['writes'] / options.seconds:>10.0f}"
+              f"{counts['read_errors']:>14}{counts['write_errors']:>15}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""
+PDF serving: Starlette's FileResponse against the file_server component.
+
+Run from the web directory:
+    python -m benchmarks.bench_file_server [--files 20] [--size-mb 50] [--requests 500]
+
+Writes --files PDFs of --size-mb each and replays a viewer seeking through
+them: random 256KB Range requests, plus revalidations of files it already
+has. "fileresponse" serves them the way /pdf did (an exists() check and a
+FileResponse, which stats and opens the file on every request and has no
+304); "file_server" is serve_file(). Also checks that every byte served
+matches the file and that no descriptor is left open once the cache is
+cleared.
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from fastapi import FastAPI, Request
+from fastapi.responses import FileResponse
+from fastapi.testclient import TestClient
+
+from app.services.file_server import file_cache, serve_file
+
+RANGE_BYTES = 256 * 1024
+
+def build_app(directory):
+    app = FastAPI()
+
+    @app.get("/fileresponse")
+    async def legacy(filename: str):
+        file_path = os.path.join(directory, filename)
+        if not os.path.exists(file_path):
+            return {"error": "File not found"}
+        return FileResponse(file_path, media_type="application/pdf")
+
+    @app.get("/file_server")
+    async def current(request: Request, filename: str):
+        return await serve_file(request, os.path.join(directory, filename), media_type="application/pdf")
+
+    return app
+
+def open_descriptors():
+    return len(os.listdir('/proc/self/fd')) if os.path.isdir('/proc/self/fd') else -1
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--files', type=int, default=20)
+    parser.add_argument('--size-mb', type=int, default=50)
+    parser.add_argument('--requests', type=int, default=500)
+    options = parser.parse_args()
+
+    rng = random.Random(0)
+    with tempfile.TemporaryDirectory() as directory:
+        size = options.size_mb * 1024 * 1024
+        names = []
+        for i in range(options.files):
+            names.append(f"paper{i}.pdf")
+            with open(os.path.join(directory, names[-1]), 'wb') as f:
+                f.write(os.urandom(size))
+        workload = [(rng.choice(names), rng.randrange(0, size - RANGE_BYTES), rng.random() < 0.3) for _ in range(options.requests)]
+        before = open_descriptors()
+
+        client = TestClient(build_app(directory))
+        print(f"{options.requests} requests over {options.files} files of {options.size_mb}MB, 30% revalidations")
+        print(f"{'endpoint':<14}{'median':>10}{'p95':>10}{'bytes sent':>14}")
+        for endpoint in ('fileresponse', 'file_server'):
+            etags = {}
+            timings = []
+            sent = 0
+            for name, offset, revalidate in workload:
+                headers = {'Range': f'bytes={offset}-{offset + RANGE_BYTES - 1}'}
+                if revalidate and name in etags:
+                    headers = {'If-None-Match': etags[name]}
+                began = time.perf_counter()
+                response = client.get(f'/{endpoint}', params={'filename': name}, headers=headers)
+                timings.append(time.perf_counter() - began)
+                sent += len(response.content)
+                etags[name] = response.headers.get('etag', etags.get(name, ''))
+                if response.status_code == 206:
+                    with open(os.path.join(directory, name), 'rb') as f:
+                        f.seek(offset)
+                        if f.read(RANGE_BYTES) != response.content:
+                            raise SystemExit(f"{endpoint} sent the wrong bytes for {name} at {offset}")
+            ordered = sorted(timings)
+            p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+            print(f"{endpoint:<14}{statistics.median(ordered) * 1000:>8.2f}ms{p95 * 1000:>8.2f}ms{sent / 1024 / 1024:>12.1f}MB")
+
+        print(f"File cache: {file_cache.stats()}")
+        file_cache.clear()
+        if open_descriptors() != before:
+            raise SystemExit(f"{open_descriptors() - before} descriptors left open")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""
+Cost of the request metrics: the same requests with and without them.
+
+Run from the web directory:
+    python -m benchmarks.bench_metrics_overhead [--rows 2000] [--requests 500]
+
+Seeds a throwaway database with --rows papers and times --requests of a few
+common requests (the paper list with the response cache cleared, the
+dashboard stats and a status change) in alternating rounds, once with
+MetricsMiddleware and the engine's cursor listeners removed and once with
+them in place. The slow request log is turned off so printing does not count.
+Then it checks that every line of GET /metrics is a valid sample and that
+no route label carries an id.
+"""
+import argparse
+import os
+import re
+import statistics
+import tempfile
+import time
+
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+from app.db import SQLite_DB
+from app.services import metrics
+from app.services.http_cache import response_cache
+from benchmarks.bench_calendar_query import seed
+
+SAMPLE = re.compile(r'^[a-z_]+(\{([a-z_]+="[^"]*",?)*\})? (-?[0-9.e+-]+|\+Inf)$')
+LISTENERS = {
+    'before_cursor_execute': metrics._before_cursor_execute,
+    'after_cursor_execute': metrics._after_cursor_execute,
+    'handle_error': metrics._handle_error,
+}
+
+def set_metrics(app, enabled):
+    engines = (SQLite_DB.engine, SQLite_DB.async_engine.sync_engine)
+    middleware = [m for m in app.user_middleware if m.cls is not metrics.MetricsMiddleware]
+    if enabled:
+        middleware.insert(0, set_metrics.middleware)
+        for engine in engines:
+            metrics.instrument_engine(engine)
+    else:
+        for engine in engines:
+            for name, listener in LISTENERS.items():
+                if event.contains(engine, name, listener):
+                    event.remove(engine, name, listener)
+    app.user_middleware = middleware
+    app.middleware_stack = None  # Rebuilt on the next request
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=2000)
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--rounds', type=int, default=4)
+    options = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        db_path = os.path.join(directory, 'metrics.db')
+        SQLite_DB.engine = SQLite_DB.create_db_engine(f"sqlite:///{db_path}")
+        SQLite_DB.async_engine = SQLite_DB.create_async_db_engine(f"sqlite+aiosqlite:///{db_path}")
+        seed(SQLite_DB.engine, options.rows)
+        SQLite_DB.create_db_and_tables()
+
+        from app.main import app
+        metrics.SLOW_REQUEST_SECONDS = float('inf')
+        set_metrics.middleware = next(m for m in app.user_middleware if m.cls is metrics.MetricsMiddleware)
+        client = TestClient(app)
+
+        def paper_list(i):
+            response_cache.clear()
+            client.get('/paper/', params={'status': '1'})
+
+        cases = {
+            'GET /paper/': paper_list,
+            'GET /dashboard/stats': lambda i: client.get('/dashboard/stats'),
+            'PUT status': lambda i: client.put(f'/paper/{i % options.rows + 1}/status', json={'status': '2' if i % 2 else '1'}),
+        }
+        print(f"{'request':<22}{'without':>10}{'with':>10}{'overhead':>10}  (median per request)")
+        for name, request in cases.items():
+            timings = {False: [], True: []}
+            for _ in range(options.rounds):
+                for enabled in (False, True):
+                    set_metrics(app, enabled)
+                    request(0)  # Build the middleware stack outside the timing
+                    for i in range(options.requests // options.rounds):
+                        began = time.perf_counter()
+                        request(i)
+                        timings[enabled].append(time.perf_counter() - began)
+            without, with_ = statistics.median(timings[False]), statistics.median(timings[True])
+            print(f"{name:<22}{without * 1000:>8.3f}ms{with_ * 1000:>8.3f}ms{(with_ - without) * 1e6:>8.0f}us")
+
+        text = client.get('/metrics').text
+        samples = [line for line in text.splitlines() if line and not line.startswith('#')]
+        invalid = [line for line in samples if not SAMPLE.match(line)]
+        with_ids = [line for line in samples if re.search(r'route="[^"]*/\d+', line)]
+        print(f"/metrics: {len(samples)} samples, {len(invalid)} invalid, {len(with_ids)} with an id in the route")
+        for line in (invalid + with_ids)[:10]:
+            print(f"  {line}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""
+Per-paper requests against the /paper/batch endpoints.
+
+Run from the web directory:
+    python -m benchmarks.bench_paper_batch [--rows 50000] [--sizes 10 100 1000]
+
+Seeds a throwaway database with --rows papers (production pragmas, so every
+commit is a real WAL commit) and, for each size N, changes N papers the way
+a bulk action in PaperView would have: one PUT /paper/{id}/status,
+POST /paper/{id}/complete, POST /paper/{id}/review or DELETE /paper/{id}/
+per paper. Then it changes N other papers with a single request to the
+matching batch endpoint, and checks that both left the same statuses.
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from fastapi.testclient import TestClient
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlmodel import select
+
+from app.db import SQLite_DB
+from benchmarks.bench_calendar_query import seed
+
+OPERATIONS = {
+    # name: (single request, batch endpoint, batch body)
+    'status': (lambda client, i: client.put(f'/paper/{i}/status', json={'status': '5'}), 'status', {'status': '5'}),
+    'complete': (lambda client, i: client.post(f'/paper/{i}/complete'), 'complete', {}),
+    'review': (lambda client, i: client.post(f'/paper/{i}/review', params={'rating': 3}), 'review', {'rating': 3}),
+    'delete': (lambda client, i: client.delete(f'/paper/{i}/'), 'delete', {}),
+}
+
+def statuses(ids):
+    with SQLite_DB.engine.connect() as conn:
+        rows = conn.execute(select(SQLite_DB.Paper.status).where(SQLite_DB.Paper.id.in_(ids))).all()
+    return sorted(str(status) for status, in rows)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=50_000)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 1000])
+    options = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        db_path = os.path.join(directory, 'batch.db')
+        SQLite_DB.engine = SQLite_DB.create_db_engine(f"sqlite:///{db_path}")
+        SQLite_DB.async_engine = SQLite_DB.create_async_db_engine(f"sqlite+aiosqlite:///{db_path}")
+        seed(SQLite_DB.engine, options.rows)
+        SQLite_DB.create_db_and_tables()
+
+        from app.main import app
+        client = TestClient(app)
+        available = list(range(1, options.rows + 1))
+        random.Random(0).shuffle(available)
+        if sum(options.sizes) * 2 * len(OPERATIONS) > len(available):
+            raise SystemExit("Not enough papers for these sizes, raise --rows")
+
+        print(f"{'operation':<10}{'papers':>8}{'one by one':>13}{'batch':>10}{'speedup':>9}")
+        for size in options.sizes:
+            for name, (single, endpoint, body) in OPERATIONS.items():
+                one_by_one, batched = available[:size], available[size:size * 2]
+                del available[:size * 2]
+
+                began = time.perf_counter()
+                for paper_id in one_by_one:
+                    single(client, paper_id).raise_for_status()
+                single_time = time.perf_counter() - began
+
+                began = time.perf_counter()
+                summary = client.post(f'/paper/batch/{endpoint}', json={'ids': batched, **body}).json()
+                batch_time = time.perf_counter() - began
+
+                if len(summary['changed']) + len(summary['unchanged']) != size or statuses(one_by_one) != statuses(batched):
+                    raise SystemExit(f"{name} batch of {size} did not match the single requests: {summary}")
+                print(f"{name:<10}{size:>8}{single_time * 1000:>11.1f}ms{batch_time * 1000:>8.1f}ms{single_time / batch_time:>8.1f}x")
+        SQLite_DB.engine.dispose()
+
+if __name__ == '__main__':
+    main()
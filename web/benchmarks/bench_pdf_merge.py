@@ -0,0 +1,87 @@
+"""
+Wrong-question book merge: the old read/scale/tmp-file loop against the cached, streaming pipeline.
+
+Run from the web directory:
+    python -m benchmarks.bench_pdf_merge [--files 500] [--books 5]
+
+Builds --files one-page PDFs of mixed page sizes in a temporary directory and
+merges all of them --books times. For the pipeline the first book is a cold
+page cache and the rest are warm; time to first byte is when the first
+chunk of the streamed response is ready.
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+from fpdf import FPDF
+from pypdf import PdfReader, PdfWriter
+
+from app.services import pdf_merge
+
+PAGE_FORMATS = ['A4', 'A5', 'Letter', (250, 180)]
+
+def make_sources(directory, count):
+    paths = []
+    for i in range(count):
+        pdf = FPDF(format=PAGE_FORMATS[i % len(PAGE_FORMATS)])
+        pdf.add_page()
+        pdf.set_font('helvetica', size=14)
+        for line in range(20):
+            pdf.cell(0, 8, f"Question {i} line {line}: 12 + 34 = ___", new_x='LMARGIN', new_y='NEXT')
+        path = os.path.join(directory, f"question_{i}.pdf")
+        pdf.output(path)
+        paths.append(path)
+    return paths
+
+def legacy_book(paths, directory):
+    """The merge as it was: every file parsed and scaled again, written to a tmp file, then read back."""
+    start = time.perf_counter()
+    output_pdf = PdfWriter()
+    for path in paths:
+        page = PdfReader(path).pages[0]
+        page.scale_to(pdf_merge.A4_WIDTH, pdf_merge.A4_HEIGHT)
+        output_pdf.add_page(page)
+    tmp_path = os.path.join(directory, 'book.pdf')
+    with open(tmp_path, 'wb') as f:
+        output_pdf.write(f)
+    with open(tmp_path, 'rb') as f:
+        first = f.read(pdf_merge.STREAM_CHUNK_SIZE)
+        first_byte = time.perf_counter() - start
+        size = len(first) + len(f.read())
+    os.remove(tmp_path)
+    return first_byte, time.perf_counter() - start, size
+
+def pipeline_book(paths):
+    start = time.perf_counter()
+    first_byte = None
+    size = 0
+    output_pdf, _ = pdf_merge.merge_first_pages([('question', p) for p in paths], workers=1)
+    for chunk in pdf_merge.stream_pdf(output_pdf):
+        if first_byte is None:
+            first_byte = time.perf_counter() - start
+        size += len(chunk)
+    return first_byte, time.perf_counter() - start, size
+
+def report(label, runs):
+    first_bytes = [r[0] for r in runs]
+    totals = [r[1] for r in runs]
+    print(f"{label:<16}{statistics.median(first_bytes) * 1000:>10.0f}ms{statistics.median(totals) * 1000:>10.0f}ms{runs[0][2] / 1024:>10.0f}KB")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--files', type=int, default=500)
+    parser.add_argument('--books', type=int, default=5)
+    options = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        paths = make_sources(directory, options.files)
+        print(f"{'mode':<16}{'first byte':>12}{'total':>12}{'size':>12}")
+        report('legacy', [legacy_book(paths, directory) for _ in range(options.books)])
+        pdf_merge.page_cache.clear()
+        report('pipeline cold', [pipeline_book(paths)])
+        report('pipeline warm', [pipeline_book(paths) for _ in range(options.books)])
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+"""
+Wrong-question book merge throughput against the number of normalization workers.
+
+Run from the web directory:
+    python -m benchmarks.bench_pdf_merge_scaling [--questions 1000] [--workers 1,2,4,8]
+
+Each question has a question and an answer file, so the book has twice as many
+pages as questions. The page cache is cleared before every run, so each one
+normalizes every page; the pool is started and warmed up before each timed run.
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from app.services import pdf_merge
+from benchmarks.bench_pdf_merge import make_sources
+
+def run(sources, workers):
+    if workers > 1:
+        # Start the pool before timing so worker start-up is not counted
+        list(pdf_merge._get_pool(workers).map(pdf_merge._normalize_safely, [p for _, p in sources[:workers * 2]]))
+    pdf_merge.page_cache.clear()
+    start = time.perf_counter()
+    output_pdf, errors = pdf_merge.merge_first_pages(sources, workers=workers)
+    merged = time.perf_counter() - start
+    size = sum(len(chunk) for chunk in pdf_merge.stream_pdf(output_pdf))
+    return merged, time.perf_counter() - start, size, len(errors)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--questions', type=int, default=1000)
+    default_workers = sorted({1, 2, 4, os.cpu_count() or 1})
+    parser.add_argument('--workers', default=','.join(str(w) for w in default_workers))
+    options = parser.parse_args()
+    worker_counts = [int(w) for w in options.workers.split(',')]
+
+    with tempfile.TemporaryDirectory() as directory:
+        paths = make_sources(directory, options.questions * 2)
+        sources = [('question', p) for p in paths[:options.questions]] + [('answer', p) for p in paths[options.questions:]]
+
+        pdf_merge.PARALLEL_MIN_PAGES = 2
+
+        print(f"{'workers':<10}{'normalize':>12}{'total':>12}{'pages/s':>10}{'speedup':>10}{'size':>10}")
+        baseline = None
+        for workers in worker_counts:
+            merged, total, size, errors = run(sources, workers)
+            baseline = baseline or merged
+            print(f"{workers:<10}{merged * 1000:>10.0f}ms{total * 1000:>10.0f}ms{len(sources) / total:>10.0f}"
+                  f"{baseline / merged:>9.2f}x{size / 1024:>8.0f}KB" + (f"  ({errors} errors)" if errors else ""))
+        pdf_merge.shutdown_pool()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""
+Per-request worksheet render time and memory, with and without the font cache.
+
+Run from the web directory:
+    python -m benchmarks.bench_pdf_render [--font path/to/NotoSansSC-Regular.ttf] [--problems 200] [--requests 20]
+
+Each mode runs in its own process so the RSS numbers do not mix.
+"""
+import argparse
+import logging
+import multiprocessing
+import os
+import resource
+import statistics
+import time
+import warnings
+
+from app.routers import pdf_generator
+
+class UncachedPDF(pdf_generator.PDF):
+    """The PDF class as it was before the font cache: add_font on every document."""
+    def header(self):
+        if 'notosanssc' not in self.fonts:
+            self.add_font('NotoSansSC', '', pdf_generator.FONT_PATH)
+        self.set_font('NotoSansSC', '', 15)
+        self.cell(0, 10, self.title or 'Math Problems', 0, 1, 'C')
+
+def _rss_mb():
+    with open('/proc/self/statm') as f:
+        pages = int(f.read().split()[1])
+    return pages * os.sysconf('SC_PAGE_SIZE') / 1024 / 1024
+
+def _run(mode, font, problems, requests, conn):
+    warnings.simplefilter('ignore', DeprecationWarning)
+    logging.getLogger('fpdf').setLevel(logging.ERROR)
+    pdf_generator.FONT_PATH = font
+    if mode == 'before':
+        pdf_generator.PDF = UncachedPDF
+
+    timings = []
+    for i in range(requests):
+        start = time.perf_counter()
+        pdf_generator.render_worksheet('simple_calculation', 100, 1, 3, 'all', problems, 'mixed', seed=i)
+        timings.append(time.perf_counter() - start)
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    conn.send((timings, _rss_mb(), peak_mb))
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--font', default=pdf_generator.FONT_PATH)
+    parser.add_argument('--problems', type=int, default=200)
+    parser.add_argument('--requests', type=int, default=20)
+    options = parser.parse_args()
+    if not os.path.exists(options.font):
+        parser.error(f"Font file not found: {options.font}")
+
+    print(f"{'mode':<8}{'first':>10}{'median':>10}{'p95':>10}{'rss':>10}{'peak rss':>10}")
+    for mode in ('before', 'after'):
+        parent, child = multiprocessing.Pipe(duplex=False)
+        proc = multiprocessing.Process(target=_run, args=(mode, options.font, options.problems, options.requests, child))
+        proc.start()
+        timings, rss_mb, peak_mb = parent.recv()
+        proc.join()
+        ordered = sorted(timings)
+        p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+        print(f"{mode:<8}{timings[0] * 1000:>8.1f}ms{statistics.median(timings) * 1000:>8.1f}ms"
+              f"{p95 * 1000:>8.1f}ms{rss_mb:>8.1f}MB{peak_mb:>8.1f}MB")
+
+if __name__ == '__main__':
+    main()
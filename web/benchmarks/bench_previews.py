@@ -0,0 +1,63 @@
+"""
+Wrong question previews: bytes and time per list card, original file against thumbnail.
+
+Run from the web directory:
+    python -m benchmarks.bench_previews [--pages 20]
+
+Builds --pages synthetic A4 scans at 300 dpi, saved both as JPEG and as a
+scanned PDF, and reports for each format the size of the original, the time
+to render every thumbnail size on a cold cache, the time to fetch a cached
+one, and the size of the default thumbnail the list view loads.
+"""
+import argparse
+import io
+import os
+import statistics
+import tempfile
+import time
+
+from PIL import Image
+
+from app.services import previews
+from app.services.pdf_cache import PdfCache
+
+def scans(pages):
+    for page in range(pages):
+        image = Image.effect_noise((2480, 3508), 40 + page).convert('RGB')
+        for name, options in (('jpeg', {'format': 'JPEG', 'quality': 85}), ('pdf', {'format': 'PDF', 'resolution': 300})):
+            buffer = io.BytesIO()
+            image.save(buffer, **options)
+            yield name, f"scan{page}.{name[:3]}", buffer.getvalue()
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--pages', type=int, default=20)
+    options = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        previews.preview_cache = PdfCache(os.path.join(directory, 'previews'), 1 << 30, suffix=previews.PREVIEW_SUFFIX)
+        results = {}
+        for kind, filename, data in scans(options.pages):
+            path = os.path.join(directory, filename)
+            with open(path, 'wb') as f:
+                f.write(data)
+            began = time.perf_counter()
+            previews.get_preview(path, previews.DEFAULT_PREVIEW_SIZE)
+            cold = time.perf_counter() - began
+            began = time.perf_counter()
+            preview_path = previews.get_preview(path, previews.DEFAULT_PREVIEW_SIZE)
+            cached = time.perf_counter() - began
+            entry = results.setdefault(kind, {'original': [], 'cold': [], 'cached': [], 'preview': []})
+            entry['original'].append(len(data))
+            entry['cold'].append(cold)
+            entry['cached'].append(cached)
+            entry['preview'].append(os.path.getsize(preview_path))
+
+    print(f"{'format':<8}{'original':>12}{'cold render':>14}{'cached':>10}{'preview':>10}  (medians over {options.pages} pages)")
+    for kind, entry in results.items():
+        print(f"{kind:<8}{statistics.median(entry['original']) / 1024:>10.0f}KB"
+              f"{statistics.median(entry['cold']) * 1000:>12.1f}ms{statistics.median(entry['cached']) * 1000:>8.2f}ms"
+              f"{statistics.median(entry['preview']) / 1024:>8.1f}KB")
+
+if __name__ == '__main__':
+    main()
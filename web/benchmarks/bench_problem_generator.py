@@ -0,0 +1,71 @@
+"""
+Compare the batch problem generator with the original per-problem loop.
+
+Run from the web directory:
+    python -m benchmarks.bench_problem_generator [--problems 100] [--repeat 5] [--timeout 10]
+
+The legacy loop can spin forever on tight settings, so each legacy run is
+executed in a child process and reported as a timeout when it takes too long.
+"""
+import argparse
+import itertools
+import multiprocessing
+import time
+
+from app.services.problem_generator import generate_problems
+from benchmarks.legacy_problem_generator import generate_problems as legacy_generate_problems
+
+PROBLEM_TYPES = ['simple_calculation', 'find_missing_number']
+OPERATORS = ['add_subtract', 'multiply_divide', 'all']
+OP_MODES = ['mixed', 'sequential']
+NUM_OPERANDS = [2, 3, 4]
+NUMBER_RANGES = [(1, 20), (1, 50), (10, 200), (10, 1000), (100, 10000)]
+
+def _time_call(func, args, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def _legacy_worker(args, repeat, conn):
+    conn.send(_time_call(legacy_generate_problems, args, repeat))
+
+def _time_legacy(args, repeat, timeout):
+    parent, child = multiprocessing.Pipe(duplex=False)
+    proc = multiprocessing.Process(target=_legacy_worker, args=(args, repeat, child))
+    proc.start()
+    if parent.poll(timeout):
+        result = parent.recv()
+    else:
+        result = None
+        proc.terminate()
+    proc.join()
+    return result
+
+def _fmt(seconds):
+    return "timeout" if seconds is None else f"{seconds * 1000:9.2f}ms"
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--problems', type=int, default=100)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--timeout', type=float, default=10.0)
+    options = parser.parse_args()
+
+    print(f"{'type':<20}{'operators':<17}{'mode':<11}{'ops':>4}{'range':>12}{'legacy':>14}{'batch':>14}{'speedup':>10}")
+    grid = itertools.product(PROBLEM_TYPES, OPERATORS, OP_MODES, NUM_OPERANDS, NUMBER_RANGES)
+    for problem_type, operators, op_mode, num_operands, (min_number, max_number) in grid:
+        args = (problem_type, max_number, min_number, num_operands, operators, options.problems, op_mode)
+        legacy = _time_legacy(args, options.repeat, options.timeout)
+        try:
+            batch = _time_call(generate_problems, args, options.repeat)
+        except ValueError:
+            batch = None
+        speedup = f"{legacy / batch:9.1f}x" if legacy and batch else "-"
+        print(f"{problem_type:<20}{operators:<17}{op_mode:<11}{num_operands:>4}{f'{min_number}-{max_number}':>12}"
+              f"{_fmt(legacy):>14}{_fmt(batch):>14}{speedup:>10}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""
+Cost of profiling a request, and of the profiling middleware when it does not profile.
+
+Run from the web directory:
+    python -m benchmarks.bench_profiler_overhead [--requests 40] [--problems 2000]
+
+Times GET /api/generate-pdf for a --problems worksheet at a few sampling
+intervals, every other request profiled (the rate limit is lifted for the
+run and profiles go to a throwaway directory), and reports the samples and
+distinct stacks each profile holds. Then it times the token check, the
+price every other request pays.
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+from fastapi.testclient import TestClient
+
+from app.db import SQLite_DB
+from app.services import profiler
+
+TOKEN = 'bench'
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=40)
+    parser.add_argument('--problems', type=int, default=2000)
+    options = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        db_path = os.path.join(directory, 'profiler.db')
+        SQLite_DB.engine = SQLite_DB.create_db_engine(f"sqlite:///{db_path}")
+        SQLite_DB.async_engine = SQLite_DB.create_async_db_engine(f"sqlite+aiosqlite:///{db_path}")
+        SQLite_DB.create_db_and_tables()
+        profiler.PROFILE_TOKEN = TOKEN
+        profiler.PROFILE_DIR = os.path.join(directory, 'profiles')
+        profiler.rate_limit.fraction = 1
+
+        from app.main import app
+        client = TestClient(app)
+        params = {'problem_type': 'simple_calculation', 'num_problems': options.problems}
+
+        def worksheet(headers=None):
+            response = client.get('/api/generate-pdf', params=params, headers=headers or {})
+            return response.headers.get('x-profile-id')
+
+        print(f"{'sampling':<16}{'not profiled':>14}{'profiled':>10}{'overhead':>10}{'samples':>9}{'stacks':>8}")
+        for interval in (0.001, 0.005, 0.02):
+            profiler.SAMPLE_INTERVAL = interval
+            timings = {False: [], True: []}
+            samples, stacks = [], []
+            for i in range(options.requests * 2):
+                profiled = bool(i % 2)  # Interleaved, so drift hits both the same
+                began = time.perf_counter()
+                profile_id = worksheet({profiler.HEADER: TOKEN} if profiled else None)
+                timings[profiled].append(time.perf_counter() - began)
+                if profiled:
+                    with open(profiler.profile_path(profile_id), encoding='utf-8') as f:
+                        lines = f.read().splitlines()
+                    stacks.append(len(lines))
+                    samples.append(sum(int(line.rsplit(' ', 1)[1]) for line in lines))
+            base, took = (statistics.median(timings[p]) * 1000 for p in (False, True))
+            print(f"{f'every {interval * 1000:g}ms':<16}{base:>12.1f}ms{took:>8.1f}ms{took - base:>8.1f}ms"
+                  f"{statistics.median(samples):>9.0f}{statistics.median(stacks):>8.0f}")
+
+        # A token check is all the middleware does for other requests
+        scope = {'type': 'http', 'path': '/paper/', 'query_string': b'status=1&subject=2', 'headers': [(b'accept', b'*/*')] * 8}
+        calls = 100_000
+        began = time.perf_counter()
+        for _ in range(calls):
+            profiler.rate_limit.seen()
+            profiler.authorized(profiler.requested_token(scope))
+        print(f"middleware, no token: {(time.perf_counter() - began) / calls * 1e6:.1f}us per request")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""
+Bulk re-plan after a spaced repetition settings change: vectorized vs one commit per item.
+
+Run from the web directory:
+    python -m benchmarks.bench_srs_reschedule [--rows 100000] [--naive-rows 2000]
+
+Seeds a throwaway database with --rows completed papers and --rows wrong
+questions at random review stages, then times srs.reschedule_all (numpy
+plan, one UPDATE executemany, one transaction) switching to each algorithm
+in turn. The per-item baseline loads each paper through the ORM, plans it
+and commits, as a loop over the old endpoint code would; it runs on
+--naive-rows papers and is extrapolated to --rows.
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+from sqlmodel import Session, SQLModel, create_engine, select
+
+from app.db import SQLite_DB
+from app.services import srs
+
+def seed(engine, rows):
+    SQLModel.metadata.create_all(engine)
+    rng = random.Random(0)
+    now = datetime.now()
+    papers, questions = [], []
+    for i in range(rows):
+        reviewed = now - timedelta(days=rng.uniform(0, 60))
+        papers.append({'title': f"Paper {i}", 'status': rng.choice('34'), 'review_stage': rng.randint(0, 7), 'last_reviewed_at': reviewed})
+        questions.append({'subject': 'math', 'review_stage': rng.randint(0, 7), 'last_reviewed_at': reviewed})
+    with engine.begin() as conn:
+        conn.execute(SQLite_DB.Paper.__table__.insert(), papers)
+        conn.execute(SQLite_DB.WrongQuestion.__table__.insert(), questions)
+
+def naive_reschedule(engine, algorithm, rows):
+    with Session(engine) as session:
+        ids = session.exec(select(SQLite_DB.Paper.id).limit(rows)).all()
+        for paper_id in ids:
+            paper = session.get(SQLite_DB.Paper, paper_id)
+            state = algorithm.plan(srs._state_of(paper))
+            interval = float(state['interval'][0])
+            paper.srs_interval = None if np.isnan(interval) else interval
+            paper.next_review_date = None if np.isnan(interval) else paper.last_reviewed_at + timedelta(days=interval)
+            session.add(paper)
+            session.commit()
+    return len(ids)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=100_000)
+    parser.add_argument('--naive-rows', type=int, default=2_000)
+    options = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        engine = SQLite_DB.create_db_engine(f"sqlite:///{os.path.join(directory, 'srs.db')}")
+        SQLite_DB.engine = engine
+        seed(engine, options.rows)
+        print(f"Seeded {options.rows} papers and {options.rows} wrong questions")
+
+        print(f"{'algorithm':<12}{'vectorized':>12}{'items/s':>12}")
+        for name in ('sm2', 'fsrs', 'ebbinghaus'):
+            algorithm = srs.create_algorithm(name)
+            started = time.perf_counter()
+            counts = srs.reschedule_all(algorithm)
+            elapsed = time.perf_counter() - started
+            total = sum(counts.values())
+            print(f"{name:<12}{elapsed:>11.2f}s{total / elapsed:>12.0f}")
+
+        started = time.perf_counter()
+        done = naive_reschedule(engine, srs.create_algorithm('sm2'), options.naive_rows)
+        elapsed = time.perf_counter() - started
+        print(f"\nOne commit per paper: {done} papers in {elapsed:.2f}s ({done / elapsed:.0f} items/s), "
+              f"~{elapsed / done * options.rows * 2:.0f}s for {options.rows * 2} items")
+        engine.dispose()
+
+if __name__ == '__main__':
+    main()
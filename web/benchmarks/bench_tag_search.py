@@ -0,0 +1,124 @@
+"""
+Wrong question tag lookups: substring LIKE on `tags` against the question_tag index.
+
+Run from the web directory:
+    python -m benchmarks.bench_tag_search [--rows 500000] [--queries 200]
+
+Seeds a throwaway database with --rows wrong questions carrying one to four
+tags drawn from 2000 Chinese tags with a Zipf-like popularity (the triggers
+fill question_tag and the full-text index as rows go in), then times the
+ids of the questions matching a rare, a median and a popular tag, two tags
+at once, a tag prefix and a full-text word. "like" is the filter as
+get_wrong_questions ran it before, which also returns false positives
+(函数 inside 反函数); "index" goes through questions_tagged and
+question_text_filters. Both fetch every matching id. Statements are compiled
+up front and timed on the DBAPI cursor, so the numbers are SQLite's alone.
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from sqlalchemy import and_, or_
+from sqlmodel import SQLModel, create_engine, select
+
+from app.db import SQLite_DB
+
+TAGS = 2000
+
+def make_tags(rng):
+    # Two to four common CJK characters, some sharing a prefix with others
+    alphabet = [chr(c) for c in range(0x4E00, 0x4E00 + 400)]
+    tags = []
+    while len(tags) < TAGS:
+        tag = ''.join(rng.choice(alphabet) for _ in range(rng.randint(2, 4)))
+        if tag not in tags:
+            tags.append(tag)
+    return tags
+
+def seed(engine, rows, tags, rng):
+    SQLModel.metadata.create_all(engine)
+    weights = [1 / (rank + 1) for rank in range(len(tags))]
+    raw = engine.raw_connection()
+    try:
+        batch = []
+        for i in range(rows):
+            picked = set(rng.choices(tags, weights, k=rng.randint(1, 4)))
+            batch.append(('math', f"第{i % 40}章 {rng.choice(tags)}", ','.join(picked), '2026-01-01 00:00:00.000000', '2026-01-01 00:00:00.000000'))
+            if len(batch) == 50_000 or i == rows - 1:
+                raw.executemany(
+                    "INSERT INTO wrongquestion (subject, chapter, tags, created_at, updated_at) VALUES (?, ?, ?, ?, ?)", batch
+                )
+                raw.commit()
+                batch = []
+    finally:
+        raw.close()
+
+def like_query(tags, match_all=True):
+    WrongQuestion = SQLite_DB.WrongQuestion
+    conditions = [WrongQuestion.tags.like(f"%{tag.rstrip('*')}%") for tag in tags]
+    return select(WrongQuestion.id).where((and_ if match_all else or_)(*conditions))
+
+def index_query(tags, match_all=True):
+    return select(SQLite_DB.WrongQuestion.id).where(SQLite_DB.WrongQuestion.id.in_(SQLite_DB.questions_tagged(tags, match_all)))
+
+def text_query(word):
+    return select(SQLite_DB.WrongQuestion.id).where(*SQLite_DB.question_text_filters(word))
+
+def like_text_query(word):
+    WrongQuestion = SQLite_DB.WrongQuestion
+    return select(WrongQuestion.id).where(or_(*(c.contains(word) for c in (WrongQuestion.chapter, WrongQuestion.tags, WrongQuestion.question_type))))
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=500_000)
+    parser.add_argument('--queries', type=int, default=200)
+    options = parser.parse_args()
+
+    rng = random.Random(0)
+    tags = make_tags(rng)
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_engine(f"sqlite:///{os.path.join(directory, 'tags.db')}")
+        started = time.perf_counter()
+        seed(engine, options.rows, tags, rng)
+        print(f"Seeded {options.rows} questions in {time.perf_counter() - started:.1f}s")
+
+        long_tags = [t for t in tags if len(t) >= 3]
+        cases = {
+            'rare tag': lambda: ([rng.choice(tags[1500:])], True),
+            'median tag': lambda: ([rng.choice(tags[200:400])], True),
+            'popular tag': lambda: ([rng.choice(tags[:5])], True),
+            'two tags, all': lambda: ([rng.choice(tags[:50]), rng.choice(tags[:50])], True),
+            'two tags, any': lambda: ([rng.choice(tags[200:400]), rng.choice(tags[200:400])], False),
+            'tag prefix': lambda: ([rng.choice(tags[200:400])[:2] + '*'], True),
+            'full text': lambda: (rng.choice(long_tags[200:400]), None),
+        }
+        print(f"{'case':<16}{'like':>10}{'index':>10}{'like rows':>11}{'rows':>8}  (medians)")
+        raw = engine.raw_connection()
+        cursor = raw.cursor()
+        try:
+            for name, pick in cases.items():
+                timings = {'like': [], 'index': []}
+                counts = {'like': [], 'index': []}
+                for _ in range(options.queries):
+                    chosen, match_all = pick()
+                    if match_all is None:
+                        queries = {'like': like_text_query(chosen), 'index': text_query(chosen)}
+                    else:
+                        queries = {'like': like_query(chosen, match_all), 'index': index_query(chosen, match_all)}
+                    for mode, query in queries.items():
+                        compiled = query.compile(engine)
+                        parameters = tuple(compiled.params[key] for key in compiled.positiontup)
+                        began = time.perf_counter()
+                        ids = cursor.execute(str(compiled), parameters).fetchall()
+                        timings[mode].append(time.perf_counter() - began)
+                        counts[mode].append(len(ids))
+                print(f"{name:<16}{statistics.median(timings['like']) * 1000:>8.2f}ms{statistics.median(timings['index']) * 1000:>8.2f}ms"
+                      f"{statistics.median(counts['like']):>11.0f}{statistics.median(counts['index']):>8.0f}")
+        finally:
+            raw.close()
+
+if __name__ == '__main__':
+    main()
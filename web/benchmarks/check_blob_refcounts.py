@@ -0,0 +1,107 @@
+"""
+Consistency check for the wrong question blob store.
+
+Run from the web directory:
+    python -m benchmarks.check_blob_refcounts [--database PATH] [--repair]
+    python -m benchmarks.check_blob_refcounts --fixture 500
+
+With --database (default: the app database), recounts the references to every
+blob from the wrongquestion table and lists the ones that drifted; --repair
+corrects them and deletes blobs nothing points at. Only repair while the
+server is stopped, since an upload holds its reference before its question
+is committed. With --fixture, builds a throwaway database and storage
+directory, drives --fixture random creates (drawing from a few distinct
+files, so most are duplicates, some by hash only) and deletes through the
+real endpoints, then checks there is no drift and that the storage holds
+exactly one file per live blob. Exits with status 1 on any failure.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+
+from fastapi.testclient import TestClient
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlmodel import SQLModel, create_engine
+
+from app.db import SQLite_DB
+from app.services.blob_store import BLOB_DIR, blob_store
+
+def drive_fixture(writes: int, storage: str) -> int:
+    import hashlib
+    from app.main import app
+    from app.routers import settings as settings_router
+
+    settings_router.SETTINGS_FILE = os.path.join(storage, '..', 'settings.json')
+    settings_router.save_settings({'wrong_question_storage_path': storage})
+
+    rng = random.Random(0)
+    client = TestClient(app)
+    contents = [os.urandom(rng.randint(1, 300_000)) for _ in range(8)]
+    ids = []
+    failures = 0
+    for _ in range(writes):
+        if rng.random() < 0.7 or not ids:
+            content = rng.choice(contents)
+            sha256 = hashlib.sha256(content).hexdigest()
+            if rng.random() < 0.2:
+                # Hash only: known content is referenced, unknown content is a 404
+                response = client.post('/wrong_question_book/', data={'subject': 'fixture', 'question_sha256': sha256})
+                if response.status_code == 404:
+                    continue
+            else:
+                response = client.post('/wrong_question_book/', data={'subject': 'fixture'},
+                                       files={'question_file': ('scan.PNG', content), 'answer_file': ('answer.pdf', rng.choice(contents))})
+            question = response.json()
+            if response.status_code != 200 or not question['question_path'].endswith(sha256 + os.path.splitext(question['question_path'])[1]):
+                print(f"Create failed or stored the wrong content: {response.status_code} {question}")
+                failures += 1
+                continue
+            ids.append(question['id'])
+        else:
+            client.delete(f'/wrong_question_book/{ids.pop(rng.randrange(len(ids)))}')
+    return failures
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--database', default=SQLite_DB.path)
+    parser.add_argument('--repair', action='store_true')
+    parser.add_argument('--fixture', type=int, default=0, help="random writes to run against a throwaway database")
+    options = parser.parse_args()
+
+    failures = 0
+    with tempfile.TemporaryDirectory() as directory:
+        if options.fixture:
+            db_path = os.path.join(directory, 'blobs.db')
+            storage = os.path.join(directory, 'storage')
+            os.makedirs(storage)
+            SQLite_DB.engine = create_engine(f"sqlite:///{db_path}")
+            SQLite_DB.async_engine = create_async_engine(f"sqlite+aiosqlite:///{db_path}")
+            SQLModel.metadata.create_all(SQLite_DB.engine)
+            failures += drive_fixture(options.fixture, storage)
+            engine = SQLite_DB.engine
+            with engine.connect() as conn:
+                live = {path for (path,) in conn.exec_driver_sql("SELECT path FROM blob")}
+            on_disk = {
+                os.path.join(root, name)
+                for root, _, names in os.walk(os.path.join(storage, BLOB_DIR)) for name in names
+            }
+            if live != on_disk:
+                print(f"{len(on_disk - live)} stored files without a blob, {len(live - on_disk)} blobs without a file")
+                failures += 1
+        else:
+            engine = create_engine(f"sqlite:///{options.database}")
+            SQLModel.metadata.create_all(engine, tables=[SQLite_DB.Blob.__table__])
+
+        drift = blob_store.check_refcounts(engine, repair=options.repair)
+        for entry in drift:
+            print(f"  {entry['sha256'][:16]}  stored {entry['stored']:>6}  actual {entry['actual']:>6}  {entry['path']}")
+        failures += bool(drift) and not options.repair
+        engine.dispose()
+
+    print("Blob refcounts are consistent." if not failures else "Blob refcounts drifted.")
+    sys.exit(1 if failures else 0)
+
+if __name__ == '__main__':
+    main()
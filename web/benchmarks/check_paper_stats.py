@@ -0,0 +1,109 @@
+"""
+Consistency check for the paper_stats dashboard counters.
+
+Run from the web directory:
+    python -m benchmarks.check_paper_stats [--database PATH] [--repair]
+    python -m benchmarks.check_paper_stats --fixture 2000
+
+With --database (default: the app database), recounts the counters from the
+paper table and lists every one that drifted; --repair rewrites them. With
+--fixture, builds a throwaway database, drives --fixture random writes
+through the real endpoints (create, update, status, complete, review,
+delete), the review scheduler and a bulk SRS reschedule, then checks there
+is no drift and that /dashboard/stats matches a direct count. Exits with
+status 1 on any drift, so it can gate a CI job.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+from fastapi.testclient import TestClient
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlmodel import SQLModel, create_engine
+
+from app.db import SQLite_DB
+from app.services import stats
+
+def drive_fixture(writes: int):
+    from app.main import app
+    from app.services import srs
+    from app.services.review_scheduler import review_scheduler
+
+    rng = random.Random(0)
+    client = TestClient(app)
+    ids = []
+    now = datetime.now()
+    for _ in range(writes):
+        action = rng.random()
+        if action < 0.3 or not ids:
+            paper = client.post('/paper/', json={
+                'title': 'fixture',
+                'status': rng.choice(['1', '2', '3', '4', '5', None]),
+                'last_reviewed_at': (now - timedelta(days=rng.uniform(0, 14))).isoformat() if rng.random() < 0.5 else None,
+                'next_review_date': (now + timedelta(days=rng.uniform(-3, 3))).isoformat() if rng.random() < 0.5 else None,
+            }).json()
+            ids.append(paper['id'])
+        elif action < 0.45:
+            client.put('/paper/', json={'id': rng.choice(ids), 'status': rng.choice('12345'),
+                                        'last_reviewed_at': (now - timedelta(days=rng.uniform(0, 14))).isoformat()})
+        elif action < 0.6:
+            client.put(f'/paper/{rng.choice(ids)}/status', json={'status': rng.choice('12345')})
+        elif action < 0.75:
+            client.post(f'/paper/{rng.choice(ids)}/complete')
+        elif action < 0.9:
+            client.post(f'/paper/{rng.choice(ids)}/review', params={'rating': rng.randint(1, 4)})
+        else:
+            client.delete(f'/paper/{ids.pop(rng.randrange(len(ids)))}/')
+    review_scheduler.flip_due()
+    srs.reschedule_all(srs.create_algorithm('sm2'))
+    return client
+
+def expected_dashboard(engine):
+    one_week_ago = datetime.combine(datetime.now().date(), datetime.min.time()) - timedelta(days=7)
+    with engine.connect() as conn:
+        count = lambda sql, *args: conn.exec_driver_sql(sql, args).scalar()
+        return {
+            "pending_review_count": count("SELECT count(*) FROM paper WHERE status = '4'"),
+            "in_progress_count": count("SELECT count(*) FROM paper WHERE status IN ('2', '5')"),
+            "completed_this_week_count": count("SELECT count(*) FROM paper WHERE last_reviewed_at >= ?", str(one_week_ago)),
+        }
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--database', default=SQLite_DB.path)
+    parser.add_argument('--repair', action='store_true')
+    parser.add_argument('--fixture', type=int, default=0, help="random writes to run against a throwaway database")
+    options = parser.parse_args()
+
+    failures = 0
+    with tempfile.TemporaryDirectory() as directory:
+        if options.fixture:
+            db_path = os.path.join(directory, 'stats.db')
+            SQLite_DB.engine = create_engine(f"sqlite:///{db_path}")
+            SQLite_DB.async_engine = create_async_engine(f"sqlite+aiosqlite:///{db_path}")
+            SQLModel.metadata.create_all(SQLite_DB.engine)
+            client = drive_fixture(options.fixture)
+            cards = client.get('/dashboard/stats').json()['stats_cards']
+            expected = expected_dashboard(SQLite_DB.engine)
+            if cards != expected:
+                print(f"Dashboard cards {cards} do not match a direct count {expected}")
+                failures += 1
+            engine = SQLite_DB.engine
+        else:
+            engine = create_engine(f"sqlite:///{options.database}")
+            SQLite_DB.ensure_paper_stats(engine)
+
+        drift = stats.check_paper_stats(engine, repair=options.repair)
+        for entry in drift:
+            print(f"  {entry['kind']:<12}{entry['key']:<12} stored {entry['stored']:>8}  actual {entry['actual']:>8}")
+        failures += bool(drift) and not options.repair
+        engine.dispose()
+
+    print("Paper counters are consistent." if not failures else "Paper counters drifted.")
+    sys.exit(1 if failures else 0)
+
+if __name__ == '__main__':
+    main()
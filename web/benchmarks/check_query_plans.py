@@ -0,0 +1,180 @@
+"""
+Query plan check for the paper and wrong-question filters.
+
+Run from the web directory:
+    python -m benchmarks.check_query_plans [--rows 100000] [--verbose]
+
+Builds a throwaway database with --rows papers and --rows wrong questions,
+points SQLite_DB.engine and SQLite_DB.async_engine at it and calls the real
+endpoints (plus the review scheduler). Every SELECT and UPDATE they issue is captured
+and run through EXPLAIN QUERY PLAN. A plan step that scans a table instead of
+searching an index, or sorts all matches for ORDER BY, fails the check unless
+the case is listed with a reason it has to scan. Exits with status 1 on any
+failure, so it can gate a CI job.
+
+The filter values used below match few or no fixture rows on purpose: the
+plan does not depend on them and the responses stay small.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+from fastapi.testclient import TestClient
+from sqlalchemy import event, insert
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlmodel import SQLModel, create_engine
+
+from app.db import SQLite_DB
+from app.services.pagination import encode_cursor
+
+SUBJECTS = ['chinese', 'math', 'english', 'physics', 'chemistry', 'biology', 'history', 'geography']
+NOW = datetime(2026, 1, 1)
+
+# (name, method, url, json body, reason a scan is acceptable or None); method None calls review_scheduler.<url>()
+CASES = [
+    ("paper: status", 'GET', '/paper/?status=9', None, None),
+    ("paper: subject + grade", 'GET', '/paper/?subject=harness&grade=9', None, None),
+    ("paper: author", 'GET', '/paper/?author=harness', None, None),
+    ("paper: type", 'GET', '/paper/?type=9', None, None),
+    ("paper: academic only", 'GET', '/paper/?academic_only=true&author=0&type=0&status=0&subject=0&grade=0', None, None),
+    ("paper: academic + subject", 'GET', '/paper/?academic_only=true&subject=harness', None, None),
+    ("paper: calendar range", 'GET', '/paper/?start_date=2030-01-01T00:00:00&end_date=2030-02-01T00:00:00', None, None),
+    ("paper: first page", 'GET', '/paper/?limit=50', None, "walks ix_paper_start_date in order and stops after the page"),
+    ("paper: next page", 'GET', f"/paper/?limit=50&cursor={encode_cursor('start_date', '2026-01-01T00:00:00', 10)}", None, None),
+    ("paper: next page, newest first", 'GET',
+     f"/paper/?limit=50&sort=-start_date&cursor={encode_cursor('-start_date', '2026-01-01T00:00:00', 10)}", None, None),
+    ("paper: next page by id, projected", 'GET', f"/paper/?limit=50&sort=id&fields=title&cursor={encode_cursor('id', 10, 10)}", None, None),
+    ("dashboard: stats", 'GET', '/dashboard/stats', None, None),
+    ("scheduler: load upcoming reviews", None, 'load', None, None),
+    ("scheduler: flip due reviews", None, 'flip_due', None, None),
+    ("wrong question: subject", 'GET', '/wrong_question_book/?subject=harness', None, None),
+    ("wrong question: subject + difficulty", 'GET', '/wrong_question_book/?subject=harness&difficulty=9', None, None),
+    ("wrong question: difficulty", 'GET', '/wrong_question_book/?difficulty=9', None, None),
+    ("wrong question: tag", 'GET', '/wrong_question_book/?tag=harness', None, None),
+    ("wrong question: all of two tags", 'GET', '/wrong_question_book/?tag=harness,fraction', None, None),
+    ("wrong question: any of two tags", 'GET', '/wrong_question_book/?tag=harness,fraction&tag_mode=any&subject=harness', None, None),
+    ("wrong question: tag prefix", 'GET', '/wrong_question_book/?tag=harn*', None, None),
+    ("wrong question: full text", 'GET', '/wrong_question_book/?q=harness', None, None),
+    ("wrong question: next page", 'GET',
+     f"/wrong_question_book/?limit=50&sort=created_at&cursor={encode_cursor('created_at', '2026-01-01T00:00:00', 10)}", None, None),
+    ("wrong question: stats by subject", 'GET', '/wrong_question_book/stats?subject=harness', None, None),
+    ("wrong question: stats", 'GET', '/wrong_question_book/stats', None,
+     "aggregates every row; reads the covering index instead of the table"),
+    ("wrong question: book by ids", 'POST', '/wrong_question_book/generate_pdf', {"question_ids": [1, 2, 3]}, None),
+]
+
+def _random_date(rng, spread_days):
+    return NOW + timedelta(days=rng.uniform(-spread_days, spread_days))
+
+def build_fixture(engine, rows, seed=0):
+    rng = random.Random(seed)
+    SQLModel.metadata.create_all(engine)
+    papers = []
+    for i in range(rows):
+        start = _random_date(rng, 365) if rng.random() < 0.7 else None
+        papers.append({
+            'title': f"Paper {i}",
+            'subject': rng.choice(SUBJECTS),
+            'grade': str(rng.randint(1, 6)),
+            'author': f"author{rng.randint(1, 50)}",
+            'type': str(rng.randint(1, 8)),
+            'status': rng.choice('12345'),
+            'review_stage': rng.randint(0, 6),
+            'next_review_date': NOW + timedelta(days=rng.uniform(1, 60)) if rng.random() < 0.5 else None,
+            'last_reviewed_at': _random_date(rng, 365) if rng.random() < 0.5 else None,
+            'start_date': start,
+            'end_date': start + timedelta(days=rng.randint(1, 7)) if start and rng.random() < 0.5 else None,
+        })
+    questions = []
+    for i in range(rows):
+        questions.append({
+            'subject': rng.choice(SUBJECTS),
+            'chapter': f"chapter {rng.randint(1, 20)}",
+            'question_type': rng.choice(['choice', 'blank', 'essay', 'calculation']),
+            'difficulty': str(rng.randint(1, 5)),
+            'tags': ','.join(rng.sample(['fraction', 'geometry', 'grammar', 'reading', 'equation'], 2)),
+            'created_at': NOW,
+            'updated_at': NOW,
+        })
+    with engine.begin() as conn:
+        conn.execute(insert(SQLite_DB.Paper), papers)
+        conn.execute(insert(SQLite_DB.WrongQuestion), questions)
+
+def explain(engine, statement, parameters):
+    with engine.connect() as conn:
+        return [row[3] for row in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters)]
+
+def is_full_scan(detail):
+    # "SCAN paper" reads the table and a temp b-tree sorts every match; "SEARCH ...", scans
+    # of a covering index and constrained virtual table lookups (R*Tree "INDEX 2:...") do not
+    if detail.startswith('USE TEMP B-TREE FOR ORDER BY'):
+        return True
+    if 'VIRTUAL TABLE INDEX' in detail:
+        return detail.rstrip().endswith(':')  # no constraint passed to the module
+    return detail.startswith('SCAN ') and 'COVERING INDEX' not in detail
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=100_000)
+    parser.add_argument('--verbose', action='store_true')
+    options = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        db_path = os.path.join(directory, 'plans.db')
+        engine = create_engine(f"sqlite:///{db_path}")
+        async_engine = create_async_engine(f"sqlite+aiosqlite:///{db_path}")
+        SQLite_DB.engine = engine
+        SQLite_DB.async_engine = async_engine
+        print(f"Building fixture with {options.rows} rows per table...")
+        build_fixture(engine, options.rows)
+
+        captured = []
+        def capture(conn, cursor, statement, parameters, context, executemany):
+            if statement.lstrip().upper().startswith(('SELECT', 'UPDATE')):
+                captured.append((statement, parameters))
+        event.listen(engine, 'before_cursor_execute', capture)
+        event.listen(async_engine.sync_engine, 'before_cursor_execute', capture)
+
+        # Imported after the engine swap; no startup event, so no scheduler or worker pool
+        from app.main import app
+        from app.services.review_scheduler import review_scheduler
+        client = TestClient(app)
+
+        failures = 0
+        for name, method, url, body, allowed in CASES:
+            captured.clear()
+            if method is None:
+                getattr(review_scheduler, url)()
+            else:
+                response = client.request(method, url, json=body)
+                if response.status_code >= 400:
+                    print(f"FAIL  {name}: HTTP {response.status_code}")
+                    failures += 1
+                    continue
+            statements = list(captured)
+            scans = []
+            plans = []
+            for statement, parameters in statements:
+                plan = explain(engine, statement, parameters)
+                plans.append((statement, plan))
+                scans.extend(detail for detail in plan if is_full_scan(detail))
+            if scans and not allowed:
+                status = 'FAIL'
+                failures += 1
+            else:
+                status = 'scan' if scans else 'ok'
+            print(f"{status:<6}{name} ({len(statements)} queries)" + (f" - allowed: {allowed}" if scans and allowed else ""))
+            if options.verbose or status == 'FAIL':
+                for statement, plan in plans:
+                    print(f"        {' '.join(statement.split())[:120]}")
+                    for detail in plan:
+                        print(f"          {detail}")
+
+    print(f"\n{failures} failing case(s)" if failures else "\nAll query plans use indexes.")
+    sys.exit(1 if failures else 0)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,228 @@
+"""
+The original one-problem-at-a-time generator, kept as the baseline for
+bench_problem_generator.py. Do not use it from the application.
+"""
+import random
+
+def generate_problems(problem_type: str, max_number: int, min_number: int, num_operands: int, operators: str, num_problems: int, op_mode: str):
+    problems = []
+    op_map = {
+        'add_subtract': ['+', '-'],
+        'multiply_divide': ['*', '/'],
+        'all': ['+', '-', '*', '/']
+    }
+    allowed_ops = op_map.get(operators, ['+', '-'])
+
+    is_add_subtract_mixed = (op_mode == 'mixed' and operators == 'add_subtract')
+    
+    is_mul_div_mode = (operators in ['multiply_divide', 'all'])
+    single_digit_multiplier_min = 2
+    single_digit_multiplier_max = 9
+
+    sequential_count = 0
+    max_sequential = num_problems // 10  # 10% limit
+
+    for _ in range(num_problems):
+        problem_generated = False
+        while not problem_generated:
+            try:
+                # --- Operator Generation ---
+                ops = []
+                if num_operands > 1:
+                    if op_mode == 'mixed' and num_operands > 2:
+                        while True:
+                            ops = [random.choice(allowed_ops) for _ in range(num_operands - 1)]
+                            is_sequential = len(set(ops)) == 1
+                            if is_sequential:
+                                if sequential_count < max_sequential:
+                                    sequential_count += 1
+                                    break
+                                else:
+                                    continue
+                            else:
+                                break
+                    else:
+                        op = random.choice(allowed_ops)
+                        ops = [op] * (num_operands - 1)
+
+                # --- Operand and Problem Generation ---
+                if problem_type == 'simple_calculation':
+                    if num_operands < 2: continue
+                    
+                    nums = [0] * num_operands
+                    calculation_limit = max_number
+                    
+                    current_value = random.randint(min_number, max_number)
+                    nums[0] = current_value
+
+                    for i, op in enumerate(ops):
+                        if op == '+':
+                            max_add = calculation_limit - current_value
+                            if max_add < min_number:
+                                raise ValueError("Cannot generate valid '+' operand")
+                            next_val = random.randint(min_number, max_add)
+                            current_value += next_val
+                            nums[i+1] = next_val
+                        elif op == '-':
+                            upper_bound = current_value
+                            if is_add_subtract_mixed:
+                                upper_bound = current_value - 1
+                            
+                            if upper_bound < min_number:
+                                if is_add_subtract_mixed:
+                                    ops[i] = '+'
+                                    max_add = calculation_limit - current_value
+                                    if max_add < min_number:
+                                        raise ValueError("Cannot generate valid '+' operand after switch")
+                                    next_val = random.randint(min_number, max_add)
+                                    current_value += next_val
+                                    nums[i+1] = next_val
+                                else:
+                                    raise ValueError("Cannot generate valid '-' operand")
+                            else:
+                                next_val = random.randint(min_number, upper_bound)
+                                current_value -= next_val
+                                nums[i+1] = next_val
+                        elif op == '*':
+                            if is_mul_div_mode:
+                                if current_value == 0:
+                                    next_val = random.randint(single_digit_multiplier_min, single_digit_multiplier_max)
+                                else:
+                                    max_multiplier = calculation_limit // current_value
+                                    upper_bound = min(single_digit_multiplier_max, max_multiplier)
+                                    if upper_bound < single_digit_multiplier_min:
+                                        raise ValueError("Cannot find single-digit multiplier")
+                                    next_val = random.randint(single_digit_multiplier_min, upper_bound)
+                            else:
+                                if current_value == 0:
+                                    next_val = random.randint(1, max_number)
+                                else:
+                                    max_multiplier = max(2, calculation_limit // current_value) if current_value > 0 else calculation_limit
+                                    next_val = random.randint(1, max_multiplier)
+                            current_value *= next_val
+                            nums[i+1] = next_val
+                        elif op == '/':
+                            if is_mul_div_mode:
+                                if current_value == 0:
+                                    raise ValueError("Cannot divide zero")
+                                divisors = [j for j in range(single_digit_multiplier_min, single_digit_multiplier_max + 1) if current_value % j == 0]
+                                if not divisors:
+                                    raise ValueError("No single-digit divisors found")
+                                next_val = random.choice(divisors)
+                            else:
+                                if current_value == 0:
+                                    next_val = random.randint(1, max_number)
+                                else:
+                                    divisors = [j for j in range(1, current_value + 1) if current_value % j == 0]
+                                    if not divisors:
+                                        raise ValueError("No divisors found")
+                                    next_val = random.choice(divisors)
+                            current_value //= next_val
+                            nums[i+1] = next_val
+                    
+                    problem_str = str(nums[0])
+                    for i, op in enumerate(ops):
+                        if op == '/':
+                            problem_str += f" ÷ {nums[i+1]}"
+                        elif op == '*':
+                            problem_str += f" × {nums[i+1]}"
+                        else:
+                            problem_str += f" {op} {nums[i+1]}"
+                    problems.append(f"{problem_str} = ")
+                    problem_generated = True
+
+                elif problem_type == 'find_missing_number':
+                    nums = [0] * num_operands
+                    calculation_limit = max_number
+                    
+                    current_value = random.randint(min_number, max_number)
+                    nums[0] = current_value
+
+                    for i, op in enumerate(ops):
+                        if op == '+':
+                            max_add = calculation_limit - current_value
+                            if max_add < min_number:
+                                raise ValueError("Cannot generate valid '+' operand")
+                            next_val = random.randint(min_number, max_add)
+                            current_value += next_val
+                            nums[i+1] = next_val
+                        elif op == '-':
+                            upper_bound = current_value
+                            if is_add_subtract_mixed:
+                                upper_bound = current_value - 1
+                            
+                            if upper_bound < min_number:
+                                if is_add_subtract_mixed:
+                                    ops[i] = '+'
+                                    max_add = calculation_limit - current_value
+                                    if max_add < min_number:
+                                        raise ValueError("Cannot generate valid '+' operand after switch")
+                                    next_val = random.randint(min_number, max_add)
+                                    current_value += next_val
+                                    nums[i+1] = next_val
+                                else:
+                                    raise ValueError("Cannot generate valid '-' operand")
+                            else:
+                                next_val = random.randint(min_number, upper_bound)
+                                current_value -= next_val
+                                nums[i+1] = next_val
+                        elif op == '*':
+                            if is_mul_div_mode:
+                                if current_value == 0:
+                                    next_val = random.randint(single_digit_multiplier_min, single_digit_multiplier_max)
+                                else:
+                                    max_multiplier = calculation_limit // current_value
+                                    upper_bound = min(single_digit_multiplier_max, max_multiplier)
+                                    if upper_bound < single_digit_multiplier_min:
+                                        raise ValueError("Cannot find single-digit multiplier")
+                                    next_val = random.randint(single_digit_multiplier_min, upper_bound)
+                            else:
+                                if current_value == 0:
+                                    next_val = random.randint(1, max_number)
+                                else:
+                                    max_multiplier = max(2, calculation_limit // current_value) if current_value > 0 else calculation_limit
+                                    next_val = random.randint(1, max_multiplier)
+                            current_value *= next_val
+                            nums[i+1] = next_val
+                        elif op == '/':
+                            if is_mul_div_mode:
+                                if current_value == 0:
+                                    raise ValueError("Cannot divide zero")
+                                divisors = [j for j in range(single_digit_multiplier_min, single_digit_multiplier_max + 1) if current_value % j == 0]
+                                if not divisors:
+                                    raise ValueError("No single-digit divisors found")
+                                next_val = random.choice(divisors)
+                            else:
+                                if current_value == 0:
+                                    next_val = random.randint(1, max_number)
+                                else:
+                                    divisors = [j for j in range(1, current_value + 1) if current_value % j == 0]
+                                    if not divisors:
+                                        raise ValueError("No divisors found")
+                                    next_val = random.choice(divisors)
+                            current_value //= next_val
+                            nums[i+1] = next_val
+                    final_result = current_value
+
+                    missing_pos = random.randint(0, num_operands - 1)
+                    problem_str = ""
+                    for i in range(num_operands):
+                        if i == missing_pos:
+                            problem_str += "▢"
+                        else:
+                            problem_str += str(nums[i])
+                        
+                        if i < len(ops):
+                            if ops[i] == '/':
+                                problem_str += "÷"
+                            elif ops[i] == '*':
+                                problem_str += "×"
+                            else:
+                                problem_str += f" {ops[i]} "
+                    problems.append(f"{problem_str} = {final_result}")
+                    problem_generated = True
+
+            except (ValueError, ZeroDivisionError, OverflowError):
+                continue
+
+    return problems